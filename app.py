@@ -1,8 +1,14 @@
-from flask import Flask
+from flask import Flask, Response, g, jsonify, make_response, request
 from flask_cors import CORS
 import os
+import time
 
-from webserver import endpoints
+from utils import metrics
+from utils.constants import TIMING_BREAKDOWN_HEADER
+from utils.startup_report import timed, report
+
+with timed("imports", "webserver"):
+    from webserver import endpoints, health
 
 app = Flask(__name__)
 CORS(app)
@@ -12,10 +18,55 @@ CORS(app)
 app.register_blueprint(endpoints.swagger_ui_blueprint)
 app.register_blueprint(endpoints.blueprint)
 
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    metrics.start_trace(request.headers.get(TIMING_BREAKDOWN_HEADER) == "1")
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, endpoint, str(response.status_code))
+    trace = metrics.current_trace()
+    if trace is not None:
+        # Streamed answers send their headers before the LLM call: its timings are in the `done` event instead.
+        response.headers["Server-Timing"] = metrics.server_timing(trace)
+    return response
+
 @app.route("/check-alive")
 def check_status():
     return "I am here"
 
+@app.route("/metrics")
+def metrics_endpoint():
+    """Stage latency histograms and counters of this process, in the Prometheus text format."""
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route("/live")
+def liveness():
+    """The process is up and answering requests."""
+    return make_response(jsonify(health.status()), 200)
+
+@app.route("/ready")
+def readiness():
+    """Ready only once this process has warmed up, and no longer once it is draining."""
+    # Gunicorn workers start the warm-up in post_worker_init; under any other server the first probe does.
+    health.start_warm_up()
+    return make_response(jsonify(health.status()), 200 if health.is_ready() else 503)
+
+@app.route("/warm-up", methods=["POST"])
+def warm_up():
+    """Loads the models now instead of on the first request that needs them (STARTUP_MODE=lazy)."""
+    try:
+        return make_response(jsonify({"warm_up_ms": health.warm_up_models(), **report()}), 200)
+    except Exception as e:
+        return make_response(jsonify({"error": "Warm-up failed.", "details": str(e)}), 500)
+
+@app.route("/startup")
+def startup():
+    """How long this process took to import the app, load each model and create each LLM client."""
+    return make_response(jsonify(report()), 200)
+
 if __name__ == '__main__':
     port = 5000
     app.run(debug=True, port = port, host = '0.0.0.0')
\ No newline at end of file
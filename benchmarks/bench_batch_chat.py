@@ -0,0 +1,123 @@
+"""
+Batch question benchmark: questions answered one request at a time vs one POST /batch-chat.
+
+Usage:
+    python -m benchmarks.stub_llm_server --port 11500 &
+    python -m benchmarks.bench_batch_chat --questions 200 --concurrency 8 --output batch.json
+
+Indexes tmp/imdb_top_1000.csv into a scratch collection, then measures:
+  - retrieval: `hybrid_search` per question vs one `hybrid_search_batch` for all of them,
+    with the share of questions whose results are identical,
+  - end to end (against the stand-in LLM at `--ollama-url`): every question sent to /imdb-chat in
+    turn vs all of them sent to /batch-chat, with the time to the first and last NDJSON line.
+The answer cache is off in both, so every question pays for retrieval and an LLM call.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="tmp/imdb_top_1000.csv")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM calls in flight for /batch-chat.")
+    parser.add_argument("--ollama-url", default="http://localhost:11500/api/generate",
+                        help="Ollama-compatible endpoint, e.g. benchmarks.stub_llm_server.")
+    parser.add_argument("--skip-llm", action="store_true", help="Only compare retrieval.")
+    parser.add_argument("--output", help="Optional path for the JSON results.")
+    return parser.parse_args()
+
+
+def make_questions(df, count, seed=7):
+    rng = random.Random(seed)
+    templates = ["a movie like {title}", "films directed by {director}", "{genre} movies about {word}"]
+    questions = []
+    for _ in range(count):
+        row = df.iloc[rng.randrange(len(df))]
+        word = rng.choice(str(row["Overview"]).split())
+        questions.append(rng.choice(templates).format(title=row["Series_Title"], director=row["Director"],
+                                                      genre=str(row["Genre"]).split(",")[0].lower(), word=word))
+    return questions
+
+
+def main():
+    args = parse_args()
+    scratch = tempfile.mkdtemp(prefix="bench_batch_chat_")
+    os.environ.update(CHROMADB_PATH=scratch, TMP_DIR=scratch, OLLAMA_URL=args.ollama_url, STRUCTURED_QUERIES="0",
+                      BATCH_LLM_CONCURRENCY=str(args.concurrency))
+    os.environ.setdefault("GEMINI_API_KEY", "")
+    os.environ.setdefault("GROQ_API_KEY", "")
+
+    import pandas as pd
+    from chromadb_handler.chromadb_handler import ChromaDBHandler
+    from utils.constants import DEFAULT_COLLECTION
+    from utils.shared_resources import get_vector_store_client, get_embedding_model, get_retriever, chroma_path
+
+    df = pd.read_csv(args.csv)
+    ChromaDBHandler(db_path=chroma_path, collection_name=DEFAULT_COLLECTION, chroma_client=get_vector_store_client(),
+                    embedding_model=get_embedding_model()).index_csv_stream(io.BytesIO(df.to_csv(index=False).encode()))
+    questions = make_questions(df, args.questions)
+    retriever = get_retriever([DEFAULT_COLLECTION])
+    retriever.hybrid_search(questions[0], budget_ms=0)
+
+    started = time.perf_counter()
+    single = [retriever.hybrid_search(question, budget_ms=0) for question in questions]
+    single_s = time.perf_counter() - started
+    # Fresh score cache, so the batch re-ranks as many pairs as the single calls did.
+    retriever.rerank_cache.clear()
+    started = time.perf_counter()
+    batch = retriever.hybrid_search_batch(questions)
+    batch_s = time.perf_counter() - started
+    identical = sum([doc["id"] for doc in a] == [doc["id"] for doc in b] for a, b in zip(single, batch))
+    results = {
+        "questions": len(questions),
+        "retrieval": {
+            "single_qps": round(len(questions) / single_s, 1),
+            "batch_qps": round(len(questions) / batch_s, 1),
+            "identical_results": round(identical / len(questions), 4),
+        },
+    }
+
+    if not args.skip_llm:
+        import app
+
+        client = app.app.test_client()
+        prefix = "/imdb-chatbot-svc/api/v1/imdb-chatbot-svc"
+        started = time.perf_counter()
+        for question in questions:
+            client.post(f"{prefix}/imdb-chat", json={"message": question, "use_cache": False})
+        one_by_one_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        response = client.post(f"{prefix}/batch-chat", json={"questions": questions, "use_cache": False},
+                               buffered=False)
+        first_line_s = None
+        lines = []
+        for chunk in response.response:
+            if first_line_s is None:
+                first_line_s = time.perf_counter() - started
+            lines.extend(line for line in chunk.decode().splitlines() if line)
+        batch_chat_s = time.perf_counter() - started
+        summary = json.loads(lines[-1])
+        results["end_to_end"] = {
+            "one_by_one_s": round(one_by_one_s, 2),
+            "batch_s": round(batch_chat_s, 2),
+            "batch_first_answer_s": round(first_line_s, 3),
+            "batch_errors": summary.get("errors"),
+            "batch_timings": summary.get("timings"),
+            "concurrency": args.concurrency,
+        }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
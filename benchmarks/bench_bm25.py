@@ -0,0 +1,98 @@
+"""
+Keyword index benchmark: build, save and load time and search latency of BM25Index.
+
+Usage:
+    python -m benchmarks.bench_bm25 --docs 1000000
+
+Documents are the combined metadata texts of tmp/imdb_top_1000.csv, repeated with
+distinct suffixes until `--docs` documents exist.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+
+from utils.bm25_index import BM25Index
+
+QUERIES = [
+    "When did The Matrix release?",
+    "christopher nolan batman",
+    "war drama 1994",
+    "drama",
+    "animated movies about toys",
+    "Tom Hanks Steven Spielberg",
+]
+
+
+def synthetic_texts(csv_path, docs):
+    df = pd.read_csv(csv_path).fillna("")
+    base = (df["Series_Title"] + "\n" + df["Released_Year"].astype(str) + "\n" + df["Genre"] + "\n"
+            + df["Overview"] + "\n" + df["Director"] + "\n" + df["Star1"] + ", " + df["Star2"]).tolist()
+    for number in range(docs):
+        yield f"movie-{number}", f"{base[number % len(base)]} edition{number // len(base)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="tmp/imdb_top_1000.csv")
+    parser.add_argument("--docs", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=200, help="Searches per query.")
+    parser.add_argument("--output", help="Optional path for the JSON results.")
+    args = parser.parse_args()
+
+    index = BM25Index()
+    started = time.perf_counter()
+    batch_ids, batch_texts = [], []
+    for doc_id, text in synthetic_texts(args.csv, args.docs):
+        batch_ids.append(doc_id)
+        batch_texts.append(text)
+        if len(batch_ids) == 10_000:
+            index.upsert(batch_ids, batch_texts)
+            batch_ids, batch_texts = [], []
+    index.upsert(batch_ids, batch_texts)
+    build_seconds = time.perf_counter() - started
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_bm25_"), "bench.npz")
+    started = time.perf_counter()
+    index.save(path)
+    save_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index = BM25Index.load(path)
+    load_seconds = time.perf_counter() - started
+
+    latencies = {}
+    for query in QUERIES:
+        samples = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            index.search(query, top_k=3)
+            samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        latencies[query] = {
+            "p50_ms": round(statistics.median(samples), 3),
+            "p99_ms": round(samples[int(0.99 * (len(samples) - 1))], 3),
+        }
+
+    results = {
+        "docs": len(index),
+        "build_seconds": round(build_seconds, 2),
+        "save_seconds": round(save_seconds, 3),
+        "load_seconds": round(load_seconds, 3),
+        "index_bytes": os.path.getsize(path),
+        "search": latencies,
+    }
+    print(json.dumps(results, indent=2))
+    os.remove(path)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
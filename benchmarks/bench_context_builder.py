@@ -0,0 +1,144 @@
+"""
+Prompt size benchmark: the full 12-field context of every hit versus the token-budgeted context builder.
+
+Usage:
+    python -m benchmarks.bench_context_builder --budget 1200
+    python -m benchmarks.bench_context_builder --ollama     # also time both prompts against a running Ollama
+
+The 10 candidates of each question are the BM25 top hits over tmp/imdb_top_1000.csv. Reports the
+prompt tokens of both prompts, the time to build them and to get the prompt template, and with
+`--ollama` the end-to-end LLM latency and Ollama's own prompt evaluation time for both.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "")
+os.environ.setdefault("GROQ_API_KEY", "")
+os.environ.setdefault("CHROMADB_PATH", tempfile.gettempdir())
+os.environ.setdefault("TMP_DIR", tempfile.gettempdir())
+os.environ.setdefault("OLLAMA_URL", "http://localhost:11434/api/generate")
+
+import pandas as pd
+import yaml
+
+from chromadb_handler.chromadb_handler import ChromaDBHandler
+from utils import prompt_reader
+from utils.bm25_index import BM25Index
+from utils.context_builder import ContextBuilder, count_tokens
+from utils.retrieval_handler import RetrievalHandler
+
+QUESTIONS = [
+    "When did The Matrix release?",
+    "Which Christopher Nolan movie is about dreams?",
+    "What is the box office gross of Titanic?",
+    "Recommend a feel-good animated movie for kids",
+    "Who stars in The Godfather?",
+    "What are some critically acclaimed war movies?",
+]
+
+
+def legacy_prompt(question, movies):
+    """The prompt as the endpoints built it before: every field of every hit, read from disk each time."""
+    context = "\n\n".join([
+        f"Title: {doc['title']}\n"
+        f"Year: {doc['year']}\n"
+        f"Certificate: {doc['certificate']}\n"
+        f"Runtime: {doc['runtime']}\n"
+        f"Genre: {doc['genre']}\n"
+        f"IMDB Rating: {doc['rating']}\n"
+        f"Overview: {doc['overview']}\n"
+        f"Meta Score: {doc['meta_score']}\n"
+        f"Director: {doc['director']}\n"
+        f"Stars: {(doc['stars'])}\n"
+        f"Number of Votes: {doc['votes']}\n"
+        f"Gross Revenue: {doc['gross']}"
+        for doc in movies
+    ])
+    return read_template().format(user_message=question, context=context)
+
+
+def read_template():
+    with open("prompts/prompt.yaml", "r", encoding="utf-8") as file:
+        return yaml.safe_load(file)["imdb_chat_prompt"]
+
+
+def timed_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 4)
+
+
+def ollama_latency(prompt):
+    from utils.llm_providers import OllamaProvider
+
+    started = time.perf_counter()
+    response = OllamaProvider().post(prompt)
+    body = response.json()
+    return {
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        "prompt_eval_count": body.get("prompt_eval_count"),
+        "prompt_eval_ms": round(body.get("prompt_eval_duration", 0) / 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="tmp/imdb_top_1000.csv")
+    parser.add_argument("--budget", type=int, default=1200, help="Context token budget of the builder.")
+    parser.add_argument("--candidates", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=200, help="Builds per question for the timings.")
+    parser.add_argument("--ollama", action="store_true", help="Also send both prompts to Ollama at OLLAMA_URL.")
+    parser.add_argument("--output", help="Optional path for the JSON results.")
+    args = parser.parse_args()
+
+    df = ChromaDBHandler.process_chunk(pd.read_csv(args.csv, dtype={"Released_Year": str, "Gross": str}))
+    metadatas = ChromaDBHandler.build_metadatas(df)
+    index = BM25Index()
+    index.upsert([str(i) for i in range(len(metadatas))], [RetrievalHandler.combine_metadata(m) for m in metadatas])
+    builder = ContextBuilder(token_budget=args.budget)
+
+    per_question = {}
+    for question in QUESTIONS:
+        movies = [metadatas[int(doc_id)] for doc_id, _ in index.search(question, top_k=args.candidates)]
+        old_prompt = legacy_prompt(question, movies)
+        new_prompt, stats = builder.build_prompt(question, movies)
+        result = {
+            "legacy_prompt_tokens": count_tokens(old_prompt),
+            "prompt_tokens": stats["prompt_tokens"],
+            "movies": stats["movies"],
+            "fields": stats["fields"],
+            "legacy_build_ms": timed_ms(lambda: legacy_prompt(question, movies), args.repeat),
+            "build_ms": timed_ms(lambda: builder.build_prompt(question, movies), args.repeat),
+        }
+        if args.ollama:
+            result["legacy_llm"] = ollama_latency(old_prompt)
+            result["llm"] = ollama_latency(new_prompt)
+        per_question[question] = result
+
+    legacy_tokens = [r["legacy_prompt_tokens"] for r in per_question.values()]
+    tokens = [r["prompt_tokens"] for r in per_question.values()]
+    results = {
+        "token_budget": args.budget,
+        "mean_legacy_prompt_tokens": round(statistics.mean(legacy_tokens), 1),
+        "mean_prompt_tokens": round(statistics.mean(tokens), 1),
+        "token_reduction": round(1 - sum(tokens) / sum(legacy_tokens), 3),
+        "template_read_ms": timed_ms(read_template, args.repeat),
+        "cached_template_ms": timed_ms(lambda: prompt_reader.get_prompt_template("imdb_chat_prompt"), args.repeat),
+        "questions": per_question,
+    }
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
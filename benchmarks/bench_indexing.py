@@ -0,0 +1,103 @@
+"""
+Indexing benchmark: batched `ChromaDBHandler.index_data_into_chroma` vs the old per-row loop.
+
+Usage:
+    python -m benchmarks.bench_indexing --csv tmp/imdb_top_1000.csv --synthetic-rows 100000
+
+Each run indexes into a throwaway Chroma directory. The per-row baseline is capped
+with --per-row-limit (it takes hours at 100k rows) and its rate is reported as measured.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "")
+os.environ.setdefault("GROQ_API_KEY", "")
+os.environ.setdefault("CHROMADB_PATH", tempfile.gettempdir())
+os.environ.setdefault("TMP_DIR", tempfile.gettempdir())
+os.environ.setdefault("OLLAMA_URL", "http://localhost:11434/api/generate")
+# Measure the model, not the embedding cache: every run would otherwise hit vectors cached by the previous one.
+os.environ.setdefault("EMBEDDING_CACHE_CAPACITY", "0")
+
+import pandas as pd
+
+from chromadb_handler.chromadb_handler import ChromaDBHandler
+from utils.constants import INDEX_EMBED_BATCH_SIZE, INDEX_WRITE_CHUNK_SIZE
+
+
+def make_synthetic(df, rows):
+    """Repeats `df` until it has `rows` rows, suffixing titles so every row is distinct."""
+    copies = []
+    copy_no = 0
+    while sum(len(c) for c in copies) < rows:
+        copy = df.copy()
+        if copy_no:
+            copy["Series_Title"] = copy["Series_Title"] + f" ({copy_no})"
+        copies.append(copy)
+        copy_no += 1
+    scaled = pd.concat(copies, ignore_index=True).iloc[:rows]
+    return scaled.reset_index(drop=True)
+
+
+def index_per_row(handler, df):
+    """The original indexing loop: one encode and one collection.add per row."""
+    started = time.perf_counter()
+    metadatas = handler.build_metadatas(df)
+    for (index, row), metadata in zip(df.iterrows(), metadatas):
+        embedding = handler.embedding_model.encode(row["text"]).tolist()
+        handler.collection.add(ids=[str(index)], embeddings=[embedding], metadatas=[metadata])
+    elapsed = time.perf_counter() - started
+    return {"rows": len(df), "seconds": round(elapsed, 3), "rows_per_sec": round(len(df) / elapsed, 1)}
+
+
+def run(label, df, mode, batch_size, write_chunk_size, per_row_limit, embedding_model):
+    db_dir = tempfile.mkdtemp(prefix="bench_chroma_")
+    try:
+        handler = ChromaDBHandler(db_path=db_dir, collection_name="bench", embedding_model=embedding_model)
+        if mode == "per-row":
+            stats = index_per_row(handler, df.iloc[:per_row_limit])
+        else:
+            stats = handler.index_data_into_chroma(df, batch_size=batch_size, write_chunk_size=write_chunk_size)
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    stats.update({"dataset": label, "mode": mode})
+    print(json.dumps(stats))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="tmp/imdb_top_1000.csv")
+    parser.add_argument("--synthetic-rows", type=int, default=100_000, help="0 to skip the scaled-up dataset.")
+    parser.add_argument("--batch-size", type=int, default=INDEX_EMBED_BATCH_SIZE)
+    parser.add_argument("--write-chunk-size", type=int, default=INDEX_WRITE_CHUNK_SIZE)
+    parser.add_argument("--per-row-limit", type=int, default=1000, help="Rows indexed by the per-row baseline.")
+    parser.add_argument("--modes", default="per-row,batched")
+    parser.add_argument("--output", help="Optional path for the JSON results.")
+    args = parser.parse_args()
+
+    loader_dir = tempfile.mkdtemp(prefix="bench_chroma_")
+    loader = ChromaDBHandler(db_path=loader_dir)
+    base = loader.load_and_process_csv(args.csv)
+    datasets = [(os.path.basename(args.csv), base)]
+    if args.synthetic_rows:
+        datasets.append((f"synthetic-{args.synthetic_rows}", make_synthetic(base, args.synthetic_rows)))
+
+    results = []
+    for label, df in datasets:
+        for mode in args.modes.split(","):
+            results.append(run(label, df, mode.strip(), args.batch_size, args.write_chunk_size,
+                               args.per_row_limit, loader.embedding_model))
+
+    shutil.rmtree(loader_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+CPU inference backend benchmark: PyTorch versus int8 PyTorch versus int8 ONNX Runtime.
+
+Usage:
+    python -m benchmarks.bench_inference_backend --threads 4
+    python -m benchmarks.bench_inference_backend --backends torch,int8 --questions 100
+
+For every backend, on the movies of tmp/imdb_top_1000.csv (as indexed, via `combine_metadata`):
+  - indexing throughput: documents embedded per second in batches of `--batch-size`,
+  - query latency: p50/p99 of encoding one question, and of re-ranking `--candidates` movies for it,
+  - agreement with PyTorch: cosine of the document embeddings, overlap of the top-10 movies when
+    both documents and questions use the backend, and when only questions do (an index built
+    with PyTorch, queried without re-indexing), and how often the re-ranker's best movie is the same.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "")
+os.environ.setdefault("GROQ_API_KEY", "")
+os.environ.setdefault("CHROMADB_PATH", tempfile.gettempdir())
+os.environ.setdefault("TMP_DIR", tempfile.gettempdir())
+os.environ.setdefault("OLLAMA_URL", "http://localhost:11434/api/generate")
+
+import numpy as np
+import pandas as pd
+import torch
+
+from chromadb_handler.chromadb_handler import ChromaDBHandler
+from utils.constants import EMBED_MODEL, RERANK_MODEL
+from utils.inference_backend import load_embedding_model, load_re_ranker
+from utils.retrieval_handler import RetrievalHandler
+
+QUESTION_TEMPLATES = [
+    "When did {title} release?",
+    "Who directed {title}?",
+    "What is {title} about?",
+    "Movies like {title}",
+]
+TOP_K = 10
+
+
+def load_workload(csv_path, count, seed=7):
+    df = ChromaDBHandler.process_chunk(pd.read_csv(csv_path, dtype={"Released_Year": str, "Gross": str}))
+    texts = [RetrievalHandler.combine_metadata(meta) for meta in ChromaDBHandler.build_metadatas(df)]
+    rng = random.Random(seed)
+    questions = [rng.choice(QUESTION_TEMPLATES).format(title=rng.choice(df["Series_Title"].tolist()))
+                 for _ in range(count)]
+    return questions, texts
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return round(statistics.median(samples), 2), round(samples[int(0.99 * (len(samples) - 1))], 2)
+
+
+def top_k(query_vectors, doc_vectors):
+    """Indices of the TOP_K nearest documents of every query, nearest first."""
+    return np.argsort(-(query_vectors @ doc_vectors.T), axis=1)[:, :TOP_K].tolist()
+
+
+def overlap(hits, reference_hits):
+    return round(statistics.mean(len(set(a) & set(b)) / TOP_K for a, b in zip(hits, reference_hits)), 4)
+
+
+def run_backend(backend, questions, texts, args):
+    started = time.perf_counter()
+    embedder = load_embedding_model(EMBED_MODEL, backend)
+    re_ranker = load_re_ranker(RERANK_MODEL, backend)
+    load_seconds = time.perf_counter() - started
+    embedder.encode("warm up")
+    re_ranker.predict([("warm up", "warm up")])
+
+    started = time.perf_counter()
+    doc_vectors = embedder.encode(texts, batch_size=args.batch_size, normalize_embeddings=True)
+    index_seconds = time.perf_counter() - started
+
+    query_latencies, query_vectors = [], []
+    for question in questions:
+        started = time.perf_counter()
+        query_vectors.append(embedder.encode(question, normalize_embeddings=True))
+        query_latencies.append((time.perf_counter() - started) * 1000)
+    query_vectors = np.asarray(query_vectors)
+
+    return {
+        "load_seconds": round(load_seconds, 2),
+        "index_docs_per_s": round(len(texts) / index_seconds, 1),
+        "query_p50_ms": percentiles(query_latencies)[0],
+        "query_p99_ms": percentiles(query_latencies)[1],
+    }, embedder, re_ranker, np.asarray(doc_vectors), query_vectors
+
+
+def rerank(re_ranker, questions, candidates, texts):
+    latencies, best = [], []
+    for question, movie_ids in zip(questions, candidates):
+        started = time.perf_counter()
+        scores = re_ranker.predict([(question, texts[i]) for i in movie_ids])
+        latencies.append((time.perf_counter() - started) * 1000)
+        best.append(movie_ids[int(np.argmax(scores))])
+    return latencies, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="tmp/imdb_top_1000.csv")
+    parser.add_argument("--backends", default="torch,int8,onnx", help="Compared against torch, which always runs.")
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads (0 keeps torch's default).")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--candidates", type=int, default=8, help="Movies re-ranked per question.")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--output", help="Optional path for the JSON results.")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    questions, texts = load_workload(args.csv, args.questions)
+    backends = ["torch"] + [backend for backend in args.backends.split(",") if backend != "torch"]
+
+    results = {"documents": len(texts), "questions": len(questions), "threads": torch.get_num_threads(),
+               "backends": {}}
+    reference = None
+    for backend in backends:
+        stats, embedder, re_ranker, doc_vectors, query_vectors = run_backend(backend, questions, texts, args)
+        if reference is None:
+            torch_hits = top_k(query_vectors, doc_vectors)
+            candidates = [hits[:args.candidates] for hits in torch_hits]
+            reference = {"doc_vectors": doc_vectors, "hits": torch_hits, "candidates": candidates}
+        rerank_latencies, best = rerank(re_ranker, questions, reference["candidates"], texts)
+        stats["rerank_p50_ms"], stats["rerank_p99_ms"] = percentiles(rerank_latencies)
+        if backend == "torch":
+            reference["best"] = best
+        else:
+            cosine = np.sum(doc_vectors * reference["doc_vectors"], axis=1)
+            stats["doc_cosine_mean"] = round(float(cosine.mean()), 4)
+            stats["doc_cosine_min"] = round(float(cosine.min()), 4)
+            stats["top10_overlap"] = overlap(top_k(query_vectors, doc_vectors), reference["hits"])
+            stats["top10_overlap_torch_index"] = overlap(top_k(query_vectors, reference["doc_vectors"]),
+                                                         reference["hits"])
+            stats["rerank_top1_agreement"] = round(statistics.mean(
+                a == b for a, b in zip(best, reference["best"])), 4)
+        results["backends"][backend] = stats
+        print(backend, json.dumps(stats))
+        del embedder, re_ranker
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+LLM client benchmark: a bare `requests.post` per call versus the pooled provider client.
+
+Usage:
+    python -m benchmarks.bench_llm_clients --users 16 --requests-per-user 25 --fail-rate 0.05
+
+Starts the stand-in Ollama server from `benchmarks.stub_llm_server` in-process and sends the same
+load through both clients, reporting latency percentiles, throughput, failed calls and how many
+TCP connections the server had to accept.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "")
+os.environ.setdefault("GROQ_API_KEY", "")
+os.environ.setdefault("CHROMADB_PATH", tempfile.gettempdir())
+os.environ.setdefault("TMP_DIR", tempfile.gettempdir())
+os.environ.setdefault("OLLAMA_URL", "http://localhost:11434/api/generate")
+
+import requests
+
+from benchmarks.stub_llm_server import StubOllamaHandler, make_server
+from utils.llm_providers import OllamaProvider
+
+
+def bare_call(url):
+    def call(prompt):
+        payload = {"model": "llama3.2", "prompt": prompt, "stream": False}
+        return requests.post(url, headers={"Content-Type": "application/json"}, data=json.dumps(payload))
+    return call
+
+
+def run(name, call, users, requests_per_user):
+    StubOllamaHandler.connections_opened = 0
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+
+    def user(user_id):
+        for i in range(requests_per_user):
+            started = time.perf_counter()
+            try:
+                ok = call(f"question {user_id}-{i}").status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                failures.append(not ok)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(u,)) for u in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "client": name,
+        "calls": len(latencies),
+        "failed": sum(failures),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+        "calls_per_sec": round(len(latencies) / wall, 1),
+        "connections_opened": StubOllamaHandler.connections_opened,
+    }
+    print(json.dumps(result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--requests-per-user", type=int, default=25)
+    parser.add_argument("--first-token-ms", type=float, default=5.0)
+    parser.add_argument("--token-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Optional path for the JSON results.")
+    args = parser.parse_args()
+
+    server = make_server(0, args.first_token_ms, args.token_ms, fail_rate=args.fail_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/generate"
+
+    provider = OllamaProvider(url=url, max_concurrency=args.users)
+    results = [
+        run("bare requests.post", bare_call(url), args.users, args.requests_per_user),
+        run("pooled provider", provider.post, args.users, args.requests_per_user),
+    ]
+    server.shutdown()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Hedged LLM routing benchmark: tail latency of one provider alone vs hedged with a backup.
+
+Usage:
+    python -m benchmarks.bench_llm_hedging --calls 400 --users 8 --slow-rate 0.03 --slow-first-token-ms 2000
+
+Starts the stand-in LLM APIs from `benchmarks.stub_llm_server` in-process, with `--slow-rate` of the
+calls waiting `--slow-first-token-ms` before their first token, and points every provider at it.
+The same calls then go through the router twice, from `--primary` with `--backup` as its fallback:
+  - hedging off: a slow call is waited out,
+  - hedging on: after the LLM_HEDGE_PERCENTILE first-token deadline, the backup is started too.
+Each reports first-token and total latency percentiles, hedges started, answers from the backup and
+failed calls. The first LLM_HEDGE_MIN_SAMPLES calls use LLM_HEDGE_DELAY_MS as the deadline.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--primary", default="ollama", choices=["ollama", "groq", "gemini"])
+    parser.add_argument("--backup", default="groq", choices=["ollama", "groq", "gemini"])
+    parser.add_argument("--first-token-ms", type=float, default=50.0)
+    parser.add_argument("--token-ms", type=float, default=2.0)
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--slow-first-token-ms", type=float, default=2000.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Optional path for the JSON results.")
+    return parser.parse_args()
+
+
+def percentile(values, percent):
+    return round(values[min(len(values) - 1, int(len(values) * percent / 100))], 1)
+
+
+def run(router, primary, calls, users):
+    first_token_ms, total_ms = [], []
+    counts = {"hedged": 0, "answered_by_backup": 0, "failed": 0}
+    lock = threading.Lock()
+    remaining = iter(range(calls))
+
+    def user():
+        while True:
+            with lock:
+                call = next(remaining, None)
+            if call is None:
+                return
+            started = time.perf_counter()
+            first = None
+            routed = router.stream(f"question {call}", primary)
+            try:
+                for _ in routed:
+                    if first is None:
+                        first = time.perf_counter() - started
+            except Exception:
+                with lock:
+                    counts["failed"] += 1
+                continue
+            with lock:
+                first_token_ms.append(first * 1000)
+                total_ms.append((time.perf_counter() - started) * 1000)
+                counts["hedged"] += routed.info["hedged"]
+                counts["answered_by_backup"] += routed.info["provider"] != primary
+
+    threads = [threading.Thread(target=user) for _ in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    first_token_ms.sort()
+    total_ms.sort()
+    return {
+        "first_token_p50_ms": round(statistics.median(first_token_ms), 1),
+        "first_token_p95_ms": percentile(first_token_ms, 95),
+        "first_token_p99_ms": percentile(first_token_ms, 99),
+        "total_p50_ms": round(statistics.median(total_ms), 1),
+        "total_p99_ms": percentile(total_ms, 99),
+        **counts,
+    }
+
+
+def main():
+    args = parse_args()
+    if args.primary == args.backup:
+        raise SystemExit("--primary and --backup must be different providers")
+    from benchmarks.stub_llm_server import make_server
+
+    server = make_server(0, args.first_token_ms, args.token_ms, fail_rate=args.fail_rate, slow_rate=args.slow_rate,
+                         slow_first_token_ms=args.slow_first_token_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.update(OLLAMA_URL=f"{stub_url}/api/generate", GROQ_BASE_URL=stub_url, GEMINI_API_ENDPOINT=stub_url,
+                      GROQ_API_KEY="stub", GEMINI_API_KEY="stub", LLM_MAX_RETRIES="0",
+                      ENABLED_PROVIDERS=f"{args.primary},{args.backup}",
+                      # Enough slots for every user and a hedge each, so no call queues for a slot.
+                      **{f"{name}_MAX_CONCURRENCY": str(2 * args.users) for name in ("OLLAMA", "GROQ", "GEMINI")})
+    os.environ.setdefault("CHROMADB_PATH", tempfile.gettempdir())
+    os.environ.setdefault("TMP_DIR", tempfile.gettempdir())
+
+    from utils.llm_router import LLMRouter
+
+    results = {"calls": args.calls, "users": args.users, "primary": args.primary, "backup": args.backup,
+               "slow_rate": args.slow_rate}
+    for name, hedging in (("unhedged", False), ("hedged", True)):
+        router = LLMRouter(fallback_order=[args.backup], enabled=[args.primary, args.backup], hedging=hedging)
+        results[name] = run(router, args.primary, args.calls, args.users)
+        results[name]["provider_stats"] = router.provider_stats()
+    server.shutdown()
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
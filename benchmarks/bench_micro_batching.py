@@ -0,0 +1,111 @@
+"""
+Micro-batching benchmark: concurrent query embedding + reranking, with and without batching.
+
+Usage:
+    python -m benchmarks.bench_micro_batching --users 50 --requests-per-user 20
+
+Each simulated user encodes one question and reranks it against `--candidates` movie texts
+from tmp/imdb_top_1000.csv, mimicking what a /groq-imdb-chat turn costs on CPU.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "")
+os.environ.setdefault("GROQ_API_KEY", "")
+os.environ.setdefault("CHROMADB_PATH", tempfile.gettempdir())
+os.environ.setdefault("TMP_DIR", tempfile.gettempdir())
+os.environ.setdefault("OLLAMA_URL", "http://localhost:11434/api/generate")
+
+import pandas as pd
+from sentence_transformers import CrossEncoder, SentenceTransformer
+
+from utils.constants import EMBED_MODEL, RERANK_MODEL, EMBED_BATCH_MAX_SIZE, EMBED_BATCH_MAX_WAIT_MS, \
+    RERANK_BATCH_MAX_SIZE, RERANK_BATCH_MAX_WAIT_MS
+from utils.micro_batcher import BatchedCrossEncoder, BatchedEmbeddingModel
+
+QUESTION_TEMPLATES = [
+    "When did {title} release?",
+    "Who directed {title}?",
+    "What is {title} about?",
+    "Who stars in {title}?",
+]
+
+
+def load_workload(csv_path, count, seed=7):
+    df = pd.read_csv(csv_path).fillna("")
+    rng = random.Random(seed)
+    texts = (df["Series_Title"] + ". " + df["Overview"]).tolist()
+    questions = [rng.choice(QUESTION_TEMPLATES).format(title=rng.choice(df["Series_Title"].tolist()))
+                 for _ in range(count)]
+    return questions, texts
+
+
+def run(label, embedder, re_ranker, questions, texts, users, candidates):
+    latencies = []
+    lock = threading.Lock()
+    per_user = len(questions) // users
+
+    def user(slot):
+        rng = random.Random(slot)
+        for question in questions[slot * per_user:(slot + 1) * per_user]:
+            started = time.perf_counter()
+            embedder.encode(question)
+            re_ranker.predict([(question, text) for text in rng.sample(texts, candidates)])
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(slot,)) for slot in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "mode": label,
+        "users": users,
+        "requests": len(latencies),
+        "qps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1),
+    }
+    print(json.dumps(result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="tmp/imdb_top_1000.csv")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--requests-per-user", type=int, default=20)
+    parser.add_argument("--candidates", type=int, default=13, help="Rerank pairs per request.")
+    parser.add_argument("--output", help="Optional path for the JSON results.")
+    args = parser.parse_args()
+
+    questions, texts = load_workload(args.csv, args.users * args.requests_per_user)
+    embedder = SentenceTransformer(EMBED_MODEL)
+    re_ranker = CrossEncoder(RERANK_MODEL)
+
+    results = [
+        run("unbatched", embedder, re_ranker, questions, texts, args.users, args.candidates),
+        run("micro-batched",
+            BatchedEmbeddingModel(embedder, EMBED_BATCH_MAX_SIZE, EMBED_BATCH_MAX_WAIT_MS or 5),
+            BatchedCrossEncoder(re_ranker, RERANK_BATCH_MAX_SIZE, RERANK_BATCH_MAX_WAIT_MS or 5),
+            questions, texts, args.users, args.candidates),
+    ]
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Cold start benchmark: how long a fresh process takes to import the app and load the models.
+
+Usage:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --skip-models --max-import-ms 1500 --output startup.json
+
+Runs `import app` in fresh interpreters with STARTUP_MODE=lazy:
+  - once under `python -X importtime`, reporting the cumulative import time of the slowest modules,
+  - `--runs` times plainly, reporting the median wall time of `import app`,
+  - once more followed by POST /warm-up (unless `--skip-models`), reporting the process's own
+    startup report: import, model load and LLM client creation times.
+With `--max-import-ms` it exits with status 1 when the median import time is over that budget, so
+CI can catch an import that makes startup slow again.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+IMPORT_APP = "import time; started = time.perf_counter(); import app; print((time.perf_counter() - started) * 1000)"
+WARM_UP_APP = (
+    "import json, app\n"
+    "response = app.app.test_client().post('/warm-up')\n"
+    "print(json.dumps({'status': response.status_code, **response.get_json()}))"
+)
+
+
+def environment():
+    env = dict(os.environ, STARTUP_MODE="lazy")
+    env.setdefault("CHROMADB_PATH", tempfile.gettempdir())
+    env.setdefault("TMP_DIR", tempfile.gettempdir())
+    return env
+
+
+def run_python(args, env):
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True)
+
+
+def module_import_times(env, top):
+    """Cumulative import time (ms) of the `top` slowest modules, from `python -X importtime`."""
+    stderr = run_python(["-X", "importtime", "-c", "import app"], env).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        times[module] = max(times.get(module, 0), int(cumulative) / 1000)
+    slowest = sorted(times.items(), key=lambda item: -item[1])[:top]
+    return {module: round(ms, 1) for module, ms in slowest}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes timing `import app`.")
+    parser.add_argument("--top", type=int, default=25, help="Slowest modules to report.")
+    parser.add_argument("--skip-models", action="store_true", help="Do not time the model loads.")
+    parser.add_argument("--max-import-ms", type=float, help="Fail when the median import time is over this.")
+    parser.add_argument("--output", help="Optional path for the JSON results.")
+    args = parser.parse_args()
+
+    env = environment()
+    import_ms = [float(run_python(["-c", IMPORT_APP], env).stdout.strip().splitlines()[-1])
+                 for _ in range(args.runs)]
+    results = {
+        "import_app_ms": round(statistics.median(import_ms), 1),
+        "import_app_runs_ms": [round(ms, 1) for ms in import_ms],
+        "slowest_imports_ms": module_import_times(env, args.top),
+    }
+    if not args.skip_models:
+        results["warm_up"] = json.loads(run_python(["-c", WARM_UP_APP], env).stdout.strip().splitlines()[-1])
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.max_import_ms is not None and results["import_app_ms"] > args.max_import_ms:
+        print(f"import app took {results['import_app_ms']} ms, over the budget of {args.max_import_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Vector store benchmark: Chroma versus the flat memory-mapped store (float16, int8, float32).
+
+Usage:
+    python -m benchmarks.bench_vector_store --rows 1000000
+    python -m benchmarks.bench_vector_store --rows 200000 --backends flat-float16,flat-int8 --random
+
+The catalog is the IMDb dataset scaled up: the embeddings of tmp/imdb_top_1000.csv, repeated
+with small Gaussian noise until `--rows` vectors exist (`--random` uses random unit vectors and
+needs no model). Every backend is queried in its own fresh process, which reports p50/p99 query
+latency (single queries and `--batch`-sized batches), recall@10 against exact float32 search and
+its resident memory split into private (anonymous) and file-backed, shareable pages.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "")
+os.environ.setdefault("GROQ_API_KEY", "")
+os.environ.setdefault("CHROMADB_PATH", tempfile.gettempdir())
+os.environ.setdefault("TMP_DIR", tempfile.gettempdir())
+os.environ.setdefault("OLLAMA_URL", "http://localhost:11434/api/generate")
+
+import numpy as np
+
+WRITE_BATCH = 5000
+TOP_K = 10
+
+
+def catalog(args):
+    """Unit vectors of the scaled-up catalog, generated block by block, with (title, year) of each."""
+    rng = np.random.default_rng(0)
+    if args.random:
+        base, titles = None, None
+    else:
+        import pandas as pd
+
+        from utils.shared_resources import get_embedding_model
+
+        df = pd.read_csv(args.csv)
+        texts = (df["Series_Title"] + " (" + df["Released_Year"].astype(str) + "): " + df["Overview"]).tolist()
+        base = np.asarray(get_embedding_model().encode(texts, batch_size=64), dtype=np.float32)
+        args.dim = base.shape[1]
+        titles = list(zip(df["Series_Title"], df["Released_Year"].astype(str)))
+    for start in range(0, args.rows, WRITE_BATCH):
+        count = min(WRITE_BATCH, args.rows - start)
+        if base is None:
+            block = rng.standard_normal((count, args.dim), dtype=np.float32)
+            meta = [{"title": f"movie {row}", "year": 1900 + row % 125} for row in range(start, start + count)]
+        else:
+            source = np.arange(start, start + count) % len(base)
+            block = base[source] + rng.normal(0, args.noise, (count, base.shape[1])).astype(np.float32)
+            meta = [{"title": f"{titles[i][0]} #{row // len(base)}", "year": titles[i][1]}
+                    for row, i in zip(range(start, start + count), source)]
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        yield start, block, meta
+
+
+def build(backend, path, args):
+    started = time.perf_counter()
+    if backend == "chroma":
+        import chromadb
+
+        store = chromadb.PersistentClient(path=path).get_or_create_collection("bench")
+    else:
+        from utils.flat_vector_store import FlatVectorStore
+
+        store = FlatVectorStore(path, "bench", dtype=backend.split("-", 1)[1])
+    for start, block, meta in catalog(args):
+        store.upsert(ids=[f"doc-{row}" for row in range(start, start + len(block))], embeddings=block.tolist()
+                     if backend == "chroma" else block, metadatas=meta)
+    return time.perf_counter() - started
+
+
+def exact_top_k(args, queries):
+    """Ground truth: exact float32 top-k over the generated catalog."""
+    best = np.full((len(queries), 0), -np.inf, dtype=np.float32), np.empty((len(queries), 0), dtype=np.int64)
+    for start, block, _ in catalog(args):
+        scores = np.concatenate([best[0], queries @ block.T], axis=1)
+        rows = np.concatenate([best[1], np.broadcast_to(np.arange(start, start + len(block)),
+                                                        (len(queries), len(block)))], axis=1)
+        keep = np.argpartition(-scores, TOP_K - 1, axis=1)[:, :TOP_K]
+        best = np.take_along_axis(scores, keep, axis=1), np.take_along_axis(rows, keep, axis=1)
+    return [{f"doc-{row}" for row in rows} for rows in best[1]]
+
+
+def memory():
+    status = {}
+    with open("/proc/self/status", encoding="utf-8") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                status[key] = round(int(value.split()[0]) / 1024, 1)
+    return status
+
+
+def run_queries(backend, path, queries, truth, batch, result_queue):
+    """Runs in a fresh process so its RSS only holds what this backend needs."""
+    if backend == "chroma":
+        import chromadb
+
+        store = chromadb.PersistentClient(path=path).get_collection("bench")
+    else:
+        from utils.flat_vector_store import FlatVectorStore
+
+        store = FlatVectorStore(path, "bench")
+    store.query(query_embeddings=queries[:1].tolist(), n_results=TOP_K)
+
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        result = store.query(query_embeddings=[query.tolist()], n_results=TOP_K)
+        latencies.append((time.perf_counter() - started) * 1000)
+        recalls.append(len(expected & set(result["ids"][0])) / TOP_K)
+    batch_latencies = []
+    for start in range(0, len(queries) - batch + 1, batch):
+        started = time.perf_counter()
+        store.query(query_embeddings=queries[start:start + batch].tolist(), n_results=TOP_K)
+        batch_latencies.append((time.perf_counter() - started) * 1000)
+
+    latencies.sort()
+    batch_latencies.sort()
+    result_queue.put({
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(latencies[int(0.99 * (len(latencies) - 1))], 2),
+        f"batch{batch}_p50_ms": round(statistics.median(batch_latencies), 2) if batch_latencies else None,
+        f"batch{batch}_ms_per_query": round(statistics.median(batch_latencies) / batch, 2) if batch_latencies else None,
+        "recall_at_10": round(statistics.mean(recalls), 4),
+        "memory_mb": memory(),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="tmp/imdb_top_1000.csv")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384, help="Vector size with --random.")
+    parser.add_argument("--noise", type=float, default=0.05, help="Noise added to the repeated IMDb embeddings.")
+    parser.add_argument("--random", action="store_true", help="Random vectors instead of IMDb embeddings.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=16, help="Queries per batched call.")
+    parser.add_argument("--backends", default="chroma,flat-float16,flat-int8,flat-float32")
+    parser.add_argument("--output", help="Optional path for the JSON results.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    queries = next(catalog(args))[1][:args.queries] + rng.normal(0, 0.1, (args.queries, args.dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = exact_top_k(args, queries)
+
+    context = multiprocessing.get_context("spawn")
+    results = {"rows": args.rows, "dim": args.dim, "queries": args.queries, "backends": {}}
+    work_dir = tempfile.mkdtemp(prefix="bench_vector_store_")
+    try:
+        for backend in args.backends.split(","):
+            path = os.path.join(work_dir, backend)
+            build_seconds = build(backend, path, args)
+            result_queue = context.Queue()
+            process = context.Process(target=run_queries, args=(backend, path, queries, truth, args.batch, result_queue))
+            process.start()
+            stats = result_queue.get()
+            process.join()
+            stats["build_seconds"] = round(build_seconds, 1)
+            stats["disk_mb"] = round(sum(os.path.getsize(os.path.join(root, name))
+                                         for root, _, names in os.walk(path) for name in names) / 2 ** 20, 1)
+            results["backends"][backend] = stats
+            print(backend, json.dumps(stats))
+            shutil.rmtree(path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
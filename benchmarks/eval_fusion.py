@@ -0,0 +1,155 @@
+"""
+Offline evaluation of hybrid-search fusion and re-ranking strategies.
+
+Usage:
+    python -m benchmarks.eval_fusion --queries 300
+
+Indexes tmp/imdb_top_1000.csv into a throwaway Chroma directory, generates labelled
+questions from the catalog (each has exactly one correct movie) and runs them through
+`RetrievalHandler.hybrid_search` with:
+
+  * baseline      - vector-first merge by title, every candidate re-ranked (the original behaviour)
+  * rrf           - reciprocal-rank fusion, no re-ranking
+  * rrf+cascade   - reciprocal-rank fusion, top-N re-rank, skip when confident, score cache
+
+and reports hit@1, hit@5, MRR@10, latency percentiles and how many pairs the cross-encoder scored.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("GEMINI_API_KEY", "")
+os.environ.setdefault("GROQ_API_KEY", "")
+os.environ["CHROMADB_PATH"] = tempfile.mkdtemp(prefix="eval_fusion_")
+os.environ.setdefault("TMP_DIR", tempfile.gettempdir())
+os.environ.setdefault("OLLAMA_URL", "http://localhost:11434/api/generate")
+os.environ.setdefault("EMBEDDING_CACHE_CAPACITY", "0")
+
+from chromadb_handler.chromadb_handler import ChromaDBHandler
+from utils.constants import RERANK_TOP_N, chroma_path
+from utils.shared_resources import get_vector_store_client, get_embedding_model, get_re_ranker
+from utils.retrieval_handler import RetrievalHandler
+
+QUESTION_TEMPLATES = [
+    "When did {title} release?",
+    "Who directed {title}?",
+    "What is the IMDB rating of {title}?",
+    "{director} movie starring {star}",
+    "{overview}",
+]
+
+CONFIGURATIONS = {
+    "baseline": {"fusion": "merge", "rerank_top_n": 0, "skip_confident_rerank": False, "cache": False},
+    "rrf": {"fusion": "rrf", "rerank_top_n": 0, "skip_confident_rerank": False, "cache": False, "no_rerank": True},
+    "rrf+cascade": {"fusion": "rrf", "rerank_top_n": RERANK_TOP_N, "skip_confident_rerank": True, "cache": True},
+}
+
+
+class CountingReRanker:
+    """Counts the pairs sent to the cross-encoder; `enabled=False` turns re-ranking into a no-op."""
+
+    def __init__(self, re_ranker):
+        self.re_ranker = re_ranker
+        self.pairs = 0
+        self.enabled = True
+
+    def predict(self, pairs, **kwargs):
+        pairs = list(pairs)
+        if not self.enabled:
+            return [0.0] * len(pairs)
+        self.pairs += len(pairs)
+        return self.re_ranker.predict(pairs, **kwargs)
+
+
+def make_queries(df, count, seed=13):
+    rng = random.Random(seed)
+    rows = df.sample(n=min(count, len(df)), random_state=seed)
+    queries = []
+    for _, row in rows.iterrows():
+        template = rng.choice(QUESTION_TEMPLATES)
+        question = template.format(
+            title=row["Series_Title"],
+            director=row["Director"],
+            star=row["Star1"],
+            overview=str(row["Overview"]).split(".")[0],
+        )
+        queries.append((question, ChromaDBHandler.make_document_id(row["Series_Title"], row["Released_Year"])))
+    # Repeat a share of the questions, as real traffic does, so the score cache has something to reuse.
+    queries += rng.sample(queries, len(queries) // 5)
+    return queries
+
+
+def evaluate(handler, counter, name, config, queries):
+    cache_size = handler.rerank_cache.max_entries
+    handler.rerank_cache.clear()
+    counter.pairs = 0
+    counter.enabled = not config.get("no_rerank")
+    if not config["cache"]:
+        handler.rerank_cache.max_entries = 0
+
+    hits_1 = hits_5 = 0
+    reciprocal_ranks = []
+    latencies = []
+    for question, gold_id in queries:
+        started = time.perf_counter()
+        results = handler.hybrid_search(
+            question,
+            budget_ms=0,
+            fusion=config["fusion"],
+            rerank_top_n=config["rerank_top_n"],
+            skip_confident_rerank=config["skip_confident_rerank"],
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        ids = [doc["id"] for doc in results[:10]]
+        rank = ids.index(gold_id) + 1 if gold_id in ids else None
+        hits_1 += rank == 1
+        hits_5 += rank is not None and rank <= 5
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    handler.rerank_cache.max_entries = cache_size
+    latencies.sort()
+    result = {
+        "config": name,
+        "queries": len(queries),
+        "hit@1": round(hits_1 / len(queries), 4),
+        "hit@5": round(hits_5 / len(queries), 4),
+        "mrr@10": round(statistics.mean(reciprocal_ranks), 4),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 2),
+        "rerank_pairs": counter.pairs,
+    }
+    print(json.dumps(result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="tmp/imdb_top_1000.csv")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--output", help="Optional path for the JSON results.")
+    args = parser.parse_args()
+
+    db_handler = ChromaDBHandler(db_path=chroma_path, collection_name="eval_fusion",
+                                 chroma_client=get_vector_store_client(), embedding_model=get_embedding_model())
+    db_handler.index_csv_stream(args.csv)
+    df = db_handler.load_and_process_csv(args.csv)
+
+    counter = CountingReRanker(get_re_ranker())
+    handler = RetrievalHandler(collection_name="eval_fusion", embedding_model=get_embedding_model(),
+                               re_ranker=counter, chroma_client=get_vector_store_client())
+
+    queries = make_queries(df, args.queries)
+    results = [evaluate(handler, counter, name, config, queries) for name, config in CONFIGURATIONS.items()]
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
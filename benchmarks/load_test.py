@@ -0,0 +1,353 @@
+"""
+End-to-end load test of the HTTP service, with local stand-ins for Ollama, Groq and Gemini.
+
+Usage:
+    python -m benchmarks.load_test --concurrency 1,8,32 --requests 200 --output results.json
+    python -m benchmarks.load_test --scale 100000 --endpoints groq-imdb-chat --gunicorn --workers 2
+    python -m benchmarks.load_test --compare baseline.json --output results.json
+
+Starts the stand-in LLM server of `benchmarks.stub_llm_server` (`--first-token-ms`, `--token-ms`,
+`--tokens`) and the app in its own process (threaded Flask server, or gunicorn with `--gunicorn`),
+pointed at the stand-ins and at a fresh CHROMADB_PATH / TMP_DIR. Then:
+  1. indexes tmp/imdb_top_1000.csv into DEFAULT_COLLECTION through POST /index/create_index and, with
+     `--scale N`, a synthetic catalog of N rows (the CSV repeated under renamed titles) into `imdb_scaled`;
+  2. runs `--index-concurrency` simultaneous uploads of the CSV, timing acceptance and job completion;
+  3. drives every chat endpoint at every concurrency level, for each catalog, with questions about its movies.
+Each scenario reports throughput, p50/p95/p99 latency, errors, the median of every per-stage timing the
+endpoint returns and the peak RSS of the server processes. The JSON results (`--output`) carry the git
+commit; `--compare` prints the change of every scenario against an earlier results file.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from benchmarks.stub_llm_server import make_server
+
+API_PREFIX = "/imdb-chatbot-svc/api/v1"
+CHAT_ENDPOINTS = ("imdb-chat", "groq-imdb-chat", "gemini-imdb-chat")
+QUESTION_TEMPLATES = [
+    "When did {title} release?",
+    "Who directed {title}?",
+    "What is {title} about?",
+    "Recommend movies like {title}",
+    "Who stars in {title}?",
+]
+
+
+def percentile(ordered, share):
+    return round(ordered[int(share * (len(ordered) - 1))], 2)
+
+
+def latency_summary(latencies_ms, wall_seconds):
+    ordered = sorted(latencies_ms)
+    return {
+        "requests": len(ordered),
+        "throughput_rps": round(len(ordered) / wall_seconds, 2) if wall_seconds else None,
+        "p50_ms": percentile(ordered, 0.50) if ordered else None,
+        "p95_ms": percentile(ordered, 0.95) if ordered else None,
+        "p99_ms": percentile(ordered, 0.99) if ordered else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def process_tree(pid):
+    """`pid` and all its descendants (Linux /proc)."""
+    pids = [pid]
+    for current in pids:
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children", encoding="utf-8") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def memory_mb(pid):
+    """Current and peak resident memory, summed over the server's processes."""
+    totals = {"rss_mb": 0.0, "peak_rss_mb": 0.0}
+    for current in process_tree(pid):
+        try:
+            with open(f"/proc/{current}/status", encoding="utf-8") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key in ("VmRSS", "VmHWM"):
+                        totals["rss_mb" if key == "VmRSS" else "peak_rss_mb"] += int(value.split()[0]) / 1024
+        except OSError:
+            continue
+    return {key: round(value, 1) for key, value in totals.items()}
+
+
+def scaled_catalog(csv_path, rows, out_path):
+    """Writes `rows` movies: the CSV repeated, each copy's titles suffixed so every row is a distinct movie."""
+    df = pd.read_csv(csv_path)
+    copies = []
+    for copy in range(-(-rows // len(df))):
+        part = df.copy()
+        if copy:
+            part["Series_Title"] = part["Series_Title"] + f" {copy}"
+        copies.append(part)
+    pd.concat(copies).head(rows).to_csv(out_path, index=False)
+    return out_path
+
+
+class Server:
+    """The app in its own process, configured through the environment."""
+
+    def __init__(self, args, env, log_path):
+        self.base_url = f"http://127.0.0.1:{args.port}"
+        if args.gunicorn:
+            command = ["gunicorn", "-c", "gunicorn.conf.py", "app:app"]
+            env = dict(env, WEB_BIND=f"127.0.0.1:{args.port}", WEB_WORKERS=str(args.workers))
+        else:
+            command = [sys.executable, "-c", f"import app; app.app.run(host='127.0.0.1', port={args.port}, "
+                                             f"threaded=True)"]
+        self.log = open(log_path, "w", encoding="utf-8")
+        self.process = subprocess.Popen(command, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+
+    def wait_ready(self, timeout_s):
+        deadline = time.time() + timeout_s
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {self.process.returncode}; see {self.log.name}")
+            try:
+                if requests.get(self.base_url + "/ready", timeout=2).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.5)
+        raise TimeoutError(f"Server not ready after {timeout_s}s; see {self.log.name}")
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+
+
+def index_csv(base_url, csv_path, collection_name, timeout_s=3600):
+    """Uploads the CSV and waits for its indexing job; returns (accept ms, job seconds, final job status)."""
+    started = time.perf_counter()
+    with open(csv_path, "rb") as f:
+        response = requests.post(f"{base_url}{API_PREFIX}/index/create_index",
+                                 params={"collection_name": collection_name},
+                                 headers={"Content-Type": "text/csv"}, data=f)
+    response.raise_for_status()
+    accept_ms = (time.perf_counter() - started) * 1000
+    status_url = base_url + response.json()["status_url"]
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        job = requests.get(status_url).json()
+        if job.get("status") in ("completed", "failed"):
+            return accept_ms, time.perf_counter() - started, job
+        time.sleep(0.2)
+    raise TimeoutError(f"Indexing '{collection_name}' did not finish in {timeout_s}s")
+
+
+def run_concurrently(concurrency, count, task):
+    """Runs `task(i)` for i in range(count) on `concurrency` threads; returns the wall time in seconds."""
+    next_index = iter(range(count))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(next_index, None)
+            if i is None:
+                return
+            task(i)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def index_scenario(server, csv_path, concurrency):
+    accept_ms, job_seconds, failed = [], [], []
+    lock = threading.Lock()
+
+    def upload(i):
+        accepted, seconds, job = index_csv(server.base_url, csv_path, f"load_test_{i}")
+        with lock:
+            accept_ms.append(accepted)
+            job_seconds.append(seconds * 1000)
+            failed.append(job.get("status") != "completed")
+
+    wall = run_concurrently(concurrency, concurrency, upload)
+    result = {"scenario": "create_index", "concurrency": concurrency, "errors": sum(failed),
+              **latency_summary(job_seconds, wall), "accept_p50_ms": round(statistics.median(accept_ms), 2),
+              **memory_mb(server.process.pid)}
+    return result
+
+
+def chat_scenario(server, endpoint, catalog, collection, questions, concurrency, count, use_cache):
+    latencies, errors, stages, error_details = [], [], {}, []
+    lock = threading.Lock()
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_maxsize=max(10, concurrency)))
+
+    def ask(i):
+        payload = {"message": questions[i % len(questions)], "use_cache": use_cache, "collection": collection}
+        started = time.perf_counter()
+        try:
+            response = session.post(f"{server.base_url}{API_PREFIX}/imdb-chatbot-svc/{endpoint}", json=payload)
+            ok, body = response.status_code == 200, response.json()
+        except (requests.RequestException, ValueError) as e:
+            ok, body = False, {"details": str(e)}
+        elapsed = (time.perf_counter() - started) * 1000
+        numbers = {key: value for key, value in (body.get("timings") or {}).items()
+                   if isinstance(value, (int, float))}
+        if isinstance(body.get("prompt_stats"), dict):
+            numbers["prompt_tokens"] = body["prompt_stats"].get("prompt_tokens")
+        with lock:
+            latencies.append(elapsed)
+            errors.append(not ok)
+            if not ok and not error_details:
+                error_details.append(body.get("details") or body.get("error"))
+            for key, value in numbers.items():
+                if value is not None:
+                    stages.setdefault(key, []).append(value)
+
+    wall = run_concurrently(concurrency, count, ask)
+    return {
+        "scenario": endpoint, "catalog": catalog, "concurrency": concurrency, "errors": sum(errors),
+        "first_error": error_details[0] if error_details else None, **latency_summary(latencies, wall),
+        "stages_p50": {key: round(statistics.median(values), 2) for key, values in sorted(stages.items())},
+        **memory_mb(server.process.pid),
+    }
+
+
+def scenario_key(result):
+    return f"{result['scenario']}/{result.get('catalog', '-')}/c{result['concurrency']}"
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {scenario_key(r): r for r in json.load(f)["scenarios"]}
+    print(f"\nChange against {baseline_path}:")
+    for result in results["scenarios"]:
+        before = baseline.get(scenario_key(result))
+        if before is None:
+            continue
+        changes = []
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb"):
+            if before.get(metric) and result.get(metric) is not None:
+                changes.append(f"{metric} {before[metric]} -> {result[metric]} "
+                               f"({(result[metric] / before[metric] - 1) * 100:+.1f}%)")
+        print(f"  {scenario_key(result)}: " + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="tmp/imdb_top_1000.csv")
+    parser.add_argument("--scale", type=int, default=0, help="Also index and query a synthetic catalog of N rows.")
+    parser.add_argument("--endpoints", default=",".join(CHAT_ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,8,32", help="Concurrency levels of the chat scenarios.")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per chat scenario.")
+    parser.add_argument("--index-concurrency", type=int, default=2, help="Simultaneous uploads (0 skips).")
+    parser.add_argument("--use-cache", action="store_true", help="Let the semantic answer cache answer repeats.")
+    parser.add_argument("--first-token-ms", type=float, default=300.0, help="Stand-in LLM time to first token.")
+    parser.add_argument("--token-ms", type=float, default=10.0, help="Stand-in LLM time per token.")
+    parser.add_argument("--tokens", type=int, default=60, help="Tokens per stand-in answer.")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--gunicorn", action="store_true", help="Serve with gunicorn.conf.py instead of Flask.")
+    parser.add_argument("--workers", type=int, default=2, help="Gunicorn workers.")
+    parser.add_argument("--ready-timeout", type=float, default=600)
+    parser.add_argument("--keep", action="store_true", help="Keep the work directory (index, server log).")
+    parser.add_argument("--compare", help="Earlier results file to compare against.")
+    parser.add_argument("--output", help="Optional path for the JSON results.")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="load_test_")
+    stub = make_server(0, args.first_token_ms, args.token_ms, args.tokens)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{stub.server_address[1]}"
+    env = dict(os.environ, CHROMADB_PATH=os.path.join(work_dir, "chroma"), TMP_DIR=work_dir,
+               OLLAMA_URL=f"{stub_url}/api/generate", GROQ_BASE_URL=stub_url, GEMINI_API_ENDPOINT=stub_url,
+               GROQ_API_KEY="stub", GEMINI_API_KEY="stub", ENABLED_PROVIDERS="ollama,groq,gemini",
+               STARTUP_MODE="eager", PYTHONUNBUFFERED="1")
+    os.makedirs(env["CHROMADB_PATH"])
+
+    results = {
+        "commit": git_commit(),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("compare", "output", "keep")},
+        "scenarios": [],
+    }
+    server = Server(args, env, os.path.join(work_dir, "server.log"))
+    try:
+        started = time.perf_counter()
+        server.wait_ready(args.ready_timeout)
+        results["startup_seconds"] = round(time.perf_counter() - started, 2)
+        results["idle_memory"] = memory_mb(server.process.pid)
+
+        catalogs = {"imdb": (args.csv, None)}
+        if args.scale:
+            catalogs["scaled"] = (scaled_catalog(args.csv, args.scale, os.path.join(work_dir, "scaled.csv")),
+                                  "imdb_scaled")
+        results["indexing"] = {}
+        for catalog, (csv_path, collection) in catalogs.items():
+            accept_ms, seconds, job = index_csv(server.base_url, csv_path, collection or "imdb_chatbot")
+            results["indexing"][catalog] = {"rows": job.get("rows_processed"), "seconds": round(seconds, 2),
+                                            "rows_per_sec": job.get("rows_per_sec"), "status": job.get("status")}
+            print(catalog, json.dumps(results["indexing"][catalog]))
+
+        if args.index_concurrency:
+            result = index_scenario(server, args.csv, args.index_concurrency)
+            results["scenarios"].append(result)
+            print(json.dumps(result))
+
+        rng = random.Random(7)
+        for catalog, (csv_path, collection) in catalogs.items():
+            titles = pd.read_csv(csv_path, usecols=["Series_Title"])["Series_Title"].tolist()
+            questions = [rng.choice(QUESTION_TEMPLATES).format(title=rng.choice(titles))
+                         for _ in range(args.requests)]
+            for endpoint in args.endpoints.split(","):
+                for concurrency in [int(level) for level in args.concurrency.split(",")]:
+                    result = chat_scenario(server, endpoint, catalog, collection, questions, concurrency,
+                                           args.requests, args.use_cache)
+                    results["scenarios"].append(result)
+                    print(json.dumps(result))
+    finally:
+        server.stop()
+        stub.shutdown()
+        if args.keep:
+            print(f"Work directory kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
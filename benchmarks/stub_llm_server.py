@@ -0,0 +1,173 @@
+"""
+Local stand-in for the Ollama, Groq and Gemini APIs, for exercising the LLM provider clients without a model.
+
+Usage:
+    python -m benchmarks.stub_llm_server --port 11500 --first-token-ms 50 --token-ms 5 --fail-rate 0.1
+
+Serves, with the same latency and token rate for all three:
+  - POST /api/generate like Ollama: one JSON body when "stream" is false, NDJSON chunks otherwise.
+    Point the service at it with OLLAMA_URL=http://localhost:11500/api/generate.
+  - POST /openai/v1/chat/completions like Groq: a chat completion, or server-sent chunks with "stream".
+    Use GROQ_BASE_URL=http://localhost:11500 and any GROQ_API_KEY.
+  - POST /v1beta/models/<model>:generateContent and :streamGenerateContent like the Gemini REST API
+    (the streamed form is one JSON array sent piece by piece).
+    Use GEMINI_API_ENDPOINT=http://localhost:11500 and any GEMINI_API_KEY.
+`--fail-rate` answers that share of requests with a 503, to exercise retries. `--slow-rate` makes that share
+wait `--slow-first-token-ms` instead before the first token, to give the stand-in a latency tail.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+WORDS = "the movie was directed by a famous filmmaker and released to wide acclaim".split()
+
+
+def _api_of(path):
+    if path == "/api/generate":
+        return "ollama"
+    if path == "/openai/v1/chat/completions":
+        return "groq"
+    if path.startswith("/v1beta/models/") and path.endswith((":generateContent", ":streamGenerateContent")):
+        return "gemini"
+    return None
+
+
+def _groq_body(model, text, streamed):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    if streamed:
+        choice = {"index": 0, "delta": {"content": text}, "finish_reason": None}
+        return {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": model, "choices": [choice]}
+    choice = {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+    return {"id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [choice], "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
+
+
+def _gemini_body(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP",
+                            "index": 0}]}
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, keep-alive clients stall on delayed ACKs.
+    disable_nagle_algorithm = True
+    settings = None
+    requests_served = 0
+    connections_opened = 0
+    counter_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with self.counter_lock:
+            StubOllamaHandler.connections_opened += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        with self.counter_lock:
+            StubOllamaHandler.requests_served += 1
+
+        path = urlsplit(self.path).path
+        api = _api_of(path)
+        if api is None:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+            return
+        if random.random() < self.settings.fail_rate:
+            self._send_json(503, {"error": {"code": 503, "message": "stub overloaded", "status": "UNAVAILABLE"}})
+            return
+
+        tokens = [random.choice(WORDS) + " " for _ in range(self.settings.tokens)]
+        if api == "gemini":
+            model, stream = path.split("/")[-1].split(":")[0], path.endswith(":streamGenerateContent")
+        else:
+            model, stream = payload.get("model", "llama3.2"), payload.get("stream", api == "ollama")
+        slow = random.random() < self.settings.slow_rate
+        time.sleep((self.settings.slow_first_token_ms if slow else self.settings.first_token_ms) / 1000)
+
+        if not stream:
+            time.sleep(self.settings.token_ms * len(tokens) / 1000)
+            text = "".join(tokens)
+            if api == "ollama":
+                body = {"model": model, "response": text, "done": True}
+            elif api == "groq":
+                body = _groq_body(model, text, streamed=False)
+            else:
+                body = _gemini_body(text)
+            self._send_json(200, body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", {"ollama": "application/x-ndjson", "groq": "text/event-stream",
+                                          "gemini": "application/json"}[api])
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for position, token in enumerate(tokens):
+            if api == "ollama":
+                self._write_chunk(json.dumps({"model": model, "response": token, "done": False}) + "\n")
+            elif api == "groq":
+                self._write_chunk(f"data: {json.dumps(_groq_body(model, token, streamed=True))}\n\n")
+            else:
+                self._write_chunk(("[" if position == 0 else ",") + json.dumps(_gemini_body(token)))
+            time.sleep(self.settings.token_ms / 1000)
+        if api == "ollama":
+            self._write_chunk(json.dumps({"model": model, "response": "", "done": True}) + "\n")
+        elif api == "groq":
+            self._write_chunk("data: [DONE]\n\n")
+        else:
+            self._write_chunk("]" if tokens else "[]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def make_server(port=11500, first_token_ms=50.0, token_ms=5.0, tokens=20, fail_rate=0.0, slow_rate=0.0,
+                slow_first_token_ms=2000.0):
+    """Returns a ThreadingHTTPServer bound to localhost:`port` (0 picks a free port); call serve_forever()."""
+    settings = argparse.Namespace(first_token_ms=first_token_ms, token_ms=token_ms, tokens=tokens,
+                                  fail_rate=fail_rate, slow_rate=slow_rate, slow_first_token_ms=slow_first_token_ms)
+    handler = type("ConfiguredStubOllamaHandler", (StubOllamaHandler,), {"settings": settings})
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--first-token-ms", type=float, default=50.0)
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-first-token-ms", type=float, default=2000.0)
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.first_token_ms, args.token_ms, args.tokens, args.fail_rate, args.slow_rate,
+                         args.slow_first_token_ms)
+    print(f"Stub LLM APIs listening on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
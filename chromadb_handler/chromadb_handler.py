@@ -1,88 +1,331 @@
-import chromadb
+import hashlib
+import json
+import os
+import time
+
 import pandas as pd
-from sentence_transformers import SentenceTransformer
-from utils.constants import EMBED_MODEL
+from utils import metrics
+from utils.constants import INDEX_EMBED_BATCH_SIZE, INDEX_WRITE_CHUNK_SIZE, INDEX_CSV_CHUNK_ROWS
+from utils.bm25_index import BM25Index, keyword_index_path
+from utils.retrieval_handler import RetrievalHandler
+from utils.shared_resources import get_embedding_model, get_vector_store_client
+
+# Columns of the IMDb CSV used for indexing; anything else (e.g. Poster_Link) is never loaded.
+CSV_COLUMNS = [
+    "Series_Title", "Released_Year", "Certificate", "Runtime", "Genre", "IMDB_Rating", "Overview",
+    "Meta_score", "Director", "Star1", "Star2", "Star3", "Star4", "No_of_Votes", "Gross",
+]
+# Free-text columns are read as strings so every chunk gets the same dtypes.
+CSV_TEXT_DTYPES = {
+    column: str for column in CSV_COLUMNS if column not in ("IMDB_Rating", "Meta_score", "No_of_Votes")
+}
 
 
 class ChromaDBHandler:
-    """Handles ChromaDB operations: indexing, querying, and deletion."""
+    """
+    Handles vector store operations: indexing, querying, and deletion.
+    The store is ChromaDB or the flat memory-mapped store, depending on VECTOR_STORE_BACKEND.
+    """
 
-    def __init__(self, db_path, collection_name=None):
+    def __init__(self, db_path, collection_name=None, chroma_client=None, embedding_model=None):
 
         self.db_path = db_path
         self.collection_name = collection_name
 
-        self.chroma_client = chromadb.PersistentClient(path=db_path)
+        self.chroma_client = chroma_client or get_vector_store_client(db_path)
         self.collection = None
         if collection_name:
             self.collection = self.chroma_client.get_or_create_collection(name=collection_name)
 
-        self.embedding_model = SentenceTransformer(EMBED_MODEL)
+        self._embedding_model = embedding_model
+        self.keyword_index_path = keyword_index_path(db_path, collection_name) if collection_name else None
 
-    def load_and_process_csv(self, file_path):
+    @property
+    def embedding_model(self):
+        # Loaded on first use so listing or deleting collections never pays for the model.
+        if self._embedding_model is None:
+            self._embedding_model = get_embedding_model()
+        return self._embedding_model
 
-        df = pd.read_csv(file_path)
+    def iter_csv_chunks(self, source, chunk_rows=INDEX_CSV_CHUNK_ROWS):
+        """
+        Reads an IMDb CSV in chunks of `chunk_rows` rows and yields each one preprocessed.
+
+        :param source: Path or readable binary/text stream (e.g. an upload stream)
+        :param chunk_rows: Number of rows held in memory at a time
+        """
+        reader = pd.read_csv(
+            source,
+            chunksize=chunk_rows,
+            usecols=lambda column: column in CSV_COLUMNS,
+            dtype=CSV_TEXT_DTYPES,
+        )
+        with reader:
+            for chunk in reader:
+                yield self.process_chunk(chunk)
+
+    @staticmethod
+    def process_chunk(df):
+        """
+        Normalizes the IMDb columns of `df` in place and adds the `text` column used for embeddings.
+
+        :param df: Raw DataFrame (or chunk) read from the IMDb CSV
+        :return: The same DataFrame, preprocessed
+        """
         df["Meta_score"] = df["Meta_score"].fillna(0).astype(int)
         df["No_of_Votes"] = df["No_of_Votes"].fillna(0).astype(int)
         df["IMDB_Rating"] = df["IMDB_Rating"].fillna(0.0).astype(float)
         df["Gross"] = df["Gross"].fillna("").astype(str)
         df.fillna("", inplace=True)
 
-        df["text"] = df.apply(lambda row: (
-            f"Title: {row['Series_Title']}\n"
-            f"Year: {row['Released_Year']}\n"
-            f"Certificate: {row['Certificate']}\n"
-            f"Runtime: {row['Runtime']}\n"
-            f"Genre: {row['Genre']}\n"
-            f"IMDB Rating: {row['IMDB_Rating']}\n"
-            f"Overview: {row['Overview']}\n"
-            f"Meta Score: {row['Meta_score']}\n"
-            f"Director: {row['Director']}\n"
-            f"Stars: {row['Star1']}, {row['Star2']}, {row['Star3']}, {row['Star4']}\n"
-            f"Number of Votes: {row['No_of_Votes']}\n"
-            f"Gross Revenue: {row['Gross']}\n"
-        ), axis=1)
+        df["text"] = (
+            "Title: " + df["Series_Title"].astype(str)
+            + "\nYear: " + df["Released_Year"].astype(str)
+            + "\nCertificate: " + df["Certificate"].astype(str)
+            + "\nRuntime: " + df["Runtime"].astype(str)
+            + "\nGenre: " + df["Genre"].astype(str)
+            + "\nIMDB Rating: " + df["IMDB_Rating"].astype(str)
+            + "\nOverview: " + df["Overview"].astype(str)
+            + "\nMeta Score: " + df["Meta_score"].astype(str)
+            + "\nDirector: " + df["Director"].astype(str)
+            + "\nStars: " + df["Star1"].astype(str) + ", " + df["Star2"].astype(str)
+            + ", " + df["Star3"].astype(str) + ", " + df["Star4"].astype(str)
+            + "\nNumber of Votes: " + df["No_of_Votes"].astype(str)
+            + "\nGross Revenue: " + df["Gross"] + "\n"
+        )
 
         return df
 
-    def index_data_into_chroma(self, df):
+    def load_and_process_csv(self, file_path):
+        """Loads and preprocesses a whole IMDb CSV in memory. Prefer `index_csv_stream` for large files."""
+        df = pd.read_csv(file_path, usecols=lambda column: column in CSV_COLUMNS, dtype=CSV_TEXT_DTYPES)
+        return self.process_chunk(df)
+
+    def index_csv_stream(self, source, chunk_rows=INDEX_CSV_CHUNK_ROWS, progress=None, incremental=False):
+        """
+        Streams an IMDb CSV into ChromaDB: each chunk is read, preprocessed, embedded and
+        written before the next one is read, so memory stays flat regardless of file size.
+
+        In incremental mode only new or changed rows are embedded. In both modes, documents
+        whose id no longer appears anywhere in the file are deleted once the stream ends, so the
+        collection holds exactly the file's movies. This also removes the positional ids ("0",
+        "1", ...) of collections indexed before movies were keyed by `make_document_id`, which
+        would otherwise sit next to their re-indexed copies.
+
+        :param source: Path or readable stream of the CSV
+        :param chunk_rows: Number of CSV rows processed per step
+        :param progress: Optional callable invoked with the row count of every indexed chunk
+        :param incremental: Embed only new or changed rows instead of every row
+        :return: Dict with row counts (added/updated/skipped/removed), elapsed seconds and rows/sec
         """
-        Generate embeddings and insert IMDb data into ChromaDB.
+        started = time.perf_counter()
+        totals = {"rows": 0, "added": 0, "updated": 0, "skipped": 0, "removed": 0}
+        seen_ids = set()
+        keyword_index = self.load_keyword_index()
+        chunks = self.iter_csv_chunks(source, chunk_rows=chunk_rows)
+        try:
+            while True:
+                with metrics.span("index_read"):
+                    df = next(chunks, None)
+                if df is None:
+                    break
+                chunk_stats = self.index_data_into_chroma(df, incremental=incremental, seen_ids=seen_ids,
+                                                          keyword_index=keyword_index)
+                for key in ("rows", "added", "updated", "skipped"):
+                    totals[key] += chunk_stats[key]
+                if progress:
+                    progress(chunk_stats["rows"])
+
+            with metrics.span("index_delete"):
+                totals["removed"] = self.delete_missing_documents(seen_ids, keyword_index=keyword_index)
+        finally:
+            # Also after a failure: the chunks already written to the store stay searchable by keyword.
+            with metrics.span("index_keyword_save"):
+                keyword_index.save(self.keyword_index_path)
+
+        elapsed = time.perf_counter() - started
+        rows_per_sec = totals["rows"] / elapsed if elapsed > 0 else 0.0
+        totals.update({"seconds": round(elapsed, 3), "rows_per_sec": round(rows_per_sec, 1)})
+        return totals
+
+    @staticmethod
+    def make_document_id(title, year):
+        """Stable Chroma id for a movie: survives row reordering and insertions in the CSV."""
+        key = f"{str(title).strip().lower()}|{str(year).strip()}"
+        return "movie-" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+    @staticmethod
+    def content_hash(metadata):
+        """Hash of a movie's metadata, used to detect rows that changed since the last index."""
+        payload = json.dumps(metadata, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def build_metadatas(df):
+        """
+        Builds the Chroma metadata dicts for every row of `df`, column by column.
+        Numeric fields are stored as numbers (`year`, `rating`, `meta_score`, `votes`, plus
+        `runtime_min` and `gross_usd` parsed from the display strings) so range filters can be
+        pushed down to Chroma. Each dict carries a `content_hash` of the other fields.
 
         :param df: Preprocessed DataFrame containing movie metadata
+        :return: List of metadata dicts, in DataFrame order
         """
-        for index, row in df.iterrows():
-            embedding = self.embedding_model.encode(row["text"]).tolist()
-
-            metadata = {
-                "title": row["Series_Title"],
-                "year": str(row["Released_Year"]),
-                "certificate": row["Certificate"],
-                "runtime": row["Runtime"],
-                "genre": row["Genre"],
-                "rating": str(row["IMDB_Rating"]),
-                "overview": row["Overview"],
-                "meta_score": str(row["Meta_score"]),
-                "director": row["Director"],
-                # "stars": ", ".join([star.strip() for star in [row["Star1"], row["Star2"], row["Star3"], row["Star4"]] if star]),
-                "stars": ", ".join([row["Star1"], row["Star2"], row["Star3"], row["Star4"]]),
-                "votes": str(row["No_of_Votes"]),
-                "gross": row["Gross"]
-            }
-
-            self.collection.add(
-                ids=[str(index)],
-                embeddings=[embedding],
-                metadatas=[metadata]
-            )
-
-        print(f"Data successfully indexed into ChromaDB collection '{self.collection_name}'!")
+        stars = (df["Star1"].astype(str) + ", " + df["Star2"].astype(str) + ", "
+                 + df["Star3"].astype(str) + ", " + df["Star4"].astype(str))
+        runtime_min = pd.to_numeric(df["Runtime"].astype(str).str.extract(r"(\d+)", expand=False), errors="coerce")
+        gross_usd = pd.to_numeric(df["Gross"].str.replace(",", "", regex=False), errors="coerce")
+        columns = {
+            "title": df["Series_Title"].tolist(),
+            "year": pd.to_numeric(df["Released_Year"], errors="coerce").fillna(0).astype(int).tolist(),
+            "certificate": df["Certificate"].tolist(),
+            "runtime": df["Runtime"].tolist(),
+            "runtime_min": runtime_min.fillna(0).astype(int).tolist(),
+            "genre": df["Genre"].tolist(),
+            "rating": df["IMDB_Rating"].astype(float).tolist(),
+            "overview": df["Overview"].tolist(),
+            "meta_score": df["Meta_score"].astype(int).tolist(),
+            "director": df["Director"].tolist(),
+            "stars": stars.tolist(),
+            "votes": df["No_of_Votes"].astype(int).tolist(),
+            "gross": df["Gross"].tolist(),
+            "gross_usd": gross_usd.fillna(0).astype("int64").tolist(),
+        }
+        keys = list(columns)
+        metadatas = [dict(zip(keys, values)) for values in zip(*columns.values())]
+        for metadata in metadatas:
+            metadata["content_hash"] = ChromaDBHandler.content_hash(metadata)
+        return metadatas
+
+    def index_data_into_chroma(self, df, batch_size=INDEX_EMBED_BATCH_SIZE, write_chunk_size=INDEX_WRITE_CHUNK_SIZE,
+                               incremental=False, seen_ids=None, keyword_index=None):
+        """
+        Generate embeddings and upsert IMDb data into ChromaDB.
+
+        Rows are written in chunks of `write_chunk_size`; each chunk is embedded
+        with batched forward passes of `batch_size` texts and stored with a single
+        `collection.upsert` call. Documents are keyed by `make_document_id` (title and year);
+        when a title/year appears twice, the last row wins. The collection's BM25 index is
+        updated with the same rows.
+
+        :param df: Preprocessed DataFrame containing movie metadata
+        :param batch_size: Number of texts per embedding forward pass
+        :param write_chunk_size: Number of rows per Chroma write
+        :param incremental: Skip rows whose stored `content_hash` is unchanged
+        :param seen_ids: Optional set collecting every document id in `df`
+        :param keyword_index: BM25Index to update; when omitted, the saved index is loaded and saved again
+        :return: Dict with row counts (added/updated/skipped), elapsed seconds and rows/sec
+        """
+        started = time.perf_counter()
+        owns_keyword_index = keyword_index is None
+        if owns_keyword_index:
+            keyword_index = self.load_keyword_index()
+        stats = {"rows": len(df), "added": 0, "updated": 0, "skipped": 0}
+
+        ids = [self.make_document_id(title, year) for title, year in zip(df["Series_Title"], df["Released_Year"])]
+        df = df.assign(_id=ids).drop_duplicates(subset="_id", keep="last")
+        if seen_ids is not None:
+            seen_ids.update(df["_id"])
+
+        try:
+            for chunk_start in range(0, len(df), write_chunk_size):
+                chunk = df.iloc[chunk_start:chunk_start + write_chunk_size]
+                chunk_ids = chunk["_id"].tolist()
+                with metrics.span("index_prepare"):
+                    metadatas = self.build_metadatas(chunk)
+
+                with metrics.span("index_lookup"):
+                    existing = self.collection.get(ids=chunk_ids, include=["metadatas"])
+                stored_hashes = {
+                    doc_id: (meta or {}).get("content_hash")
+                    for doc_id, meta in zip(existing["ids"], existing["metadatas"])
+                }
+
+                positions = []
+                for position, (doc_id, metadata) in enumerate(zip(chunk_ids, metadatas)):
+                    if doc_id not in stored_hashes:
+                        stats["added"] += 1
+                    elif incremental and stored_hashes[doc_id] == metadata["content_hash"]:
+                        stats["skipped"] += 1
+                        continue
+                    else:
+                        stats["updated"] += 1
+                    positions.append(position)
+
+                if not positions:
+                    continue
+
+                with metrics.span("index_embed"):
+                    embeddings = self.embedding_model.encode(
+                        chunk["text"].iloc[positions].tolist(),
+                        batch_size=batch_size,
+                        convert_to_numpy=True,
+                        show_progress_bar=False,
+                    )
+
+                changed_ids = [chunk_ids[position] for position in positions]
+                changed_metadatas = [metadatas[position] for position in positions]
+                with metrics.span("index_write"):
+                    self.collection.upsert(
+                        ids=changed_ids,
+                        embeddings=embeddings.tolist(),
+                        metadatas=changed_metadatas
+                    )
+                with metrics.span("index_keyword"):
+                    keyword_index.upsert(changed_ids,
+                                         [RetrievalHandler.combine_metadata(meta) for meta in changed_metadatas])
+        finally:
+            if owns_keyword_index:
+                with metrics.span("index_keyword_save"):
+                    keyword_index.save(self.keyword_index_path)
+        for outcome in ("added", "updated", "skipped"):
+            metrics.INDEXED_ROWS.inc(outcome, amount=stats[outcome])
+
+        elapsed = time.perf_counter() - started
+        rows_per_sec = stats["rows"] / elapsed if elapsed > 0 else 0.0
+        print(f"Data successfully indexed into ChromaDB collection '{self.collection_name}'! "
+              f"({stats['rows']} rows in {elapsed:.2f}s, {rows_per_sec:.1f} rows/sec; "
+              f"{stats['added']} added, {stats['updated']} updated, {stats['skipped']} unchanged)")
+
+        stats.update({"seconds": round(elapsed, 3), "rows_per_sec": round(rows_per_sec, 1)})
+        return stats
+
+    def load_keyword_index(self):
+        """Loads the collection's BM25 index, building it from the stored documents if it was never saved."""
+        return BM25Index.load_or_build(self.keyword_index_path, self.collection, RetrievalHandler.combine_metadata)
+
+    def delete_missing_documents(self, keep_ids, page_size=INDEX_WRITE_CHUNK_SIZE, keyword_index=None):
+        """
+        Deletes every document of the collection whose id is not in `keep_ids`.
+
+        :param keep_ids: Ids present in the latest version of the catalog
+        :param page_size: Number of stored ids fetched per page
+        :param keyword_index: Optional BM25Index to remove the same documents from
+        :return: Number of deleted documents
+        """
+        stale_ids = []
+        offset = 0
+        while True:
+            page = self.collection.get(include=[], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            stale_ids.extend(doc_id for doc_id in page["ids"] if doc_id not in keep_ids)
+            offset += len(page["ids"])
+
+        for start in range(0, len(stale_ids), page_size):
+            self.collection.delete(ids=stale_ids[start:start + page_size])
+        if keyword_index is not None:
+            keyword_index.remove(stale_ids)
+
+        return len(stale_ids)
 
     def delete_collection(self):
         """
         Delete the entire ChromaDB collection.
         """
         self.chroma_client.delete_collection(name=self.collection_name)
+        if os.path.exists(self.keyword_index_path):
+            os.remove(self.keyword_index_path)
         print(f"Collection '{self.collection_name}' has been deleted successfully!")
 
     def get_all_collections(self):
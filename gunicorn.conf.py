@@ -0,0 +1,71 @@
+"""
+Gunicorn settings for the production server:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app and both models are loaded once in the master process (`preload_app`) and
+warmed up there, then the workers are forked and share the model weights
+copy-on-write instead of each loading its own copy. Every worker warms up again in
+the background (first encode/predict on its own threads, retrieval handler, Chroma
+client) and reports ready on `/ready` when done. On SIGTERM a worker first fails
+`/ready` for `WEB_DRAIN_SECONDS` so load balancers stop sending it traffic, then stops
+accepting connections and finishes in-flight requests within the graceful timeout.
+
+With STARTUP_MODE=lazy nothing is loaded before forking: workers are ready at once
+and load torch and the models on first use.
+"""
+import multiprocessing
+import os
+import signal
+import threading
+
+bind = os.environ.get("WEB_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count()))
+worker_class = "gthread"
+# Threads per worker: requests mostly wait on the LLM, and micro-batching merges their model calls.
+threads = int(os.environ.get("WEB_THREADS", 8))
+preload_app = True
+# Streamed LLM answers can take a while; the timeout only kills workers that stop heartbeating.
+timeout = int(os.environ.get("WEB_TIMEOUT", 120))
+
+_drain_seconds = float(os.environ.get("WEB_DRAIN_SECONDS", 5))
+graceful_timeout = int(_drain_seconds + int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 60)))
+# Torch threads per worker; by default the cores are split evenly between the workers.
+_torch_threads = int(os.environ.get("TORCH_THREADS_PER_WORKER", max(1, multiprocessing.cpu_count() // workers)))
+
+
+def when_ready(server):
+    """Runs in the master after the app is preloaded and before any worker is forked."""
+    from utils.constants import STARTUP_MODE
+
+    if STARTUP_MODE == "lazy":
+        server.log.info("Lazy startup: forking %s workers without loading models", workers)
+        return
+
+    import torch
+    from utils.shared_resources import preload_models
+
+    # A multi-threaded OpenMP pool in the parent does not survive fork; warm up single-threaded.
+    torch.set_num_threads(1)
+    preload_models()
+    server.log.info("Models loaded in master %s; forking %s workers", os.getpid(), workers)
+
+
+def post_fork(server, worker):
+    from utils.inference_backend import set_threads
+
+    set_threads(_torch_threads)
+
+
+def post_worker_init(worker):
+    from webserver import health
+
+    stop = worker.handle_exit
+
+    def drain(sig, frame):
+        health.start_draining()
+        worker.log.info("Worker %s draining for %ss before shutdown", os.getpid(), _drain_seconds)
+        threading.Timer(_drain_seconds, stop, args=(sig, frame)).start()
+
+    signal.signal(signal.SIGTERM, drain)
+    health.start_warm_up()
@@ -1,3 +1,6 @@
+import json
+import uuid
+
 import streamlit as st
 import requests
 
@@ -9,6 +12,29 @@ BACKEND_URLS = {
 }
 
 
+def stream_tokens(backend_url, message, model, session_id):
+    """Yields the bot's answer token by token from the backend's server-sent events."""
+    payload = {"message": message, "model": model, "stream": True, "session_id": session_id}
+    with requests.post(backend_url, json=payload, stream=True) as response:
+        if "text/event-stream" not in response.headers.get("Content-Type", ""):
+            # Answers that need no LLM call (e.g. no matching movies) come back as plain JSON.
+            yield response.json().get("response", "Sorry, I couldn't find that information.")
+            return
+
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                event = None
+            elif line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "error":
+                    yield f"⚠️ Error: {data.get('details', data.get('error'))}"
+                elif event is None and "token" in data:
+                    yield data["token"]
+
+
 st.set_page_config(page_title="IMDb Chatbot", page_icon="🎥", layout="centered")
 
 st.markdown(
@@ -66,6 +92,9 @@ st.markdown(
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "session_id" not in st.session_state:
+    # The backend keeps the conversation under this id, so follow-up questions can refer to earlier answers.
+    st.session_state.session_id = uuid.uuid4().hex
 
 st.markdown("<h3 style='text-align: center;'>🤖 Chat with IMDb Bot</h3>", unsafe_allow_html=True)
 
@@ -88,11 +117,9 @@ if st.button("Send 🎬"):
         backend_url = BACKEND_URLS.get(selected_model, BACKEND_URLS[selected_model])
 
         try:
-            response = requests.post(
-                backend_url,
-                json={"message": user_input, "model": selected_model}
-            ).json()
-            bot_response = response.get("response", "Sorry, I couldn't find that information.")
+            with st.chat_message("assistant"):
+                bot_response = st.write_stream(stream_tokens(backend_url, user_input, selected_model,
+                                                                st.session_state.session_id))
             st.session_state.messages.append(("IMDb Bot", bot_response))
         except Exception as e:
             bot_response = f"⚠️ Error: {e}"
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# utils.constants reads these at import time; the tests need no real data directories.
+os.environ.setdefault("CHROMADB_PATH", tempfile.gettempdir())
+os.environ.setdefault("TMP_DIR", tempfile.gettempdir())
+os.environ.setdefault("GEMINI_API_KEY", "")
+os.environ.setdefault("GROQ_API_KEY", "")
@@ -0,0 +1,42 @@
+import io
+
+import numpy as np
+import pytest
+
+from chromadb_handler.chromadb_handler import CSV_COLUMNS, ChromaDBHandler
+from utils.bm25_index import BM25Index
+from utils.flat_vector_store import FlatVectorStoreClient
+
+
+class FailingEmbeddingModel:
+    """Embeds the first `calls_before_failure` batches, then raises."""
+
+    def __init__(self, calls_before_failure):
+        self.calls_left = calls_before_failure
+
+    def encode(self, texts, **kwargs):
+        if self.calls_left == 0:
+            raise RuntimeError("embedding failed")
+        self.calls_left -= 1
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+def make_csv(titles):
+    row = {column: "" for column in CSV_COLUMNS}
+    row.update(IMDB_Rating="8.0", Meta_score="70", No_of_Votes="1000", Released_Year="2000")
+    lines = [",".join(CSV_COLUMNS)]
+    for title in titles:
+        lines.append(",".join(title if column == "Series_Title" else row[column] for column in CSV_COLUMNS))
+    return io.StringIO("\n".join(lines) + "\n")
+
+
+def test_keyword_index_keeps_written_chunks_when_indexing_fails(tmp_path):
+    handler = ChromaDBHandler(str(tmp_path), "movies", chroma_client=FlatVectorStoreClient(str(tmp_path)),
+                              embedding_model=FailingEmbeddingModel(calls_before_failure=1))
+
+    with pytest.raises(RuntimeError, match="embedding failed"):
+        handler.index_csv_stream(make_csv(["Alpha", "Beta", "Gamma", "Delta"]), chunk_rows=2)
+
+    stored_ids = handler.collection.get(include=[])["ids"]
+    assert len(stored_ids) == 2
+    assert sorted(BM25Index.load(handler.keyword_index_path).doc_ids) == sorted(stored_ids)
@@ -0,0 +1,55 @@
+import threading
+import time
+
+from utils.indexing_jobs import IndexingJobManager
+
+
+def test_concurrent_job_limit_is_shared_by_managers_of_one_status_dir(tmp_path):
+    # Two managers on one directory stand in for two gunicorn workers.
+    managers = [IndexingJobManager(max_workers=1, status_dir=str(tmp_path)) for _ in range(2)]
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def work(job):
+        with lock:
+            running.append(job.job_id)
+            peak.append(len(running))
+        time.sleep(0.3)
+        with lock:
+            running.remove(job.job_id)
+
+    jobs = [manager.submit("movies", work) for manager in managers]
+    deadline = time.monotonic() + 10
+    while any(job.status != "completed" for job in jobs) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert [job.status for job in jobs] == ["completed", "completed"]
+    assert max(peak) == 1
+
+
+def test_jobs_on_one_collection_run_one_at_a_time(tmp_path):
+    managers = [IndexingJobManager(max_workers=2, status_dir=str(tmp_path)) for _ in range(2)]
+    running = {}
+    peaks = {"movies": 0, "shows": 0, "total": 0}
+    lock = threading.Lock()
+
+    def work(job):
+        with lock:
+            running[job.collection_name] = running.get(job.collection_name, 0) + 1
+            peaks[job.collection_name] = max(peaks[job.collection_name], running[job.collection_name])
+            peaks["total"] = max(peaks["total"], sum(running.values()))
+        time.sleep(0.3)
+        with lock:
+            running[job.collection_name] -= 1
+
+    jobs = [managers[0].submit("movies", work), managers[1].submit("movies", work),
+            managers[0].submit("shows", work)]
+    deadline = time.monotonic() + 10
+    while any(job.status != "completed" for job in jobs) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert [job.status for job in jobs] == ["completed"] * 3
+    assert peaks["movies"] == 1
+    assert peaks["shows"] == 1
+    assert peaks["total"] == 2
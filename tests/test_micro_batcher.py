@@ -0,0 +1,33 @@
+import os
+import time
+
+from utils.micro_batcher import MicroBatcher
+
+
+def test_submit_in_forked_child_after_parent_used_batcher():
+    batcher = MicroBatcher(lambda items: [item * 2 for item in items], max_batch_size=8, max_wait_ms=1)
+    # The parent's worker is now blocked in the queue's get(), as after the gunicorn master's warm-up.
+    assert batcher.submit([1, 2]) == [2, 4]
+    time.sleep(0.05)
+
+    pid = os.fork()
+    if pid == 0:
+        # Child: a hang here would be caught by the parent's deadline below.
+        try:
+            ok = batcher.submit([3]) == [6]
+        finally:
+            os._exit(0 if ok else 1)
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        finished, status = os.waitpid(pid, os.WNOHANG)
+        if finished:
+            assert os.waitstatus_to_exitcode(status) == 0
+            break
+        time.sleep(0.01)
+    else:
+        os.kill(pid, 9)
+        os.waitpid(pid, 0)
+        raise AssertionError("submit() in the forked child hung")
+
+    assert batcher.submit([5]) == [10]
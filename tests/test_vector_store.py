@@ -0,0 +1,26 @@
+import pytest
+
+from utils.flat_vector_store import FlatVectorStore
+from utils.vector_store import VectorStore
+
+
+def test_backend_missing_an_operation_cannot_be_created():
+    class NoQueryStore(VectorStore):
+        def count(self):
+            return 0
+
+        def get(self, ids=None, where=None, limit=None, offset=0, include=("metadatas",)):
+            return {"ids": []}
+
+        def upsert(self, ids, embeddings, metadatas=None, documents=None):
+            pass
+
+        def delete(self, ids=None):
+            pass
+
+    with pytest.raises(TypeError, match="query"):
+        NoQueryStore()
+
+
+def test_flat_store_implements_every_operation():
+    assert not FlatVectorStore.__abstractmethods__
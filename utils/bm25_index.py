@@ -0,0 +1,271 @@
+"""
+Array-backed BM25 keyword index.
+
+Postings are stored CSR-style: for term id `t`, the documents containing it are
+`postings_docs[term_offsets[t]:term_offsets[t + 1]]` with matching term
+frequencies in `postings_tf`. Documents added since the last compaction sit in a
+small per-term delta, and removed documents are masked out until the next
+compaction, so incremental updates never rewrite the whole index.
+
+Within a term, postings are ordered by their BM25 impact (highest first) as of the
+last compaction. A search scores at most `max_postings_per_term` postings per
+query term, which is exact for all but the most frequent terms and keeps queries
+sub-millisecond at millions of documents, then selects the top-k with a partial sort.
+"""
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Function words carry no signal for movie lookups but have the longest postings lists.
+STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from has have he her his how in is it its me movie movies film "
+    "films of on or she that the their them they this to was were what when where which who whom why will "
+    "with you your".split()
+)
+
+
+def tokenize(text: str):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def keyword_index_path(db_path: str, collection_name: str):
+    """Location of a collection's keyword index, next to the Chroma files."""
+    return os.path.join(db_path, "bm25", f"{collection_name}.npz")
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75, max_postings_per_term: int = 4096):
+        self.k1 = k1
+        self.b = b
+        self.max_postings_per_term = max_postings_per_term
+        self.vocab = {}
+        self.doc_ids = []
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.term_offsets = np.zeros(1, dtype=np.int64)
+        self.postings_docs = np.zeros(0, dtype=np.int32)
+        self.postings_tf = np.zeros(0, dtype=np.float32)
+
+        self._delta = {}
+        self._delta_postings = 0
+        self._doc_numbers = None
+        self._norm = None
+        self._live_docs = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    def _doc_number_map(self):
+        if self._doc_numbers is None:
+            self._doc_numbers = {doc_id: number for number, doc_id in enumerate(self.doc_ids) if self.alive[number]}
+        return self._doc_numbers
+
+    def upsert(self, ids, texts):
+        """Adds documents, replacing any previous version stored under the same id."""
+        with self._lock:
+            doc_numbers = self._doc_number_map()
+            self.remove(ids)
+            replaced = []
+
+            first = len(self.doc_ids)
+            lengths = []
+            for offset, (doc_id, text) in enumerate(zip(ids, texts)):
+                number = first + offset
+                if doc_id in doc_numbers:
+                    # Same id twice in one call: the later text wins.
+                    replaced.append(doc_numbers[doc_id])
+                tokens = tokenize(text)
+                lengths.append(len(tokens))
+                for term, tf in Counter(tokens).items():
+                    term_id = self.vocab.setdefault(term, len(self.vocab))
+                    docs, tfs = self._delta.setdefault(term_id, ([], []))
+                    docs.append(number)
+                    tfs.append(tf)
+                    self._delta_postings += 1
+                self.doc_ids.append(doc_id)
+                doc_numbers[doc_id] = number
+
+            self.doc_len = np.concatenate([self.doc_len, np.asarray(lengths, dtype=np.float32)])
+            self.alive = np.concatenate([self.alive, np.ones(len(lengths), dtype=bool)])
+            self.alive[replaced] = False
+            self._norm = None
+
+            if self._delta_postings > max(100_000, len(self.postings_docs) // 4):
+                self.compact()
+
+    def remove(self, ids):
+        """Masks out documents by id; they are dropped for good at the next compaction."""
+        with self._lock:
+            doc_numbers = self._doc_number_map()
+            for doc_id in ids:
+                number = doc_numbers.pop(doc_id, None)
+                if number is not None:
+                    self.alive[number] = False
+            self._norm = None
+
+    def compact(self):
+        """Merges the delta into the CSR arrays and drops removed documents."""
+        with self._lock:
+            live = np.flatnonzero(self.alive)
+            remap = np.full(len(self.doc_ids), -1, dtype=np.int64)
+            remap[live] = np.arange(len(live))
+
+            counts = np.diff(self.term_offsets)
+            terms = [np.repeat(np.arange(len(counts), dtype=np.int64), counts)]
+            docs = [self.postings_docs.astype(np.int64)]
+            tfs = [self.postings_tf]
+            for term_id, (delta_docs, delta_tfs) in self._delta.items():
+                terms.append(np.full(len(delta_docs), term_id, dtype=np.int64))
+                docs.append(np.asarray(delta_docs, dtype=np.int64))
+                tfs.append(np.asarray(delta_tfs, dtype=np.float32))
+
+            terms = np.concatenate(terms)
+            docs = remap[np.concatenate(docs)]
+            tfs = np.concatenate(tfs)
+            keep = docs >= 0
+            terms, docs, tfs = terms[keep], docs[keep], tfs[keep]
+
+            doc_len = self.doc_len[live]
+            avgdl = float(doc_len.mean()) if len(doc_len) else 1.0
+            impact = tfs / (tfs + self.k1 * (1 - self.b + self.b * doc_len[docs] / (avgdl or 1.0)))
+            order = np.lexsort((-impact, terms))
+            self.postings_docs = docs[order].astype(np.int32)
+            self.postings_tf = tfs[order]
+            self.term_offsets = np.concatenate(
+                [[0], np.cumsum(np.bincount(terms, minlength=len(self.vocab)))]
+            ).astype(np.int64)
+
+            self.doc_ids = [self.doc_ids[number] for number in live]
+            self.doc_len = doc_len
+            self.alive = np.ones(len(live), dtype=bool)
+            self._delta = {}
+            self._delta_postings = 0
+            self._doc_numbers = None
+            self._norm = None
+
+    def _postings(self, term_id):
+        if term_id + 1 < len(self.term_offsets):
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            end = min(end, start + self.max_postings_per_term)
+        else:
+            # Term first seen after the last compaction: it only has delta postings.
+            start = end = 0
+        docs, tfs = self.postings_docs[start:end], self.postings_tf[start:end]
+        delta = self._delta.get(term_id)
+        if delta:
+            docs = np.concatenate([docs, np.asarray(delta[0], dtype=np.int32)])
+            tfs = np.concatenate([tfs, np.asarray(delta[1], dtype=np.float32)])
+        return docs, tfs
+
+    def _doc_freq(self, term_id):
+        stored = 0
+        if term_id + 1 < len(self.term_offsets):
+            stored = int(self.term_offsets[term_id + 1] - self.term_offsets[term_id])
+        delta = self._delta.get(term_id)
+        return stored + (len(delta[0]) if delta else 0)
+
+    def search(self, query: str, top_k: int = 3):
+        """Returns up to `top_k` (doc id, score) pairs, best first."""
+        with self._lock:
+            term_ids = {self.vocab[term] for term in tokenize(query) if term in self.vocab}
+            if not term_ids:
+                return []
+
+            if self._norm is None:
+                # Per-document length normalization, recomputed only after the index changes.
+                self._live_docs = len(self)
+                avgdl = float(self.doc_len[self.alive].mean()) if self._live_docs else 1.0
+                self._norm = self.k1 * (1 - self.b + self.b * self.doc_len / (avgdl or 1.0))
+            live_docs = self._live_docs
+            if not live_docs:
+                return []
+
+            candidate_docs = []
+            candidate_scores = []
+            for term_id in term_ids:
+                docs, tfs = self._postings(term_id)
+                if not len(docs):
+                    continue
+                doc_freq = self._doc_freq(term_id)
+                idf = math.log((live_docs - doc_freq + 0.5) / (doc_freq + 0.5) + 1)
+                candidate_docs.append(docs)
+                candidate_scores.append(idf * tfs * (self.k1 + 1) / (tfs + self._norm[docs]))
+            if not candidate_docs:
+                return []
+
+            docs, inverse = np.unique(np.concatenate(candidate_docs), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(candidate_scores))
+            scores[~self.alive[docs]] = -np.inf
+
+            k = min(top_k, len(docs))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [(self.doc_ids[docs[i]], float(scores[i])) for i in best if np.isfinite(scores[i])]
+
+    def save(self, path: str):
+        """Compacts and writes the index to `path` atomically."""
+        with self._lock:
+            self.compact()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            terms = sorted(self.vocab, key=self.vocab.get)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    vocab=np.array(terms, dtype=str),
+                    doc_ids=np.array(self.doc_ids, dtype=str),
+                    doc_len=self.doc_len,
+                    term_offsets=self.term_offsets,
+                    postings_docs=self.postings_docs,
+                    postings_tf=self.postings_tf,
+                    params=np.array([self.k1, self.b]),
+                )
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            k1, b = data["params"].tolist()
+            index = cls(k1=k1, b=b)
+            index.vocab = {term: term_id for term_id, term in enumerate(data["vocab"].tolist())}
+            index.doc_ids = data["doc_ids"].tolist()
+            index.doc_len = data["doc_len"]
+            index.alive = np.ones(len(index.doc_ids), dtype=bool)
+            index.term_offsets = data["term_offsets"]
+            index.postings_docs = data["postings_docs"]
+            index.postings_tf = data["postings_tf"]
+        return index
+
+    @classmethod
+    def load_or_build(cls, path: str, collection, text_fn, page_size: int = 2048):
+        """
+        Loads the index saved at `path`. Collections indexed before keyword indexes
+        were persisted are scanned once from Chroma, and the result is saved.
+
+        Args:
+            path (str): Location of the saved index.
+            collection: Chroma collection to rebuild from if nothing is saved.
+            text_fn: Maps a stored metadata dict to the text to index.
+            page_size (int): Documents fetched from Chroma per page while rebuilding.
+        """
+        if os.path.exists(path):
+            return cls.load(path)
+
+        index = cls()
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            index.upsert(page["ids"], [text_fn(meta or {}) for meta in page["metadatas"]])
+            offset += len(page["ids"])
+        if len(index):
+            index.save(path)
+        return index
@@ -1,11 +1,13 @@
+import json
 import os
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
-gemini_api_key = os.environ["GEMINI_API_KEY"]
-groq_api_key = os.environ["GROQ_API_KEY"]
+# Provider keys are optional: a provider without one has its routes left out (see ENABLED_PROVIDERS).
+gemini_api_key = os.environ.get("GEMINI_API_KEY", "")
+groq_api_key = os.environ.get("GROQ_API_KEY", "")
 
 chroma_path =os.environ["CHROMADB_PATH"]
 
@@ -13,6 +15,140 @@ temp_dir = os.environ["TMP_DIR"]
 
 EMBED_MODEL="all-MiniLM-L6-v2"
 
-ollama_url =os.environ["OLLAMA_URL"]
+ollama_url =os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
 
 RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Indexing throughput knobs: rows per embedding forward pass and rows per Chroma write.
+INDEX_EMBED_BATCH_SIZE = int(os.environ.get("INDEX_EMBED_BATCH_SIZE", 64))
+INDEX_WRITE_CHUNK_SIZE = int(os.environ.get("INDEX_WRITE_CHUNK_SIZE", 2048))
+# Rows read from an uploaded CSV per streaming step; bounds indexing memory.
+INDEX_CSV_CHUNK_ROWS = int(os.environ.get("INDEX_CSV_CHUNK_ROWS", 5000))
+# Background indexing jobs allowed to run at once across all worker processes; the rest queue so chat traffic keeps
+# its CPU.
+INDEX_MAX_CONCURRENT_JOBS = int(os.environ.get("INDEX_MAX_CONCURRENT_JOBS", 1))
+
+# Persistent embedding cache shared by indexing and querying; a capacity of 0 disables it.
+EMBEDDING_CACHE_DIR = os.environ.get("EMBEDDING_CACHE_DIR", os.path.join(chroma_path, "embedding_cache"))
+EMBEDDING_CACHE_CAPACITY = int(os.environ.get("EMBEDDING_CACHE_CAPACITY", 100_000))
+
+# Micro-batching of query-time model calls: largest batch per forward pass and how long a call waits to fill it.
+# A max wait of 0 turns batching off.
+EMBED_BATCH_MAX_SIZE = int(os.environ.get("EMBED_BATCH_MAX_SIZE", 32))
+EMBED_BATCH_MAX_WAIT_MS = float(os.environ.get("EMBED_BATCH_MAX_WAIT_MS", 5))
+RERANK_BATCH_MAX_SIZE = int(os.environ.get("RERANK_BATCH_MAX_SIZE", 256))
+RERANK_BATCH_MAX_WAIT_MS = float(os.environ.get("RERANK_BATCH_MAX_WAIT_MS", 5))
+
+# Hybrid search: default latency budget (0 disables the deadline) and threads running its stages.
+HYBRID_SEARCH_BUDGET_MS = float(os.environ.get("HYBRID_SEARCH_BUDGET_MS", 1500))
+RETRIEVAL_WORKERS = int(os.environ.get("RETRIEVAL_WORKERS", 16))
+
+# Fusion of the vector and BM25 legs: "rrf" (reciprocal-rank fusion by document id) or "merge" (vector first, by title).
+FUSION_MODE = os.environ.get("FUSION_MODE", "rrf")
+RRF_K = int(os.environ.get("RRF_K", 60))
+# Cascaded re-ranking: only the top-N fused candidates are scored, re-ranking is skipped when both legs agree
+# on the best hit, and (query, document) scores are cached.
+RERANK_TOP_N = int(os.environ.get("RERANK_TOP_N", 8))
+RERANK_SKIP_WHEN_CONFIDENT = os.environ.get("RERANK_SKIP_WHEN_CONFIDENT", "true").lower() == "true"
+RERANK_CACHE_SIZE = int(os.environ.get("RERANK_CACHE_SIZE", 50_000))
+
+# LLM provider clients: connect/read timeouts, retries of transient failures (jittered exponential backoff)
+# and how many calls each provider may have in flight at once.
+LLM_CONNECT_TIMEOUT_S = float(os.environ.get("LLM_CONNECT_TIMEOUT_S", 3))
+LLM_READ_TIMEOUT_S = float(os.environ.get("LLM_READ_TIMEOUT_S", 120))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 2))
+LLM_RETRY_BASE_DELAY_S = float(os.environ.get("LLM_RETRY_BASE_DELAY_S", 0.25))
+LLM_RETRY_MAX_DELAY_S = float(os.environ.get("LLM_RETRY_MAX_DELAY_S", 2))
+OLLAMA_MAX_CONCURRENCY = int(os.environ.get("OLLAMA_MAX_CONCURRENCY", 4))
+GROQ_MAX_CONCURRENCY = int(os.environ.get("GROQ_MAX_CONCURRENCY", 16))
+GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", 16))
+# Optional endpoint overrides, e.g. to point the Groq/Gemini clients at a local stand-in server.
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL") or None
+GEMINI_API_ENDPOINT = os.environ.get("GEMINI_API_ENDPOINT") or None
+
+# Semantic answer cache of the IMDB chat endpoints: answers kept per (collection, model) (0 disables it),
+# their lifetime, and how similar (cosine of the query embeddings) a question must be to reuse an answer.
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", 10_000))
+ANSWER_CACHE_TTL_S = float(os.environ.get("ANSWER_CACHE_TTL_S", 24 * 3600))
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.92))
+
+# Structured questions ("top 5 Nolan films", "dramas after 2010"): set to 0 to send every question through RAG,
+# and how many times more candidates a filtered search fetches, since genre/star filters are applied afterwards.
+STRUCTURED_QUERIES = int(os.environ.get("STRUCTURED_QUERIES", 1))
+FILTERED_SEARCH_OVERFETCH = int(os.environ.get("FILTERED_SEARCH_OVERFETCH", 5))
+
+# LLM context of the IMDB chat endpoints: token budget (0 = unlimited), maximum movies, tokens an overview is
+# shortened to, and how many of the best matches keep their full overview.
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 1200))
+CONTEXT_MAX_MOVIES = int(os.environ.get("CONTEXT_MAX_MOVIES", 10))
+CONTEXT_OVERVIEW_MAX_TOKENS = int(os.environ.get("CONTEXT_OVERVIEW_MAX_TOKENS", 40))
+CONTEXT_FULL_OVERVIEWS = int(os.environ.get("CONTEXT_FULL_OVERVIEWS", 3))
+
+# Vector store behind the collections: "chroma" (chromadb.PersistentClient) or "flat" (memory-mapped exact search,
+# see utils/flat_vector_store.py), the flat store's vector dtype ("float16", "int8" or "float32") and the rows
+# scored per block of its search.
+VECTOR_STORE_BACKEND = os.environ.get("VECTOR_STORE_BACKEND", "chroma")
+FLAT_STORE_DTYPE = os.environ.get("FLAT_STORE_DTYPE", "float16")
+FLAT_SEARCH_BLOCK_ROWS = int(os.environ.get("FLAT_SEARCH_BLOCK_ROWS", 4096))
+
+# Collection the IMDB chat endpoints search when a request names none, and named shard groups searched together
+# as one catalog: a JSON object mapping a group name to its collections, e.g. {"imdb_all": ["imdb_a", "imdb_b"]}.
+DEFAULT_COLLECTION = os.environ.get("DEFAULT_COLLECTION", "imdb_chatbot")
+SHARD_GROUPS = json.loads(os.environ.get("SHARD_GROUPS") or "{}")
+
+# CPU inference of the embedding model and cross-encoder (see utils/inference_backend.py): "torch", "int8" (PyTorch
+# with dynamically quantized Linear layers) or "onnx" (embedding model exported to ONNX Runtime and int8-quantized
+# for ONNX_QUANTIZATION: "avx2", "avx512", "avx512_vnni" or "arm64"), intra-op threads of the models (0 keeps
+# torch's default), the tokens an input is truncated to, and where exported ONNX models are kept.
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch")
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", 0))
+EMBED_MAX_SEQ_LENGTH = int(os.environ.get("EMBED_MAX_SEQ_LENGTH", 256))
+RERANK_MAX_SEQ_LENGTH = int(os.environ.get("RERANK_MAX_SEQ_LENGTH", 256))
+ONNX_QUANTIZATION = os.environ.get("ONNX_QUANTIZATION", "avx2")
+ONNX_EXPORT_DIR = os.environ.get("ONNX_EXPORT_DIR", os.path.join(chroma_path, "onnx_models"))
+
+# Startup: "eager" loads the models before the process reports ready (in the gunicorn master, shared by the
+# workers); "lazy" reports ready at once and loads each model, provider SDK and client on first use or on
+# POST /warm-up. LLM providers whose routes are registered: comma-separated "ollama", "groq", "gemini";
+# by default Ollama and every provider with an API key.
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "eager")
+_configured_providers = ["ollama"] + (["groq"] if groq_api_key else []) + (["gemini"] if gemini_api_key else [])
+ENABLED_PROVIDERS = [name.strip() for name in os.environ.get("ENABLED_PROVIDERS", ",".join(_configured_providers))
+                     .split(",") if name.strip()]
+
+# Hot-path metrics served on /metrics (see utils/metrics.py), and the request header that, set to "1", returns the
+# request's own per-stage breakdown in a Server-Timing response header.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+TIMING_BREAKDOWN_HEADER = os.environ.get("TIMING_BREAKDOWN_HEADER", "X-Timing-Breakdown")
+
+# Batch questions (POST /batch-chat): most questions per request, LLM calls in flight per request at most, and the
+# texts per forward pass when embedding a batch's questions and re-ranking their candidates.
+BATCH_MAX_QUESTIONS = int(os.environ.get("BATCH_MAX_QUESTIONS", 1000))
+BATCH_LLM_CONCURRENCY = int(os.environ.get("BATCH_LLM_CONCURRENCY", 8))
+BATCH_EMBED_SIZE = int(os.environ.get("BATCH_EMBED_SIZE", 64))
+BATCH_RERANK_SIZE = int(os.environ.get("BATCH_RERANK_SIZE", 256))
+
+# Conversation sessions of the IMDB chat endpoints (see utils/conversation_sessions.py): seconds a session lives
+# after its last turn, most sessions kept, turns kept verbatim (answers cut to SESSION_ANSWER_MAX_TOKENS), and the
+# token budget of the summary of older turns.
+SESSION_TTL_SECONDS = float(os.environ.get("SESSION_TTL_SECONDS", 1800))
+SESSION_MAX_SESSIONS = int(os.environ.get("SESSION_MAX_SESSIONS", 10000))
+SESSION_RECENT_TURNS = int(os.environ.get("SESSION_RECENT_TURNS", 2))
+SESSION_ANSWER_MAX_TOKENS = int(os.environ.get("SESSION_ANSWER_MAX_TOKENS", 120))
+SESSION_SUMMARY_MAX_TOKENS = int(os.environ.get("SESSION_SUMMARY_MAX_TOKENS", 200))
+
+# LLM provider routing of the IMDB chat endpoints (see utils/llm_router.py): providers tried after the requested one
+# fails, in order (only enabled ones). When the first token has not arrived after the LLM_HEDGE_PERCENTILE of the
+# provider's recent first-token latencies (LLM_HEDGE_DELAY_MS until LLM_HEDGE_MIN_SAMPLES calls were seen, never less
+# than LLM_HEDGE_MIN_DELAY_MS), the next one is started too and the first to answer is kept. A provider failing at
+# least LLM_UNHEALTHY_ERROR_RATE of its recent calls gets a backup right away. Stats cover the last LLM_STATS_WINDOW
+# calls per provider.
+LLM_FALLBACK_ORDER = [name.strip() for name in os.environ.get("LLM_FALLBACK_ORDER", "groq,gemini,ollama").split(",")
+                      if name.strip()]
+LLM_HEDGING_ENABLED = os.environ.get("LLM_HEDGING_ENABLED", "true").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", 95))
+LLM_HEDGE_DELAY_MS = float(os.environ.get("LLM_HEDGE_DELAY_MS", 3000))
+LLM_HEDGE_MIN_DELAY_MS = float(os.environ.get("LLM_HEDGE_MIN_DELAY_MS", 100))
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", 20))
+LLM_UNHEALTHY_ERROR_RATE = float(os.environ.get("LLM_UNHEALTHY_ERROR_RATE", 0.5))
+LLM_STATS_WINDOW = int(os.environ.get("LLM_STATS_WINDOW", 200))
@@ -0,0 +1,176 @@
+"""
+Builds the LLM prompt of the IMDB chat endpoints from the retrieved movies.
+
+The context is packed into a token budget: movies are taken in retrieval order and
+de-duplicated, only the fields the question needs are rendered, and overviews are
+shortened (the best matches keep theirs in full) until the budget is used up.
+Prompt length is what the LLM's prompt processing time grows with, so every
+response reports the token counts of its prompt.
+"""
+import math
+import re
+
+from utils import prompt_reader
+from utils.constants import CONTEXT_TOKEN_BUDGET, CONTEXT_MAX_MOVIES, CONTEXT_OVERVIEW_MAX_TOKENS, \
+    CONTEXT_FULL_OVERVIEWS
+
+# Rough characters per token of the LLMs served; none of their tokenizers is available locally.
+CHARS_PER_TOKEN = 4
+
+FIELD_LABELS = {
+    "title": "Title",
+    "year": "Year",
+    "certificate": "Certificate",
+    "runtime": "Runtime",
+    "genre": "Genre",
+    "rating": "IMDB Rating",
+    "overview": "Overview",
+    "meta_score": "Meta Score",
+    "director": "Director",
+    "stars": "Stars",
+    "votes": "Number of Votes",
+    "gross": "Gross Revenue",
+}
+DEFAULT_FIELDS = ("title", "year", "genre", "rating", "director", "stars", "overview")
+# Fields only rendered when the question asks about them.
+FIELD_CUES = {
+    "certificate": re.compile(r"\b(?:certificate|certified|rated (?:r|pg|u|a)|pg|kids?|children|family|adults?)\b"),
+    "runtime": re.compile(r"\b(?:runtime|running time|long|longest|short|shortest|minutes?|mins?|hours?|duration)\b"),
+    "meta_score": re.compile(r"\b(?:meta ?score|metascore|critics?|critically)\b"),
+    "votes": re.compile(r"\b(?:votes?|voted|popular|popularity)\b"),
+    "gross": re.compile(r"\b(?:gross|grossing|box office|revenue|earn(?:ed|ings)?|money|collections?|commercial)\b"),
+}
+ALL_FIELDS = re.compile(r"\b(?:everything|all (?:the )?details|full details|tell me (?:all|everything))\b")
+# 0 means "not reported" for these fields.
+UNREPORTED_ZERO = ("meta_score", "votes")
+
+
+def count_tokens(text: str):
+    """Approximate number of LLM tokens in `text`."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int):
+    """Cuts `text` at a word boundary to about `max_tokens` tokens, marking the cut with '...'."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars - 3)
+    return text[:cut if cut > 0 else max_chars - 3].rstrip(" ,;:") + "..."
+
+
+class ContextBuilder:
+    def __init__(
+            self,
+            token_budget: int = CONTEXT_TOKEN_BUDGET,
+            max_movies: int = CONTEXT_MAX_MOVIES,
+            overview_max_tokens: int = CONTEXT_OVERVIEW_MAX_TOKENS,
+            full_overviews: int = CONTEXT_FULL_OVERVIEWS,
+    ):
+        """
+        Args:
+            token_budget (int): Maximum tokens of context; 0 packs every movie in full.
+            max_movies (int): Maximum movies in the context.
+            overview_max_tokens (int): Tokens an overview is shortened to, after the first `full_overviews` movies.
+            full_overviews (int): Number of best-ranked movies whose overview is kept in full if it fits.
+        """
+        self.token_budget = token_budget
+        self.max_movies = max_movies
+        self.overview_max_tokens = overview_max_tokens
+        self.full_overviews = full_overviews
+
+    @staticmethod
+    def select_fields(question: str):
+        """The metadata fields rendered for `question`, in display order."""
+        text = question.lower()
+        if ALL_FIELDS.search(text):
+            return tuple(FIELD_LABELS)
+        wanted = set(DEFAULT_FIELDS)
+        wanted.update(field for field, cue in FIELD_CUES.items() if cue.search(text))
+        return tuple(field for field in FIELD_LABELS if field in wanted)
+
+    @staticmethod
+    def _metadata(movie):
+        # Hybrid search results wrap the stored metadata; Chroma query results are the metadata itself.
+        return movie.get("metadata", movie)
+
+    @staticmethod
+    def _render(meta, fields, overview):
+        lines = []
+        for field in fields:
+            value = overview if field == "overview" else meta.get(field, "")
+            if value in ("", None) or (field in UNREPORTED_ZERO and value == 0):
+                continue
+            lines.append(f"{FIELD_LABELS[field]}: {value}")
+        return "\n".join(lines)
+
+    def build(self, question: str, movies):
+        """
+        Packs `movies` (metadata dicts, best match first) into the context for `question`.
+        Returns (context string, stats dict).
+        """
+        fields = self.select_fields(question)
+        budget = self.token_budget or math.inf
+        blocks, seen = [], set()
+        used_tokens = truncated = duplicates = 0
+
+        for movie in movies:
+            if len(blocks) >= self.max_movies:
+                break
+            meta = self._metadata(movie)
+            key = (str(meta.get("title", "")).strip().lower(), str(meta.get("year", "")))
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+
+            overview = str(meta.get("overview", "") or "")
+            if "overview" in fields and len(blocks) >= self.full_overviews and self.overview_max_tokens:
+                overview = truncate_to_tokens(overview, self.overview_max_tokens)
+            block = self._render(meta, fields, overview)
+            # Blocks are separated by a blank line, about one token.
+            cost = count_tokens(block) + (1 if blocks else 0)
+
+            if used_tokens + cost > budget and "overview" in fields and overview:
+                # Shorten the overview to what is left of the budget rather than dropping the movie.
+                without_overview = count_tokens(self._render(meta, fields, "")) + (1 if blocks else 0)
+                room = budget - used_tokens - without_overview - 2
+                overview = truncate_to_tokens(overview, int(room)) if room >= 8 else ""
+                block = self._render(meta, fields, overview)
+                cost = count_tokens(block) + (1 if blocks else 0)
+            if used_tokens + cost > budget:
+                break
+            if overview != str(meta.get("overview", "") or ""):
+                truncated += 1
+            blocks.append(block)
+            used_tokens += cost
+
+        context = "\n\n".join(blocks)
+        stats = {
+            "candidates": len(movies),
+            "movies": len(blocks),
+            "duplicates": duplicates,
+            "overviews_truncated": truncated,
+            "fields": list(fields),
+            "context_tokens": count_tokens(context),
+            "token_budget": self.token_budget,
+        }
+        return context, stats
+
+    def build_prompt(self, question: str, movies, template: str = "imdb_chat_prompt", history: str = None):
+        """
+        Renders the prompt `template` for `question` with the packed context, and with `history`
+        (the conversation so far, for a template with a {history} field) if given.
+        Returns (prompt, stats), stats including the approximate `prompt_tokens`.
+        """
+        context, stats = self.build(question, movies)
+        values = {"user_message": question, "context": context}
+        if history is not None:
+            values["history"] = history
+            stats["history_tokens"] = count_tokens(history)
+        prompt = prompt_reader.get_prompt_template(template).format(**values)
+        stats["prompt_tokens"] = count_tokens(prompt)
+        return prompt, stats
+
+
+context_builder = ContextBuilder()
@@ -0,0 +1,223 @@
+"""
+Server-side conversation sessions of the IMDB chat endpoints.
+
+A session keeps only what a follow-up question needs, bounded in size:
+  - the last SESSION_RECENT_TURNS turns, answers shortened to SESSION_ANSWER_MAX_TOKENS,
+  - a summary of the older turns (what was asked, which movies came up), at most
+    SESSION_SUMMARY_MAX_TOKENS, dropping the oldest lines first,
+  - the movies retrieved for the previous turn (at most CONTEXT_MAX_MOVIES), and the ones its answer named.
+
+A follow-up that refers back ("who directed it?") is answered from the previous turn's movies, the
+named ones first, without searching the collection again. A follow-up that asks for more ("what
+about his other films?") is searched with the named movies added to the question. Questions that
+stand alone are answered as outside a session, and can be served from the answer cache.
+
+Sessions are JSON files under TMP_DIR, so any worker process can serve the next turn. They expire
+SESSION_TTL_SECONDS after their last turn, and the least recently used beyond SESSION_MAX_SESSIONS
+are dropped.
+"""
+import json
+import os
+import re
+import threading
+import time
+
+from utils.constants import temp_dir, SESSION_TTL_SECONDS, SESSION_MAX_SESSIONS, SESSION_RECENT_TURNS, \
+    SESSION_ANSWER_MAX_TOKENS, SESSION_SUMMARY_MAX_TOKENS, CONTEXT_MAX_MOVIES
+from utils.context_builder import count_tokens, truncate_to_tokens
+
+SESSION_DIR = os.path.join(temp_dir, "sessions")
+# Session ids become file names.
+VALID_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+# Minimum seconds between two sweeps of expired sessions by one process.
+SWEEP_INTERVAL = 60.0
+# Named movies whose title and director are added to an "expand" follow-up's search.
+MAX_EXPANSION_MOVIES = 3
+# Longer questions are taken as new questions even if they contain a pronoun.
+MAX_FOLLOW_UP_WORDS = 14
+
+REFERS_BACK = re.compile(
+    r"\b(?:it|its|them|they|their|he|him|his|she|her|those|these|"
+    r"(?:that|this|the|same) (?:movie|film|one)s?|the (?:first|second|third|last|latter|former))\b")
+ASKS_FOR_MORE = re.compile(r"\b(?:other|others|more|else|another|similar|besides)\b")
+
+
+def _metadata(movie):
+    """The stored metadata of a retrieved movie: hybrid search results carry it under "metadata"."""
+    return movie.get("metadata", movie) if isinstance(movie, dict) else {}
+
+
+class ConversationSession:
+    """Bounded memory of one conversation."""
+
+    def __init__(self, session_id: str, collection: str = None, turns=None, summary=None, candidates=None,
+                 named=None, turn_count: int = 0, created_at: float = None):
+        self.session_id = session_id
+        # Label of the collections the candidates came from; a follow-up must search the same ones.
+        self.collection = collection
+        self.turns = turns or []  # [{"question", "answer", "movies" it named}], oldest first
+        self.summary = summary or []  # one line per folded turn
+        self.candidates = candidates or []  # metadata dicts retrieved for the previous turn
+        self.named = named or []  # titles among the candidates that the previous answer named
+        self.turn_count = turn_count
+        self.created_at = created_at or time.time()
+
+    def follow_up_kind(self, question: str, collection: str):
+        """
+        "reuse" for a question about the previous turn's movies, "expand" for one asking for more
+        movies related to them, or None for a question that stands alone.
+        """
+        if not self.candidates or collection != self.collection:
+            return None
+        text = question.lower()
+        if len(text.split()) > MAX_FOLLOW_UP_WORDS or not REFERS_BACK.search(text):
+            return None
+        return "expand" if ASKS_FOR_MORE.search(text) else "reuse"
+
+    def focus(self):
+        """The previous turn's candidates, the movies its answer named first."""
+        named = [movie for movie in self.candidates if movie.get("title") in self.named]
+        return named + [movie for movie in self.candidates if movie.get("title") not in self.named]
+
+    def retrieval_query(self, question: str):
+        """The text searched for an "expand" follow-up: the question, then the movies it refers to."""
+        references = [f"{movie.get('title', '')} ({movie.get('director', '')})"
+                      for movie in self.focus()[:MAX_EXPANSION_MOVIES]]
+        return f"{question} {'; '.join(references)}"
+
+    def history(self):
+        """The conversation so far, for the prompt of a follow-up: the summary, then the recent turns."""
+        parts = []
+        if self.summary:
+            parts.append("Earlier:\n" + "\n".join(self.summary))
+        for turn in self.turns:
+            parts.append(f"User: {turn['question']}\nAssistant: {turn['answer']}")
+        return "\n".join(parts)
+
+    def record_turn(self, question: str, answer: str, movies, collection: str):
+        """
+        Adds a finished turn. `movies` are the movies its answer was based on; None (e.g. a count)
+        keeps the previous turn's as the candidates.
+        """
+        answer = answer or ""
+        self.turn_count += 1
+        if movies is not None:
+            candidates = [_metadata(movie) for movie in movies[:CONTEXT_MAX_MOVIES]]
+            lowered = answer.lower()
+            named = [movie.get("title") for movie in candidates
+                     if movie.get("title") and str(movie["title"]).lower() in lowered]
+            # An answer about the same movies that names none of them ("he did") keeps the previous focus.
+            if named or candidates != self.candidates:
+                self.named = named
+            self.collection = collection
+            self.candidates = candidates
+        self.turns.append({"question": question,
+                           "answer": truncate_to_tokens(answer, SESSION_ANSWER_MAX_TOKENS),
+                           "movies": self.named[:MAX_EXPANSION_MOVIES] if movies is not None else []})
+
+        while len(self.turns) > SESSION_RECENT_TURNS:
+            self._fold(self.turns.pop(0))
+
+    def _fold(self, turn):
+        """Moves a turn out of the recent ones into the summary, keeping the summary within its budget."""
+        line = f"- Asked: {turn['question']}"
+        if turn.get("movies"):
+            line += f" Movies: {', '.join(map(str, turn['movies']))}."
+        self.summary.append(line)
+        while self.summary and count_tokens("\n".join(self.summary)) > SESSION_SUMMARY_MAX_TOKENS:
+            self.summary.pop(0)
+
+    def to_dict(self):
+        return {
+            "session_id": self.session_id,
+            "collection": self.collection,
+            "turns": self.turns,
+            "summary": self.summary,
+            "candidates": self.candidates,
+            "named": self.named,
+            "turn_count": self.turn_count,
+            "created_at": self.created_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class SessionStore:
+    """ConversationSessions kept as JSON files shared by every worker process, with TTL expiry."""
+
+    def __init__(self, directory: str = SESSION_DIR, ttl_seconds: float = SESSION_TTL_SECONDS,
+                 max_sessions: int = SESSION_MAX_SESSIONS):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._swept_at = 0.0
+        self._lock = threading.Lock()
+
+    def _path(self, session_id: str):
+        if not isinstance(session_id, str) or not VALID_SESSION_ID.match(session_id):
+            raise ValueError("session_id must be 8 to 64 letters, digits, '-' or '_'.")
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def _expired(self, path: str, now: float):
+        return bool(self.ttl_seconds) and now - os.path.getmtime(path) > self.ttl_seconds
+
+    def load(self, session_id: str):
+        """The session `session_id`, or a new one if it does not exist or has expired."""
+        path = self._path(session_id)
+        try:
+            if not self._expired(path, time.time()):
+                with open(path, encoding="utf-8") as f:
+                    return ConversationSession.from_dict(json.load(f))
+        except (OSError, ValueError, TypeError):
+            pass
+        return ConversationSession(session_id)
+
+    def save(self, session: ConversationSession):
+        path = self._path(session.session_id)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(session.to_dict(), f)
+        os.replace(tmp_path, path)
+        if time.monotonic() - self._swept_at >= SWEEP_INTERVAL:
+            self.sweep()
+
+    def delete(self, session_id: str):
+        """Ends a session; returns whether it existed."""
+        try:
+            os.remove(self._path(session_id))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def sweep(self):
+        """Deletes expired sessions, then the least recently used ones beyond `max_sessions`; returns how many."""
+        with self._lock:
+            self._swept_at = time.monotonic()
+            now = time.time()
+            try:
+                names = [name for name in os.listdir(self.directory) if name.endswith(".json")]
+            except FileNotFoundError:
+                return 0
+            sessions = []
+            for name in names:
+                path = os.path.join(self.directory, name)
+                try:
+                    sessions.append((os.path.getmtime(path), path))
+                except FileNotFoundError:
+                    continue
+            sessions.sort(reverse=True)
+            stale = [path for position, (mtime, path) in enumerate(sessions)
+                     if (self.ttl_seconds and now - mtime > self.ttl_seconds)
+                     or (self.max_sessions and position >= self.max_sessions)]
+            for path in stale:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            return len(stale)
+
+
+session_store = SessionStore()
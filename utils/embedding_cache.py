@@ -0,0 +1,195 @@
+"""
+Persistent embedding cache keyed by (model name, text hash).
+
+Vectors live in a memory-mapped float32 array of fixed capacity; the 16-byte text
+hashes and last-use ticks of every slot are memory-mapped next to it, so the cache
+survives restarts, is shared by the worker processes of a multi-worker server, and
+is rebuilt in memory from those two small arrays. When the cache is full, the least
+recently used slots are overwritten.
+"""
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+
+from utils.file_lock import ProcessFileLock
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir: str, model_name: str, dim: int, capacity: int):
+        """
+        Opens (or creates) the cache files for `model_name` under `cache_dir`.
+
+        The files may be shared by several worker processes. Writes are serialized by a
+        lock file and slots are chosen from the shared last-use array; each process keeps
+        its own key -> slot index and checks the stored key on every lookup, so a slot
+        that another process has reused reads as a miss, never as a wrong vector.
+
+        Args:
+            cache_dir (str): Directory holding the memory-mapped cache files.
+            model_name (str): Embedding model whose vectors are cached; part of every key.
+            dim (int): Embedding dimension of the model.
+            capacity (int): Maximum number of cached vectors.
+        """
+        self.model_name = model_name
+        self.dim = dim
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        base = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        self._file_lock = ProcessFileLock(base + ".lock")
+        with self._file_lock:
+            self._vectors = self._open(base + ".vectors.npy", np.float32, (capacity, dim))
+            self._keys = self._open(base + ".keys.npy", np.uint8, (capacity, 16))
+            self._last_used = self._open(base + ".used.npy", np.int64, (capacity,))
+        self._load_index()
+
+    def _load_index(self):
+        occupied = np.flatnonzero(self._last_used)
+        self._index = {self._keys[slot].tobytes(): int(slot) for slot in occupied}
+        self._clock = int(self._last_used.max()) if self.capacity else 0
+
+    @staticmethod
+    def _open(path, dtype, shape):
+        if os.path.exists(path):
+            array = np.lib.format.open_memmap(path, mode="r+")
+            if array.shape == shape and array.dtype == dtype:
+                return array
+            del array
+        # New cache, or capacity/dimension changed: start over with an empty file.
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+    def make_key(self, text: str, variant: str = "") -> bytes:
+        """16-byte key for `text` embedded by this cache's model; `variant` separates encode options."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{self.model_name}\0{variant}\0".encode("utf-8"))
+        digest.update(text.encode("utf-8"))
+        return digest.digest()
+
+    def _holds(self, slot, key):
+        return self._keys[slot].tobytes() == key
+
+    def lookup(self, keys):
+        """Returns {position in `keys`: vector} for every key that is cached."""
+        found = {}
+        with self._lock:
+            for position, key in enumerate(keys):
+                slot = self._index.get(key)
+                if slot is None:
+                    continue
+                vector = np.array(self._vectors[slot])
+                # Writers replace the key before the vector, so checking after the copy catches reuse mid-read.
+                if not self._holds(slot, key):
+                    del self._index[key]
+                    continue
+                self._clock += 1
+                self._last_used[slot] = self._clock
+                found[position] = vector
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def store(self, keys, vectors):
+        """Caches `vectors[i]` under `keys[i]`, evicting least recently used entries when full."""
+        if not self.capacity:
+            return
+        entries = dict(zip(keys, vectors))
+        with self._lock, self._file_lock:
+            self._clock = max(self._clock, int(self._last_used.max()))
+
+            new_keys = []
+            for key, vector in entries.items():
+                slot = self._index.get(key)
+                if slot is not None and self._holds(slot, key):
+                    self._write(slot, key, vector)
+                else:
+                    new_keys.append(key)
+
+            # Keys beyond capacity would only evict each other; keep the last ones.
+            new_keys = new_keys[-self.capacity:]
+            for slot, key in zip(self._claim_slots(len(new_keys)), new_keys):
+                self._index.pop(self._keys[slot].tobytes(), None)
+                self._write(slot, key, entries[key])
+                self._index[key] = slot
+
+    def _write(self, slot, key, vector):
+        self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+        self._vectors[slot] = vector
+        self._clock += 1
+        self._last_used[slot] = self._clock
+
+    def _claim_slots(self, needed):
+        """Returns `needed` slots to write to: free ones first, then the least recently used."""
+        if needed <= 0:
+            return []
+        if needed >= self.capacity:
+            slots = np.arange(self.capacity)
+        else:
+            slots = np.argpartition(self._last_used, needed - 1)[:needed]
+        self.evictions += int(np.count_nonzero(self._last_used[slots]))
+        return slots.tolist()
+
+    def flush(self):
+        with self._lock:
+            self._vectors.flush()
+            self._keys.flush()
+            self._last_used.flush()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "entries": int(np.count_nonzero(self._last_used)),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class CachedEmbeddingModel:
+    """
+    Wraps a SentenceTransformer so `encode` serves cached vectors and only runs
+    the model on texts it has not seen. Other attributes pass through to the model.
+    """
+
+    def __init__(self, model, cache: EmbeddingCache):
+        self.model = model
+        self.cache = cache
+
+    def encode(self, sentences, normalize_embeddings: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        variant = "normalized" if normalize_embeddings else ""
+        keys = [self.cache.make_key(text, variant) for text in texts]
+
+        result = np.empty((len(texts), self.cache.dim), dtype=np.float32)
+        cached = self.cache.lookup(keys)
+        for position, vector in cached.items():
+            result[position] = vector
+
+        missing = [position for position in range(len(texts)) if position not in cached]
+        if missing:
+            kwargs.pop("convert_to_numpy", None)
+            kwargs.pop("convert_to_tensor", None)
+            computed = self.model.encode(
+                [texts[position] for position in missing],
+                normalize_embeddings=normalize_embeddings,
+                convert_to_numpy=True,
+                **kwargs,
+            )
+            result[missing] = computed
+            self.cache.store([keys[position] for position in missing], computed)
+
+        return result[0] if single else result
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
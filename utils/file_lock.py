@@ -0,0 +1,28 @@
+"""
+Exclusive lock file shared by the worker processes of a multi-worker server.
+"""
+import fcntl
+import os
+
+
+class ProcessFileLock:
+    """
+    Holds flock(2) on `path` while used as a context manager. It excludes other processes,
+    forked workers included, but not other threads of this one, which callers serialize themselves.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+        self._pid = None
+
+    def __enter__(self):
+        # A forked child shares its parent's open file description, and with it the parent's lock: reopen.
+        if self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
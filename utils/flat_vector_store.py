@@ -0,0 +1,507 @@
+"""
+Flat, memory-mapped vector store: an in-process alternative to a Chroma collection.
+
+Embeddings are L2-normalized and kept in one contiguous array on disk (float16 by
+default, int8 with a per-row scale, or float32), mapped read-only by every worker
+process so they all use the same page-cache pages. Search is an exact dot product
+over the whole matrix, computed block by block with a running partial sort, for a
+single query or a batch: there is no HNSW graph, so no recall loss, and no client
+in between. Metadata is stored as one JSON line per document in a sidecar file,
+located through a memory-mapped offset array.
+
+`FlatVectorStore` implements the part of the Chroma collection API this service uses
+(`get`, `add`, `upsert`, `delete`, `query`, `count`) and `FlatVectorStoreClient` the
+part of the client API, so either backend can sit behind ChromaDBHandler and
+RetrievalHandler. Writers from several processes are serialized by a lock file;
+readers pick up a write when the manifest file changes.
+"""
+import json
+import mmap
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from utils.constants import FLAT_STORE_DTYPE, FLAT_SEARCH_BLOCK_ROWS
+from utils.file_lock import ProcessFileLock
+from utils.vector_store import VectorStore
+
+VECTOR_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+# Ids are stored fixed-width so the id column can be memory-mapped too.
+ID_BYTES = 64
+MIN_CAPACITY = 1024
+# The metadata file is rewritten once replaced lines take more space than the live ones (and at least this much).
+COMPACT_MIN_BYTES = 8 * 1024 * 1024
+
+_OPERATORS = {
+    "$eq": lambda actual, value: actual == value,
+    "$ne": lambda actual, value: actual != value,
+    "$gt": lambda actual, value: actual is not None and actual > value,
+    "$gte": lambda actual, value: actual is not None and actual >= value,
+    "$lt": lambda actual, value: actual is not None and actual < value,
+    "$lte": lambda actual, value: actual is not None and actual <= value,
+    "$in": lambda actual, value: actual in value,
+    "$nin": lambda actual, value: actual not in value,
+}
+
+
+def matches_where(meta: dict, where: dict):
+    """Evaluates a Chroma `where` clause ($and/$or of field conditions) against one metadata dict."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(meta, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(meta, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            actual = meta.get(key)
+            try:
+                if not all(_OPERATORS[op](actual, value) for op, value in condition.items()):
+                    return False
+            except TypeError:
+                return False
+        elif meta.get(key) != condition:
+            return False
+    return True
+
+
+def _normalize(embeddings):
+    vectors = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class _Snapshot:
+    """Read-only view of the store files as of one manifest version."""
+
+    def __init__(self, directory, manifest, key):
+        self.key = key
+        self.manifest = manifest or {}
+        self.rows = self.manifest.get("rows", 0)
+        self._id_rows = None
+        self._lock = threading.Lock()
+        if not self.rows:
+            return
+        capacity, dim = manifest["capacity"], manifest["dim"]
+        path = lambda name: os.path.join(directory, name)
+        self.vectors = np.memmap(path("vectors.bin"), dtype=VECTOR_DTYPES[manifest["dtype"]], mode="r",
+                                 shape=(capacity, dim))
+        self.scales = (np.memmap(path("scales.bin"), dtype=np.float32, mode="r", shape=(capacity,))
+                       if manifest["dtype"] == "int8" else None)
+        self.alive = np.memmap(path("alive.bin"), dtype=np.uint8, mode="r", shape=(capacity,))
+        self.ids = np.memmap(path("ids.bin"), dtype=f"S{ID_BYTES}", mode="r", shape=(capacity,))
+        generation = manifest["metadata_generation"]
+        self.offsets = np.memmap(path(f"offsets-{generation}.bin"), dtype=np.int64, mode="r", shape=(capacity, 2))
+        # Kept open: a writer appends to this file and may compact it away while this snapshot is in use.
+        self._metadata_file = open(path(f"metadata-{generation}.jsonl"), "rb")
+        self.metadata = self._map_metadata()
+
+    def _map_metadata(self):
+        size = os.fstat(self._metadata_file.fileno()).st_size
+        return mmap.mmap(self._metadata_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def id_rows(self):
+        """Document id -> row, built on first use (only `get(ids=...)` and writes need it)."""
+        if self._id_rows is None:
+            with self._lock:
+                if self._id_rows is None:
+                    live = np.flatnonzero(self.alive[:self.rows])
+                    self._id_rows = {doc_id.decode("utf-8"): int(row) for doc_id, row in zip(self.ids[live], live)}
+        return self._id_rows
+
+    def live_rows(self):
+        return np.flatnonzero(self.alive[:self.rows]) if self.rows else np.empty(0, dtype=np.int64)
+
+    def doc_ids(self, rows):
+        return [doc_id.decode("utf-8") for doc_id in self.ids[rows]] if len(rows) else []
+
+    def metadatas(self, rows):
+        if not len(rows):
+            return []
+        offsets = self.offsets[rows]
+        if len(offsets) and int((offsets[:, 0] + offsets[:, 1]).max()) > len(self.metadata):
+            # Offsets are updated in place, so they can point at lines appended after this file was mapped.
+            with self._lock:
+                self.metadata = self._map_metadata()
+        return [json.loads(self.metadata[start:start + length]) for start, length in offsets]
+
+    def embeddings(self, rows):
+        if not len(rows):
+            return np.empty((0, self.manifest.get("dim", 0)), dtype=np.float32)
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        return vectors * self.scales[rows][:, None] if self.scales is not None else vectors
+
+    def top_k(self, queries, k):
+        """Exact top-`k` rows by cosine similarity for every query: (scores, rows), both (n_queries, k)."""
+        n_queries = len(queries)
+        best_scores = np.empty((n_queries, 0), dtype=np.float32)
+        best_rows = np.empty((n_queries, 0), dtype=np.int64)
+        for start in range(0, self.rows, FLAT_SEARCH_BLOCK_ROWS):
+            end = min(start + FLAT_SEARCH_BLOCK_ROWS, self.rows)
+            # Converting one cache-sized block at a time keeps the scan out of float32 copies of the whole matrix.
+            scores = queries @ np.asarray(self.vectors[start:end], dtype=np.float32).T
+            if self.scales is not None:
+                scores *= self.scales[start:end]
+            scores[:, self.alive[start:end] == 0] = -np.inf
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, end), (n_queries, end - start))], axis=1)
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores, best_rows = scores, rows
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_rows, order, axis=1)
+
+
+class FlatVectorStore(VectorStore):
+    def __init__(self, directory: str, name: str, dtype: str = FLAT_STORE_DTYPE):
+        """
+        Args:
+            directory (str): Directory of the store's files; created if missing.
+            name (str): Collection name.
+            dtype (str): "float16", "int8" or "float32"; only used when the store is created.
+        """
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unsupported vector dtype '{dtype}'; expected one of {sorted(VECTOR_DTYPES)}")
+        self.name = name
+        self.directory = directory
+        self.dtype = dtype
+        os.makedirs(directory, exist_ok=True)
+        self._manifest_path = os.path.join(directory, "manifest.json")
+        self._file_lock = ProcessFileLock(os.path.join(directory, "write.lock"))
+        self._lock = threading.Lock()
+        self._writer_lock = threading.Lock()
+        self._snapshot_cache = None
+        self._writer_ids = None
+
+    # ----- reading -----
+
+    def _read_manifest(self):
+        try:
+            with open(self._manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _snapshot(self):
+        try:
+            stat = os.stat(self._manifest_path)
+            key = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            key = None
+        snapshot = self._snapshot_cache
+        if snapshot is not None and snapshot.key == key:
+            return snapshot
+        with self._lock:
+            if self._snapshot_cache is None or self._snapshot_cache.key != key:
+                for attempt in range(3):
+                    try:
+                        self._snapshot_cache = _Snapshot(self.directory, self._read_manifest(), key)
+                        break
+                    except FileNotFoundError:
+                        # A compaction removed the files of the manifest just read; the next read sees the new one.
+                        if attempt == 2:
+                            raise
+            return self._snapshot_cache
+
+    def count(self):
+        return self._snapshot().manifest.get("live", 0)
+
+    def get(self, ids=None, where=None, limit=None, offset=0, include=("metadatas",)):
+        """Documents by id, or all of them in storage order (paged by `limit`/`offset`), like `Collection.get`."""
+        snapshot = self._snapshot()
+        if ids is not None:
+            id_rows = snapshot.id_rows() if snapshot.rows else {}
+            rows = np.array([id_rows[doc_id] for doc_id in ids if doc_id in id_rows], dtype=np.int64)
+        else:
+            rows = snapshot.live_rows()
+        if where:
+            rows = np.array([row for row, meta in zip(rows, snapshot.metadatas(rows)) if matches_where(meta, where)],
+                            dtype=np.int64)
+        rows = rows[offset:offset + limit if limit is not None else None]
+
+        result = {"ids": snapshot.doc_ids(rows), "metadatas": None, "embeddings": None, "documents": None}
+        if "metadatas" in include:
+            result["metadatas"] = snapshot.metadatas(rows)
+        if "embeddings" in include:
+            result["embeddings"] = snapshot.embeddings(rows)
+        if "documents" in include:
+            result["documents"] = [None] * len(rows)
+        return result
+
+    def query(self, query_embeddings, n_results: int = 10, where: dict = None,
+              include=("metadatas", "distances")):
+        """
+        Exact nearest neighbours of every query embedding, shaped like `Collection.query`.
+        Distances are cosine distances (1 - cosine similarity). With a `where` clause, candidates
+        are taken in similarity order, widening the search until enough of them match.
+        """
+        snapshot = self._snapshot()
+        queries = _normalize(query_embeddings)
+        result = {key: [] for key in ("ids", "distances", "metadatas", "documents", "embeddings")}
+        live = snapshot.manifest.get("live", 0)
+        if not live or n_results <= 0:
+            for key in result:
+                result[key] = [[] for _ in queries]
+            return result
+
+        k = min(n_results, live) if not where else min(live, max(8 * n_results, 64))
+        while True:
+            scores, rows = snapshot.top_k(queries, k)
+            per_query = []
+            for query_scores, query_rows in zip(scores, rows):
+                valid = np.isfinite(query_scores)
+                query_scores, query_rows = query_scores[valid], query_rows[valid]
+                metadatas = snapshot.metadatas(query_rows) if where or "metadatas" in include else None
+                if where:
+                    keep = [i for i, meta in enumerate(metadatas) if matches_where(meta, where)][:n_results]
+                    query_scores, query_rows = query_scores[keep], query_rows[keep]
+                    metadatas = [metadatas[i] for i in keep]
+                per_query.append((query_scores, query_rows, metadatas))
+            enough = all(len(query_rows) >= n_results for _, query_rows, _ in per_query)
+            if not where or enough or k >= live:
+                break
+            k = min(live, k * 8)
+
+        for query_scores, query_rows, metadatas in per_query:
+            result["ids"].append(snapshot.doc_ids(query_rows))
+            result["distances"].append((1.0 - query_scores).tolist())
+            result["metadatas"].append(metadatas if metadatas is not None else [None] * len(query_rows))
+            result["documents"].append([None] * len(query_rows))
+            result["embeddings"].append(snapshot.embeddings(query_rows) if "embeddings" in include else None)
+        return result
+
+    # ----- writing -----
+
+    @contextmanager
+    def _write_lock(self):
+        # One writer at a time: the threads of this process, then every other process sharing the directory.
+        with self._writer_lock, self._file_lock:
+            yield
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _write_manifest(self, manifest):
+        manifest["version"] = manifest.get("version", 0) + 1
+        tmp_path = f"{self._manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path)
+
+    def _open_writable(self, manifest):
+        capacity, dim = manifest["capacity"], manifest["dim"]
+        arrays = {
+            "vectors": np.memmap(self._path("vectors.bin"), dtype=VECTOR_DTYPES[manifest["dtype"]], mode="r+",
+                                 shape=(capacity, dim)),
+            "alive": np.memmap(self._path("alive.bin"), dtype=np.uint8, mode="r+", shape=(capacity,)),
+            "ids": np.memmap(self._path("ids.bin"), dtype=f"S{ID_BYTES}", mode="r+", shape=(capacity,)),
+            "offsets": np.memmap(self._path(f"offsets-{manifest['metadata_generation']}.bin"), dtype=np.int64,
+                                 mode="r+", shape=(capacity, 2)),
+        }
+        if manifest["dtype"] == "int8":
+            arrays["scales"] = np.memmap(self._path("scales.bin"), dtype=np.float32, mode="r+", shape=(capacity,))
+        return arrays
+
+    def _resize(self, manifest, capacity):
+        """Grows (or creates) every per-row file to `capacity` rows; existing mappings stay valid."""
+        row_bytes = {
+            "vectors.bin": manifest["dim"] * np.dtype(VECTOR_DTYPES[manifest["dtype"]]).itemsize,
+            "alive.bin": 1,
+            "ids.bin": ID_BYTES,
+            f"offsets-{manifest['metadata_generation']}.bin": 16,
+        }
+        if manifest["dtype"] == "int8":
+            row_bytes["scales.bin"] = 4
+        for name, size in row_bytes.items():
+            with open(self._path(name), "ab") as f:
+                f.truncate(capacity * size)
+        open(self._path(f"metadata-{manifest['metadata_generation']}.jsonl"), "ab").close()
+        manifest["capacity"] = capacity
+
+    @staticmethod
+    def _quantize(vectors, dtype):
+        """Vectors in the storage dtype; int8 rows are scaled symmetrically by their largest component."""
+        if dtype == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return vectors.astype(VECTOR_DTYPES[dtype]), None
+
+    def add(self, ids, embeddings, metadatas=None, documents=None):
+        self.upsert(ids, embeddings, metadatas=metadatas, documents=documents)
+
+    def upsert(self, ids, embeddings, metadatas=None, documents=None):
+        """Inserts or replaces documents. `documents` are not stored; this service keeps everything in metadata."""
+        if not len(ids):
+            return
+        vectors = _normalize(embeddings)
+        metadatas = metadatas or [{} for _ in ids]
+        encoded_ids = [str(doc_id).encode("utf-8") for doc_id in ids]
+        if any(len(doc_id) > ID_BYTES for doc_id in encoded_ids):
+            raise ValueError(f"Document ids of the flat vector store are limited to {ID_BYTES} bytes")
+
+        with self._write_lock():
+            manifest = self._read_manifest()
+            if manifest is None:
+                manifest = {"dim": vectors.shape[1], "dtype": self.dtype, "capacity": 0, "rows": 0, "live": 0,
+                            "metadata_generation": 0}
+            if manifest["dim"] != vectors.shape[1]:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store's {manifest['dim']}")
+            snapshot = self._snapshot()
+            id_rows = self._writer_id_rows(manifest, snapshot)
+
+            # Replaced documents keep their row; new ones fill deleted rows first, then go to the end.
+            rows = np.empty(len(ids), dtype=np.int64)
+            free = iter(np.flatnonzero(snapshot.alive[:snapshot.rows] == 0).tolist() if snapshot.rows else [])
+            high_water = manifest["rows"]
+            for position, doc_id in enumerate(ids):
+                row = id_rows.get(doc_id)
+                if row is None:
+                    row = next(free, None)
+                    if row is None:
+                        row = high_water
+                        high_water += 1
+                    id_rows[doc_id] = row
+                rows[position] = row
+            # A document listed twice in one call keeps its last version, like Chroma.
+            rows_unique, last = np.unique(rows[::-1], return_index=True)
+            last = len(rows) - 1 - last
+
+            if high_water > manifest["capacity"]:
+                self._resize(manifest, max(high_water, 2 * manifest["capacity"], MIN_CAPACITY))
+            arrays = self._open_writable(manifest)
+
+            quantized, scales = self._quantize(vectors[last], manifest["dtype"])
+            arrays["vectors"][rows_unique] = quantized
+            if scales is not None:
+                arrays["scales"][rows_unique] = scales
+            arrays["ids"][rows_unique] = np.array([encoded_ids[i] for i in last], dtype=f"S{ID_BYTES}")
+
+            metadata_path = self._path(f"metadata-{manifest['metadata_generation']}.jsonl")
+            lines = [json.dumps(metadatas[i], ensure_ascii=False).encode("utf-8") + b"\n" for i in last]
+            with open(metadata_path, "ab") as f:
+                start = f.tell()
+                f.write(b"".join(lines))
+            lengths = np.array([len(line) for line in lines], dtype=np.int64)
+            arrays["offsets"][rows_unique, 0] = start + np.concatenate([[0], np.cumsum(lengths)[:-1]])
+            arrays["offsets"][rows_unique, 1] = lengths
+            arrays["alive"][rows_unique] = 1
+
+            for array in arrays.values():
+                array.flush()
+            manifest["rows"] = high_water
+            manifest["live"] = int(np.count_nonzero(arrays["alive"][:high_water]))
+            self._commit(manifest, arrays, id_rows)
+
+    def delete(self, ids=None):
+        """Deletes documents by id; their rows are reused by later inserts."""
+        if not ids:
+            return
+        with self._write_lock():
+            manifest = self._read_manifest()
+            snapshot = self._snapshot()
+            if manifest is None or not snapshot.rows:
+                return
+            id_rows = self._writer_id_rows(manifest, snapshot)
+            rows = np.array([id_rows.pop(doc_id) for doc_id in ids if doc_id in id_rows], dtype=np.int64)
+            if not len(rows):
+                return
+            arrays = self._open_writable(manifest)
+            arrays["alive"][rows] = 0
+            arrays["ids"][rows] = b""
+            for array in arrays.values():
+                array.flush()
+            manifest["live"] = int(np.count_nonzero(arrays["alive"][:manifest["rows"]]))
+            self._commit(manifest, arrays, id_rows)
+
+    def _writer_id_rows(self, manifest, snapshot):
+        """
+        Id -> row map to update in a write. Kept from this process's previous write while no other
+        process has written since, so back-to-back writes of an indexing run do not rebuild it.
+        """
+        cached = self._writer_ids
+        if cached is not None and manifest is not None and cached[0] == manifest.get("version"):
+            return cached[1]
+        return dict(snapshot.id_rows()) if snapshot.rows else {}
+
+    def _commit(self, manifest, arrays, id_rows):
+        obsolete = self._maybe_compact(manifest, arrays)
+        self._write_manifest(manifest)
+        self._writer_ids = (manifest["version"], id_rows)
+        # Readers still on the old generation keep their mappings of the removed files until they reload.
+        for name in obsolete:
+            os.remove(self._path(name))
+
+    def _maybe_compact(self, manifest, arrays):
+        """
+        Rewrites the metadata file without replaced and deleted lines, under a new generation.
+        Returns the files of the old generation, to remove once the manifest points to the new one.
+        """
+        generation = manifest["metadata_generation"]
+        metadata_path = self._path(f"metadata-{generation}.jsonl")
+        file_bytes = os.path.getsize(metadata_path)
+        live = np.flatnonzero(arrays["alive"][:manifest["rows"]])
+        live_bytes = int(arrays["offsets"][live, 1].sum())
+        if file_bytes < COMPACT_MIN_BYTES or file_bytes - live_bytes <= live_bytes:
+            return []
+
+        new_generation = generation + 1
+        new_offsets = np.memmap(self._path(f"offsets-{new_generation}.bin"), dtype=np.int64, mode="w+",
+                                shape=(manifest["capacity"], 2))
+        position = 0
+        with open(metadata_path, "rb") as source, open(self._path(f"metadata-{new_generation}.jsonl"), "wb") as target:
+            for row in live:
+                start, length = arrays["offsets"][row]
+                source.seek(start)
+                target.write(source.read(length))
+                new_offsets[row] = (position, length)
+                position += length
+        new_offsets.flush()
+        manifest["metadata_generation"] = new_generation
+        return [f"offsets-{generation}.bin", f"metadata-{generation}.jsonl"]
+
+
+class FlatVectorStoreClient:
+    """The part of `chromadb.PersistentClient` this service uses, over one FlatVectorStore per collection."""
+
+    def __init__(self, path: str, dtype: str = FLAT_STORE_DTYPE):
+        self.root = os.path.join(path, "flat")
+        self.dtype = dtype
+        self._stores = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _directory(self, name):
+        return os.path.join(self.root, os.path.basename(name))
+
+    def get_or_create_collection(self, name: str, **kwargs):
+        # One store object per collection, so every caller in this process shares its mappings.
+        with self._lock:
+            store = self._stores.get(name)
+            if store is None or not os.path.isdir(store.directory):
+                store = FlatVectorStore(self._directory(name), name, dtype=self.dtype)
+                self._stores[name] = store
+            return store
+
+    def get_collection(self, name: str, **kwargs):
+        if not os.path.isdir(self._directory(name)):
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.get_or_create_collection(name)
+
+    def delete_collection(self, name: str):
+        directory = self._directory(name)
+        if not os.path.isdir(directory):
+            raise ValueError(f"Collection {name} does not exist.")
+        with self._lock:
+            self._stores.pop(name, None)
+        shutil.rmtree(directory)
+
+    def list_collections(self):
+        return [self.get_or_create_collection(name) for name in sorted(os.listdir(self.root))
+                if os.path.isdir(os.path.join(self.root, name))]
@@ -1,19 +1,14 @@
-import os
-import requests
-import json
-from utils.constants import gemini_api_key
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
-import google.generativeai as genai
-
-
+from utils.llm_providers import get_provider
 
 
 class GeminiLLMHandler:
+    def __init__(self, model="gemini-1.5-pro"):
+        self.model = model
+        self.provider = get_provider("gemini")
 
     def gemini_api_call(self, input_query):
+        return self.provider.generate(input_query, model=self.model)
 
-        genai.configure(api_key=gemini_api_key)
-        model = genai.GenerativeModel("gemini-1.5-pro")
-        response = model.generate_content(input_query)
-
-        return response.text
+    def gemini_api_stream(self, input_query):
+        """Yields response text chunks as Gemini streams them."""
+        return self.provider.stream(input_query, model=self.model)
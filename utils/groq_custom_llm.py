@@ -1,18 +1,14 @@
-import os
-from groq import Groq
-from utils.constants import groq_api_key
+from utils.llm_providers import get_provider
 
 class GroqLLMHandler:
     def __init__(self):
-        self.client = Groq(api_key=groq_api_key)
+        self.provider = get_provider("groq")
         self.model = "llama-3.3-70b-versatile"
 
     def groq_api_call(self, input_query):
-        try:
-            chat_completion = self.client.chat.completions.create(
-                messages=[{"role": "user", "content": input_query}],
-                model=self.model,
-            )
-            return chat_completion.choices[0].message.content
-        except Exception as e:
-            return f"Error: {str(e)}"
\ No newline at end of file
+        """Returns the completion for `input_query`; failures raise, so they are never mistaken for an answer."""
+        return self.provider.generate(input_query, model=self.model)
+
+    def groq_api_stream(self, input_query):
+        """Yields completion tokens as Groq streams them."""
+        return self.provider.stream(input_query, model=self.model)
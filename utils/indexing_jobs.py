@@ -0,0 +1,238 @@
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from utils.constants import INDEX_MAX_CONCURRENT_JOBS, temp_dir
+
+# Finished jobs kept around for status queries; the oldest are dropped first.
+MAX_FINISHED_JOBS = 100
+# Job status is also written here, so a status query answered by another worker process finds it.
+JOB_STATUS_DIR = os.path.join(temp_dir, "indexing_jobs")
+# Minimum seconds between status-file writes for progress updates.
+STATUS_WRITE_INTERVAL = 1.0
+# Seconds a queued job waits before looking for a free slot again.
+SLOT_POLL_INTERVAL = 0.5
+
+
+class IndexingJob:
+    """Status and progress of one background indexing run."""
+
+    def __init__(self, collection_name: str, total_bytes: int = 0, status_dir: str = None):
+        self.job_id = uuid.uuid4().hex
+        self.collection_name = collection_name
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.rows_processed = 0
+        self.bytes_processed = 0
+        self.total_bytes = total_bytes
+        self.stats = None
+        self.error = None
+        self.status_path = os.path.join(status_dir, f"{self.job_id}.json") if status_dir else None
+        self._written_at = 0.0
+        self._lock = threading.Lock()
+
+    def update_progress(self, rows: int, bytes_processed: int = None):
+        """Records `rows` more indexed rows and, if known, how far into the input file the job is."""
+        with self._lock:
+            self.rows_processed += rows
+            if bytes_processed is not None:
+                self.bytes_processed = bytes_processed
+        if time.monotonic() - self._written_at >= STATUS_WRITE_INTERVAL:
+            self.save_status()
+
+    def save_status(self):
+        """Writes the current status to the job's status file, if it has one."""
+        if not self.status_path:
+            return
+        self._written_at = time.monotonic()
+        tmp_path = f"{self.status_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, self.status_path)
+
+    def to_dict(self):
+        with self._lock:
+            now = self.finished_at or time.time()
+            elapsed = now - self.started_at if self.started_at else 0.0
+            rows_per_sec = self.rows_processed / elapsed if elapsed > 0 else 0.0
+
+            eta_seconds = None
+            if self.status == "running" and self.total_bytes and self.bytes_processed:
+                # Bytes are the only size known up front, so the ETA extrapolates from the share of the file read.
+                fraction = min(self.bytes_processed / self.total_bytes, 1.0)
+                eta_seconds = round(elapsed * (1 - fraction) / fraction, 1)
+            elif self.status == "completed":
+                eta_seconds = 0.0
+
+            return {
+                "job_id": self.job_id,
+                "collection_name": self.collection_name,
+                "status": self.status,
+                "created_at": self.created_at,
+                "rows_processed": self.rows_processed,
+                "bytes_processed": self.bytes_processed,
+                "total_bytes": self.total_bytes,
+                "rows_per_sec": round(rows_per_sec, 1),
+                "elapsed_seconds": round(elapsed, 3),
+                "eta_seconds": eta_seconds,
+                "stats": self.stats,
+                "error": self.error,
+            }
+
+
+class StoredJob:
+    """Status of a job run by another worker process, as last written to its status file."""
+
+    def __init__(self, status):
+        self.job_id = status["job_id"]
+        self.status = status
+
+    def to_dict(self):
+        return self.status
+
+
+class IndexingJobManager:
+    """
+    Runs indexing work on a small, bounded worker pool so request threads return immediately.
+
+    At most `max_workers` jobs run at once across every worker process sharing `status_dir`:
+    a job runs only while it holds one of `max_workers` slot files, locked with flock(2), and
+    stays "queued" until one is free. This keeps embedding work for new indexes from taking
+    every core away from the chat endpoints, however many gunicorn workers accepted uploads.
+    A job also holds its collection's lock file, so jobs on one collection run one at a time.
+    The locks go away with their process, so a killed worker never leaks one.
+    """
+
+    def __init__(self, max_workers: int = INDEX_MAX_CONCURRENT_JOBS, status_dir: str = JOB_STATUS_DIR):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="indexing-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.max_workers = max_workers
+        self.status_dir = status_dir
+        self.slot_dir = os.path.join(status_dir, "slots")
+        os.makedirs(self.slot_dir, exist_ok=True)
+        self._prune_status_files()
+
+    def submit(self, collection_name: str, work, total_bytes: int = 0):
+        """
+        Queues `work(job)` and returns the new job. `work` reports progress through
+        `job.update_progress` and may return a stats dict that is stored on the job.
+        """
+        job = IndexingJob(collection_name, total_bytes=total_bytes, status_dir=self.status_dir)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        job.save_status()
+        self._executor.submit(self._run, job, work)
+        return job
+
+    def get(self, job_id: str):
+        """Returns the job, or the last status written for it by another worker process, or None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        return self._load(os.path.join(self.status_dir, f"{os.path.basename(job_id)}.json"))
+
+    def list(self):
+        """Jobs of every worker process, newest first."""
+        with self._lock:
+            jobs = {job.job_id: job for job in self._jobs.values()}
+        for name in os.listdir(self.status_dir):
+            job_id = name[:-len(".json")]
+            if name.endswith(".json") and job_id not in jobs:
+                stored = self._load(os.path.join(self.status_dir, name))
+                if stored is not None:
+                    jobs[job_id] = stored
+        return sorted(jobs.values(), key=lambda job: job.to_dict()["created_at"], reverse=True)
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return StoredJob(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def _try_lock(path):
+        """`path` opened and flock'd, or None while another job (of any process) holds it."""
+        lock_file = open(path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    @staticmethod
+    def _unlock(lock_file):
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+    @contextmanager
+    def _job_locks(self, collection_name: str):
+        """
+        Holds `collection_name`'s lock and one of the `max_workers` job slots, waiting until both are
+        free. Two jobs on one collection must not overlap: each saves the BM25 index it loaded at its
+        start, and deletes every document its own file did not contain, including the other's rows.
+        """
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", collection_name)
+        collection_path = os.path.join(self.slot_dir, f"collection-{safe_name}.lock")
+        while (collection_lock := self._try_lock(collection_path)) is None:
+            time.sleep(SLOT_POLL_INTERVAL)
+        slot_paths = [os.path.join(self.slot_dir, f"slot-{index}.lock") for index in range(self.max_workers)]
+        while (slot := next(filter(None, map(self._try_lock, slot_paths)), None)) is None:
+            time.sleep(SLOT_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            self._unlock(slot)
+            self._unlock(collection_lock)
+
+    def _run(self, job, work):
+        with self._job_locks(job.collection_name):
+            job.status = "running"
+            job.started_at = time.time()
+            job.save_status()
+            try:
+                job.stats = work(job)
+                job.status = "completed"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+                print(f"Indexing job {job.job_id} for '{job.collection_name}' failed: {e}")
+            finally:
+                job.finished_at = time.time()
+                job.save_status()
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.finished_at is not None]
+        finished.sort(key=lambda job: job.finished_at)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.job_id]
+            try:
+                os.remove(job.status_path)
+            except FileNotFoundError:
+                pass
+
+    def _prune_status_files(self):
+        """Drops status files beyond the newest MAX_FINISHED_JOBS, e.g. ones left by earlier runs."""
+        paths = [os.path.join(self.status_dir, name) for name in os.listdir(self.status_dir) if name.endswith(".json")]
+        paths.sort(key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0, reverse=True)
+        for path in paths[MAX_FINISHED_JOBS:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+indexing_jobs = IndexingJobManager()
@@ -0,0 +1,129 @@
+"""
+CPU inference backends of the embedding model and the cross-encoder.
+
+INFERENCE_BACKEND selects how both models run:
+  - "torch": stock PyTorch, as downloaded.
+  - "int8":  PyTorch with dynamic int8 quantization of every Linear layer (weights stored as int8,
+             activations quantized on the fly). No export step and no extra dependency.
+  - "onnx":  the embedding model exported once to ONNX_EXPORT_DIR and dynamically quantized to int8
+             for ONNX_QUANTIZATION, run by ONNX Runtime (needs `optimum[onnxruntime]`). The cross-encoder
+             gets the "int8" treatment, as sentence-transformers 3.x has no ONNX backend for it.
+
+Every backend truncates inputs to EMBED_MAX_SEQ_LENGTH / RERANK_MAX_SEQ_LENGTH tokens and runs on
+INFERENCE_THREADS intra-op threads. The models keep the SentenceTransformer / CrossEncoder interface,
+so micro-batching and the embedding cache wrap them unchanged. torch and
+sentence-transformers are imported by the first model load, not with this module.
+"""
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+from utils.constants import INFERENCE_BACKEND, INFERENCE_THREADS, EMBED_MAX_SEQ_LENGTH, RERANK_MAX_SEQ_LENGTH, \
+    ONNX_QUANTIZATION, ONNX_EXPORT_DIR
+from utils.startup_report import timed
+
+BACKENDS = ("torch", "int8", "onnx")
+
+_threads = INFERENCE_THREADS
+
+
+def _check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND '{backend}'; expected one of {', '.join(BACKENDS)}")
+
+
+def set_threads(count: int):
+    """
+    Intra-op threads of the models (0 keeps torch's default): applied to torch now if it is
+    already imported, and to every model loaded from now on.
+    """
+    global _threads
+    _threads = count
+    torch = sys.modules.get("torch")
+    if torch is not None and count > 0:
+        torch.set_num_threads(count)
+
+
+def _apply_threads():
+    if _threads > 0:
+        import torch
+
+        torch.set_num_threads(_threads)
+
+
+def _quantize(module):
+    """Replaces the Linear layers of `module` by dynamically quantized int8 ones, in place."""
+    import torch
+
+    return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def model_key(model_name: str, backend: str = INFERENCE_BACKEND):
+    """
+    Name of `model_name` as run by `backend`, for caches of its outputs: quantized models
+    produce slightly different vectors, which must not be mixed with the PyTorch ones.
+    """
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def _onnx_embedding_model(model_name: str):
+    """The embedding model in ONNX Runtime, exported and quantized on first use and loaded from disk after."""
+    import onnxruntime
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    file_name = f"onnx/model_qint8_{ONNX_QUANTIZATION}.onnx"
+    export_path = os.path.join(ONNX_EXPORT_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", f"{model_name}-{ONNX_QUANTIZATION}"))
+    if not os.path.isdir(export_path):
+        os.makedirs(ONNX_EXPORT_DIR, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=ONNX_EXPORT_DIR)
+        try:
+            print(f"Exporting '{model_name}' to ONNX ({ONNX_QUANTIZATION} int8) in {export_path}")
+            exported = SentenceTransformer(model_name, device="cpu", backend="onnx")
+            exported.save_pretrained(staging)
+            export_dynamic_quantized_onnx_model(exported, ONNX_QUANTIZATION, staging)
+            os.rename(staging, export_path)
+        except OSError:
+            # Another process finished the same export first.
+            if not os.path.isdir(export_path):
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    session_options = onnxruntime.SessionOptions()
+    # Without a thread pool of its own a session is safe to share with workers forked after loading.
+    session_options.intra_op_num_threads = _threads or 1
+    return SentenceTransformer(export_path, device="cpu", backend="onnx",
+                               model_kwargs={"file_name": file_name, "session_options": session_options})
+
+
+def load_embedding_model(model_name: str, backend: str = INFERENCE_BACKEND):
+    """Loads the SentenceTransformer `model_name` for CPU inference with `backend`."""
+    _check_backend(backend)
+    with timed("models", model_key(model_name, backend)):
+        from sentence_transformers import SentenceTransformer
+
+        _apply_threads()
+        if backend == "onnx":
+            model = _onnx_embedding_model(model_name)
+        else:
+            model = SentenceTransformer(model_name, device="cpu")
+            if backend == "int8":
+                _quantize(model)
+        if EMBED_MAX_SEQ_LENGTH > 0:
+            model.max_seq_length = EMBED_MAX_SEQ_LENGTH
+    return model
+
+
+def load_re_ranker(model_name: str, backend: str = INFERENCE_BACKEND):
+    """Loads the CrossEncoder `model_name` for CPU inference with `backend`."""
+    _check_backend(backend)
+    with timed("models", model_key(model_name, backend)):
+        from sentence_transformers import CrossEncoder
+
+        _apply_threads()
+        model = CrossEncoder(model_name, device="cpu", max_length=RERANK_MAX_SEQ_LENGTH or None)
+        if backend in ("int8", "onnx"):
+            _quantize(model.model)
+    return model
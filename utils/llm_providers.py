@@ -0,0 +1,260 @@
+"""
+Long-lived LLM provider clients shared by every chat endpoint.
+
+Each provider owns one pooled client for the life of the process (a keep-alive
+`requests.Session` for Ollama, one `Groq` client, a configured Gemini model per
+model name), applies connect/read timeouts, retries transient failures a bounded
+number of times with jittered exponential backoff, and caps how many calls it
+runs at once so a slow provider cannot tie up every request thread. The Groq and
+Gemini SDKs are imported when their provider is first created, so a process that
+only talks to Ollama never loads them.
+"""
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.constants import ollama_url, gemini_api_key, groq_api_key, GROQ_BASE_URL, GEMINI_API_ENDPOINT, \
+    LLM_CONNECT_TIMEOUT_S, LLM_READ_TIMEOUT_S, LLM_MAX_RETRIES, LLM_RETRY_BASE_DELAY_S, LLM_RETRY_MAX_DELAY_S, \
+    OLLAMA_MAX_CONCURRENCY, GROQ_MAX_CONCURRENCY, GEMINI_MAX_CONCURRENCY
+from utils.startup_report import timed
+
+
+class ProviderError(RuntimeError):
+    """A provider call failed; `retryable` tells whether trying again may succeed."""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class LLMProvider:
+    name = "base"
+    retryable_errors = ()
+
+    def __init__(self, max_concurrency: int, max_retries: int = LLM_MAX_RETRIES):
+        self.max_retries = max_retries
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    def _is_retryable(self, error):
+        if isinstance(error, ProviderError):
+            return error.retryable
+        return isinstance(error, self.retryable_errors)
+
+    def _backoff(self, attempt):
+        # Full jitter: spreads retries from concurrent requests instead of retrying in lockstep.
+        return random.uniform(0, min(LLM_RETRY_MAX_DELAY_S, LLM_RETRY_BASE_DELAY_S * 2 ** attempt))
+
+    def _call_with_retries(self, call):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return call()
+            except Exception as e:
+                if attempt == self.max_retries or not self._is_retryable(e):
+                    raise
+                time.sleep(self._backoff(attempt))
+
+    def generate(self, prompt: str, model: str = None) -> str:
+        """Returns the full completion for `prompt`."""
+        with self._slots:
+            return self._call_with_retries(lambda: self._generate(prompt, model))
+
+    def stream(self, prompt: str, model: str = None):
+        """
+        Yields completion tokens for `prompt`. Failures before the first token are retried;
+        once tokens have been sent, an error is raised to the caller.
+        """
+        with self._slots:
+            for attempt in range(self.max_retries + 1):
+                started_streaming = False
+                try:
+                    for token in self._stream(prompt, model):
+                        started_streaming = True
+                        yield token
+                    return
+                except Exception as e:
+                    if started_streaming or attempt == self.max_retries or not self._is_retryable(e):
+                        raise
+                    time.sleep(self._backoff(attempt))
+
+    def _generate(self, prompt, model):
+        raise NotImplementedError
+
+    def _stream(self, prompt, model):
+        raise NotImplementedError
+
+
+class OllamaProvider(LLMProvider):
+    name = "ollama"
+    retryable_errors = (requests.ConnectionError, requests.Timeout)
+
+    def __init__(self, url: str = ollama_url, default_model: str = "llama3.2",
+                 max_concurrency: int = OLLAMA_MAX_CONCURRENCY):
+        super().__init__(max_concurrency)
+        self.url = url
+        self.default_model = default_model
+        self.timeout = (LLM_CONNECT_TIMEOUT_S, LLM_READ_TIMEOUT_S)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Content-Type": "application/json"})
+
+    def _send(self, prompt, model, stream):
+        payload = {"model": model or self.default_model, "prompt": prompt, "stream": stream}
+        return self.session.post(self.url, data=json.dumps(payload), timeout=self.timeout, stream=stream)
+
+    @staticmethod
+    def _retryable_status(status_code):
+        return status_code >= 500 or status_code == 429
+
+    def _post(self, prompt, model, stream):
+        response = self._send(prompt, model, stream)
+        if response.status_code != 200:
+            body = response.text
+            response.close()
+            raise ProviderError(f"Ollama returned {response.status_code}: {body}",
+                                retryable=self._retryable_status(response.status_code))
+        return response
+
+    def post(self, prompt: str, model: str = None) -> requests.Response:
+        """
+        Returns the raw /api/generate response (non-streaming), retrying connection errors and 5xx/429
+        answers. The last response is returned as-is, whatever its status, for the caller to report.
+        """
+        with self._slots:
+            for attempt in range(self.max_retries + 1):
+                last_attempt = attempt == self.max_retries
+                try:
+                    response = self._send(prompt, model, stream=False)
+                except self.retryable_errors:
+                    if last_attempt:
+                        raise
+                else:
+                    if last_attempt or not self._retryable_status(response.status_code):
+                        return response
+                    response.close()
+                time.sleep(self._backoff(attempt))
+
+    def _generate(self, prompt, model):
+        return self._post(prompt, model, stream=False).json()["response"]
+
+    def _stream(self, prompt, model):
+        with self._post(prompt, model, stream=True) as response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise ProviderError(chunk["error"])
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
+
+
+class GroqProvider(LLMProvider):
+    name = "groq"
+
+    def __init__(self, default_model: str = "llama-3.3-70b-versatile", max_concurrency: int = GROQ_MAX_CONCURRENCY):
+        from groq import Groq, APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
+
+        super().__init__(max_concurrency)
+        self.retryable_errors = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+        self.default_model = default_model
+        # Retries are ours (bounded, jittered); the SDK's own are turned off so they do not multiply.
+        self.client = Groq(
+            api_key=groq_api_key,
+            base_url=GROQ_BASE_URL,
+            timeout=LLM_READ_TIMEOUT_S,
+            max_retries=0,
+        )
+
+    def _generate(self, prompt, model):
+        chat_completion = self.client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=model or self.default_model,
+        )
+        return chat_completion.choices[0].message.content
+
+    def _stream(self, prompt, model):
+        stream = self.client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=model or self.default_model,
+            stream=True,
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, default_model: str = "gemini-1.5-pro", max_concurrency: int = GEMINI_MAX_CONCURRENCY):
+        import google.generativeai as genai
+        from google.api_core import exceptions as google_exceptions
+
+        super().__init__(max_concurrency)
+        self.retryable_errors = (
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.DeadlineExceeded,
+            google_exceptions.ResourceExhausted,
+            google_exceptions.InternalServerError,
+            requests.ConnectionError,
+        )
+        self._genai = genai
+        self.default_model = default_model
+        client_options = {"api_endpoint": GEMINI_API_ENDPOINT} if GEMINI_API_ENDPOINT else None
+        genai.configure(api_key=gemini_api_key, transport="rest", client_options=client_options)
+        self._models = {}
+        self._models_lock = threading.Lock()
+
+    def _model(self, model):
+        name = model or self.default_model
+        with self._models_lock:
+            if name not in self._models:
+                self._models[name] = self._genai.GenerativeModel(name)
+            return self._models[name]
+
+    def _generate(self, prompt, model):
+        response = self._model(model).generate_content(prompt, request_options={"timeout": LLM_READ_TIMEOUT_S})
+        return response.text
+
+    def _stream(self, prompt, model):
+        response = self._model(model).generate_content(
+            prompt, stream=True, request_options={"timeout": LLM_READ_TIMEOUT_S})
+        for chunk in response:
+            if chunk.parts:
+                yield chunk.text
+
+
+PROVIDERS = {
+    "ollama": OllamaProvider,
+    "groq": GroqProvider,
+    "gemini": GeminiProvider,
+}
+
+_providers = {}
+_providers_pid = None
+_providers_lock = threading.Lock()
+
+
+def get_provider(name: str) -> LLMProvider:
+    """Returns the process-wide provider `name` ("ollama", "groq" or "gemini"), creating it on first use."""
+    global _providers, _providers_pid
+    with _providers_lock:
+        if _providers_pid != os.getpid():
+            # Pooled connections must not be shared with a forked parent.
+            _providers = {}
+            _providers_pid = os.getpid()
+        provider = _providers.get(name)
+        if provider is None:
+            with timed("providers", name):
+                provider = PROVIDERS[name]()
+            _providers[name] = provider
+        return provider
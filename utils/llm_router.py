@@ -0,0 +1,242 @@
+"""
+Hedged routing of LLM calls across the enabled providers.
+
+A call goes to the provider the endpoint asked for. The router keeps, per provider, the
+first-token latency and outcome of its last LLM_STATS_WINDOW calls, and uses them two ways:
+  - Hedging: when the first token has not arrived by the LLM_HEDGE_PERCENTILE of the provider's
+    recent first-token latencies, the next backup is started as well. Whichever produces a token
+    first answers; the other is cancelled. Only the slowest few percent of calls are hedged, which
+    is where the tail latency comes from.
+  - Fallback: a call that fails before its first token moves on to the next backup, in
+    LLM_FALLBACK_ORDER with the unhealthy ones (error rate of at least LLM_UNHEALTHY_ERROR_RATE)
+    last. An unhealthy provider gets its backup started right away.
+Once tokens have been relayed the answer cannot switch providers, so a failure mid-answer is raised.
+
+Cancelling stops reading the loser's tokens and closes its stream; a loser still waiting for its
+first token keeps its provider slot until that token (or its timeout) arrives.
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+from utils import metrics
+from utils.constants import ENABLED_PROVIDERS, LLM_FALLBACK_ORDER, LLM_HEDGING_ENABLED, LLM_HEDGE_PERCENTILE, \
+    LLM_HEDGE_DELAY_MS, LLM_HEDGE_MIN_DELAY_MS, LLM_HEDGE_MIN_SAMPLES, LLM_UNHEALTHY_ERROR_RATE, LLM_STATS_WINDOW
+from utils.llm_providers import PROVIDERS, ProviderError, get_provider
+
+_DONE = object()
+
+
+class ProviderStats:
+    """Rolling first-token latencies and outcomes of one provider's recent calls."""
+
+    def __init__(self, window: int = LLM_STATS_WINDOW):
+        self.first_token_s = deque(maxlen=window)
+        self.failures = deque(maxlen=window)  # one bool per finished call
+        self._lock = threading.Lock()
+
+    def record_first_token(self, seconds: float):
+        with self._lock:
+            self.first_token_s.append(seconds)
+
+    def record_outcome(self, failed: bool):
+        with self._lock:
+            self.failures.append(failed)
+
+    def percentile(self, percent: float):
+        """The `percent` percentile of the recent first-token latencies (seconds), or None with too few samples."""
+        with self._lock:
+            samples = sorted(self.first_token_s)
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+    def error_rate(self):
+        """Share of the recent calls that failed, or None with too few samples."""
+        with self._lock:
+            failures = list(self.failures)
+        if len(failures) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return sum(failures) / len(failures)
+
+    def snapshot(self):
+        with self._lock:
+            calls = len(self.failures)
+            failed = sum(self.failures)
+            samples = sorted(self.first_token_s)
+
+        def quantile(percent):
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(len(samples) * percent / 100))] * 1000, 1)
+
+        return {
+            "calls": calls,
+            "error_rate": round(failed / calls, 4) if calls else None,
+            "first_token_p50_ms": quantile(50),
+            "first_token_p95_ms": quantile(95),
+            "first_token_p99_ms": quantile(99),
+        }
+
+
+class _Attempt:
+    """One provider call made for a routed answer."""
+
+    def __init__(self, provider: str, model, reason: str):
+        self.provider = provider
+        self.model = model
+        self.reason = reason  # "primary", "hedge" or "fallback"
+        self.started = time.perf_counter()
+        self.cancelled = threading.Event()
+        self.finished = False
+
+
+class RoutedStream:
+    """
+    The tokens of one routed answer; iterate it once. `info` tells, once the first token is out,
+    which provider and model answered, whether a hedge was started and which providers failed.
+    """
+
+    def __init__(self, router, prompt: str, provider: str, model: str = None, hedge: bool = True):
+        self.router = router
+        self.prompt = prompt
+        self.provider = provider
+        self.model = model
+        self.hedge = hedge
+        self.info = {"provider": None, "model": None, "hedged": False, "failed": []}
+
+    def _run(self, attempt, results):
+        """Relays the attempt's tokens into `results` until it ends or is cancelled (runs in its own thread)."""
+        try:
+            tokens = get_provider(attempt.provider).stream(self.prompt, model=attempt.model)
+            try:
+                for token in tokens:
+                    if attempt.cancelled.is_set():
+                        return
+                    results.put((attempt, token))
+            finally:
+                tokens.close()
+            results.put((attempt, _DONE))
+        except Exception as e:
+            results.put((attempt, e))
+
+    def __iter__(self):
+        results = queue.Queue()
+        attempts = []
+        backups = self.router.backups(self.provider)
+
+        def start(provider, model, reason):
+            attempt = _Attempt(provider, model, reason)
+            attempts.append(attempt)
+            threading.Thread(target=self._run, args=(attempt, results), name=f"llm-{provider}", daemon=True).start()
+
+        start(self.provider, self.model, "primary")
+        winner = None
+        try:
+            while True:
+                timeout = None
+                running = [attempt for attempt in attempts if not attempt.finished]
+                if winner is None and self.hedge and backups and len(running) == 1:
+                    deadline = running[0].started + self.router.hedge_delay(running[0].provider)
+                    timeout = max(0.0, deadline - time.perf_counter())
+                try:
+                    attempt, item = results.get(timeout=timeout)
+                except queue.Empty:
+                    self.info["hedged"] = True
+                    start(backups.pop(0), None, "hedge")
+                    continue
+                if attempt.finished or (winner is not None and attempt is not winner):
+                    continue
+
+                if isinstance(item, Exception):
+                    attempt.finished = True
+                    self.router.stats[attempt.provider].record_outcome(failed=True)
+                    metrics.LLM_ATTEMPTS.inc(attempt.provider, attempt.reason, "failed")
+                    if attempt is winner:
+                        raise item
+                    print(f"LLM provider {attempt.provider} failed: {item}")
+                    self.info["failed"].append({"provider": attempt.provider, "error": str(item)})
+                    if not any(not other.finished for other in attempts):
+                        if not backups:
+                            raise ProviderError("Every LLM provider failed: " + "; ".join(
+                                f"{failure['provider']}: {failure['error']}" for failure in self.info["failed"]))
+                        start(backups.pop(0), None, "fallback")
+                    continue
+
+                if winner is None:
+                    winner = attempt
+                    self._win(attempt, attempts)
+                if item is _DONE:
+                    attempt.finished = True
+                    self.router.stats[attempt.provider].record_outcome(failed=False)
+                    return
+                yield item
+        finally:
+            # The client went away or the answer failed: stop whatever is still running.
+            for attempt in attempts:
+                if not attempt.finished:
+                    attempt.cancelled.set()
+                    attempt.finished = True
+                    metrics.LLM_ATTEMPTS.inc(attempt.provider, attempt.reason, "cancelled")
+
+    def _win(self, winner, attempts):
+        now = time.perf_counter()
+        self.router.stats[winner.provider].record_first_token(now - winner.started)
+        metrics.LLM_ATTEMPTS.inc(winner.provider, winner.reason, "won")
+        self.info.update(provider=winner.provider,
+                         model=winner.model or get_provider(winner.provider).default_model)
+        for attempt in attempts:
+            if attempt is not winner and not attempt.finished:
+                attempt.cancelled.set()
+                attempt.finished = True
+                # Its first token would have come later still; counting the wait so far keeps slow
+                # providers from looking faster than they are.
+                self.router.stats[attempt.provider].record_first_token(now - attempt.started)
+                metrics.LLM_ATTEMPTS.inc(attempt.provider, attempt.reason, "lost")
+
+
+class LLMRouter:
+    """Routes LLM calls to a requested provider, hedging slow calls and falling back on failures."""
+
+    def __init__(self, fallback_order=LLM_FALLBACK_ORDER, enabled=ENABLED_PROVIDERS,
+                 hedging: bool = LLM_HEDGING_ENABLED):
+        self.fallback_order = [name for name in fallback_order if name in PROVIDERS]
+        self.enabled = list(enabled)
+        self.hedging = hedging
+        self.stats = {name: ProviderStats() for name in PROVIDERS}
+
+    def _unhealthy(self, provider: str):
+        error_rate = self.stats[provider].error_rate()
+        return error_rate is not None and error_rate >= LLM_UNHEALTHY_ERROR_RATE
+
+    def backups(self, provider: str):
+        """Providers to try after `provider`, healthy ones first."""
+        names = [name for name in self.fallback_order if name != provider and name in self.enabled]
+        return sorted(names, key=self._unhealthy)
+
+    def hedge_delay(self, provider: str):
+        """Seconds to wait for `provider`'s first token before starting a backup."""
+        if self._unhealthy(provider):
+            return 0.0
+        percentile = self.stats[provider].percentile(LLM_HEDGE_PERCENTILE)
+        delay = LLM_HEDGE_DELAY_MS / 1000 if percentile is None else percentile
+        return max(delay, LLM_HEDGE_MIN_DELAY_MS / 1000)
+
+    def stream(self, prompt: str, provider: str, model: str = None, hedge: bool = True) -> RoutedStream:
+        """Tokens answering `prompt`, from `provider` (its `model`) or a backup."""
+        return RoutedStream(self, prompt, provider, model, hedge=hedge and self.hedging)
+
+    def generate(self, prompt: str, provider: str, model: str = None, hedge: bool = True):
+        """(full answer to `prompt`, the RoutedStream's `info`); raises ProviderError when every provider failed."""
+        routed = self.stream(prompt, provider, model, hedge=hedge)
+        return "".join(routed), routed.info
+
+    def provider_stats(self):
+        """Rolling stats and current hedge delay of every enabled provider."""
+        return {name: {**self.stats[name].snapshot(), "hedge_delay_ms": round(self.hedge_delay(name) * 1000, 1),
+                       "healthy": not self._unhealthy(name)}
+                for name in self.enabled if name in self.stats}
+
+
+llm_router = LLMRouter()
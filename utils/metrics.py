@@ -0,0 +1,210 @@
+"""
+In-process metrics of the hot path, served in the Prometheus text format on `/metrics`.
+
+Every stage of the RAG endpoints (routing, query embedding, answer-cache lookup, retrieval,
+prompt building, the LLM call) and of indexing (reading, embedding, writing) is timed with
+`span(stage)` or `record(stage, seconds)` into the `imdb_stage_seconds` histogram. Counters
+and histograms of answers by source, retrieval candidates and prompt/response tokens are
+updated by the endpoints, and cache hit/miss counters are read from the caches themselves at
+scrape time, so they cost nothing per request.
+
+Recording is a perf_counter() pair, a bisect and an increment under a per-metric lock, and
+only the timer itself with METRICS_ENABLED=false. When a request asks for its breakdown (see
+`start_trace`), its spans are also summed per stage for that request only. Metrics are per
+process: under gunicorn each worker serves its own.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from utils.constants import METRICS_ENABLED
+
+# Seconds; from a cache lookup (~0.1 ms) to a slow LLM answer.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+_trace = contextvars.ContextVar("stage_trace", default=None)
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per combination of label values."""
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {_format_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Observations counted into fixed cumulative buckets, with their sum and count, per combination of label values."""
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((label_values, (list(counts), total, count))
+                            for label_values, (counts, total, count) in self._series.items())
+        for label_values, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_number(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("imdb_stage_seconds", "Time spent in each stage of the chat and indexing pipelines.",
+                          labels=("stage",))
+REQUEST_SECONDS = Histogram("imdb_request_seconds", "Time to produce the response (streams: until the first byte).",
+                            labels=("endpoint", "status"))
+STAGES_SKIPPED = Counter("imdb_stage_skipped_total", "Retrieval stages left out: over the latency budget or "
+                                                     "not needed.", labels=("stage",))
+ANSWERS = Counter("imdb_answers_total", "Answers served, by provider and source "
+                                        "(answer_cache, structured, rag, no_results).", labels=("provider", "source"))
+CANDIDATES = Histogram("imdb_retrieval_candidates", "Movies retrieved as context for one question.",
+                       labels=("provider",), buckets=COUNT_BUCKETS)
+PROMPT_TOKENS = Histogram("imdb_prompt_tokens", "Approximate tokens of the prompt sent to the LLM.",
+                          labels=("provider",), buckets=TOKEN_BUCKETS)
+RESPONSE_TOKENS = Histogram("imdb_response_tokens", "Approximate tokens of the LLM's answer.",
+                            labels=("provider",), buckets=TOKEN_BUCKETS)
+INDEXED_ROWS = Counter("imdb_indexed_rows_total", "Catalog rows seen by indexing, by outcome (added, updated, "
+                                                  "skipped).", labels=("outcome",))
+LLM_ATTEMPTS = Counter("imdb_llm_attempts_total", "LLM provider calls by why they were made (primary, hedge, "
+                                                "fallback) and outcome (won, lost, failed, cancelled).",
+                       labels=("provider", "reason", "outcome"))
+
+_metrics = [STAGE_SECONDS, REQUEST_SECONDS, STAGES_SKIPPED, ANSWERS, CANDIDATES, PROMPT_TOKENS, RESPONSE_TOKENS,
+            INDEXED_ROWS, LLM_ATTEMPTS]
+_collectors = []
+
+
+def record(stage: str, seconds: float):
+    """Records `seconds` spent in `stage`, measured by the caller."""
+    STAGE_SECONDS.observe(seconds, stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace[stage] = trace.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str):
+    """Times the block as `stage`; an exception still records the time spent."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+def record_retrieval_timings(timings: dict):
+    """
+    Records the per-stage milliseconds of a `hybrid_search` timings dict (`vector_ms`, `rerank_ms`, ...)
+    as "retrieval_<stage>" spans, and its skipped stages (per-shard ones without the collection name).
+    """
+    for key, value in timings.items():
+        if key.endswith("_ms") and key != "total_ms":
+            record(f"retrieval_{key[:-3]}", value / 1000)
+    for stage in timings.get("skipped", ()):
+        STAGES_SKIPPED.inc(stage if stage == "rerank:confident" else stage.split(":")[0])
+
+
+def register_collector(collect):
+    """
+    Adds metrics computed at scrape time: `collect()` returns (name, documentation, label names,
+    [(label values, value), ...]) tuples, rendered as counters.
+    """
+    _collectors.append(collect)
+
+
+def render():
+    """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        try:
+            collected = collect()
+        except Exception as e:
+            print(f"Metrics collector {collect.__name__} failed: {e}")
+            continue
+        for name, documentation, labels, samples in collected:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} counter")
+            for label_values, value in samples:
+                lines.append(f"{name}{_format_labels(labels, label_values)} {_format_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def start_trace(traced: bool):
+    """
+    Called at the start of every request: from now on, this request's spans are summed per stage
+    if `traced`. Resetting it each time keeps a thread from carrying a trace into its next request.
+    """
+    _trace.set({} if traced else None)
+
+
+def current_trace():
+    """Seconds per stage recorded so far by this request, or None when it is not traced."""
+    return _trace.get()
+
+
+def server_timing(trace: dict):
+    """The `Server-Timing` header value of a trace, in milliseconds and in the order the stages ran."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in trace.items())
@@ -0,0 +1,145 @@
+"""
+In-process micro-batching for the query-time models.
+
+Concurrent requests each encode one question and rerank a dozen pairs. On CPU a
+single forward pass over many inputs is far cheaper than many passes over one,
+so callers hand their inputs to a `MicroBatcher`, whose worker thread collects
+everything that arrives within `max_wait_ms` (up to `max_batch_size` inputs),
+runs the model once and gives every caller back its own slice.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from utils.constants import EMBED_BATCH_MAX_SIZE, EMBED_BATCH_MAX_WAIT_MS, RERANK_BATCH_MAX_SIZE, \
+    RERANK_BATCH_MAX_WAIT_MS
+
+
+class MicroBatcher:
+    def __init__(self, process_batch, max_batch_size: int, max_wait_ms: float, name: str = "micro-batcher"):
+        """
+        Args:
+            process_batch: Callable mapping a list of inputs to a same-length sequence of outputs.
+            max_batch_size (int): Maximum number of inputs per forward pass.
+            max_wait_ms (float): How long the first queued request waits for company.
+            name (str): Name of the worker thread.
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._thread_lock = threading.Lock()
+
+    def submit(self, items):
+        """Runs `items` as part of the next batch and returns their outputs, in order."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((list(items), future))
+        return future.result()
+
+    def _ensure_worker(self):
+        # Started on first use. A forked child (e.g. a gunicorn worker after the master warmed up)
+        # inherits neither the thread nor a usable queue: the queue's condition still lists the
+        # parent's blocked worker as a waiter, so a put() would wake that dead thread and never
+        # the new one. The child gets a fresh queue and thread, as search_executor gets a fresh pool.
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            with self._thread_lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                    self._thread = None
+                    self._pid = os.getpid()
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, args=(self._queue,), name=self.name,
+                                                    daemon=True)
+                    self._thread.start()
+
+    def _run(self, requests_queue):
+        while True:
+            requests = [requests_queue.get()]
+            size = len(requests[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = requests_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                requests.append(request)
+                size += len(request[0])
+            self._process(requests)
+
+    def _process(self, requests):
+        items = [item for request_items, _ in requests for item in request_items]
+        try:
+            outputs = self.process_batch(items)
+        except Exception as e:
+            for _, future in requests:
+                future.set_exception(e)
+            return
+
+        offset = 0
+        for request_items, future in requests:
+            future.set_result(outputs[offset:offset + len(request_items)])
+            offset += len(request_items)
+
+
+class BatchedEmbeddingModel:
+    """
+    SentenceTransformer wrapper whose small, default-option `encode` calls are
+    micro-batched. Large inputs (e.g. indexing chunks) go straight to the model.
+    """
+
+    def __init__(self, model, max_batch_size: int = EMBED_BATCH_MAX_SIZE, max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS):
+        self.model = model
+        self.batcher = MicroBatcher(self._encode_batch, max_batch_size, max_wait_ms, name="embedding-batcher")
+
+    def _encode_batch(self, texts):
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+
+    def encode(self, sentences, normalize_embeddings: bool = False, convert_to_numpy: bool = True,
+               batch_size: int = 32, show_progress_bar: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        if (normalize_embeddings or not convert_to_numpy or kwargs or not texts
+                or len(texts) >= self.batcher.max_batch_size):
+            return self.model.encode(sentences, batch_size=batch_size, normalize_embeddings=normalize_embeddings,
+                                     convert_to_numpy=convert_to_numpy, show_progress_bar=show_progress_bar, **kwargs)
+
+        embeddings = np.asarray(self.batcher.submit(texts))
+        return embeddings[0] if single else embeddings
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+class BatchedCrossEncoder:
+    """CrossEncoder wrapper whose `predict` calls from concurrent requests share forward passes."""
+
+    def __init__(self, re_ranker, max_batch_size: int = RERANK_BATCH_MAX_SIZE,
+                 max_wait_ms: float = RERANK_BATCH_MAX_WAIT_MS):
+        self.re_ranker = re_ranker
+        self.batcher = MicroBatcher(self._predict_batch, max_batch_size, max_wait_ms, name="rerank-batcher")
+
+    def _predict_batch(self, pairs):
+        return self.re_ranker.predict(pairs, batch_size=len(pairs), show_progress_bar=False)
+
+    def predict(self, sentences, **kwargs):
+        pairs = list(sentences)
+        if not pairs:
+            return np.array([], dtype=np.float32)
+        if kwargs or len(pairs) >= self.batcher.max_batch_size:
+            return self.re_ranker.predict(pairs, **kwargs)
+        return np.asarray(self.batcher.submit(pairs))
+
+    def __getattr__(self, name):
+        return getattr(self.re_ranker, name)
@@ -0,0 +1,173 @@
+"""
+In-memory columnar table of a movie collection.
+
+Every movie's numeric fields are held in NumPy arrays and its genres in a boolean
+genre matrix, with name -> row indexes for directors and stars, so filter / sort /
+aggregate questions are answered with vectorized masks over the whole catalog
+instead of nearest-neighbour search. The table is built from the metadata stored in
+Chroma, i.e. the same CSV columns the collection was indexed from.
+"""
+import re
+
+import numpy as np
+
+NUMERIC_COLUMNS = ("year", "rating", "meta_score", "votes", "gross_usd", "runtime_min")
+NUMERIC_DTYPES = {
+    "year": np.int32,
+    "rating": np.float64,
+    "meta_score": np.int32,
+    "votes": np.int64,
+    "gross_usd": np.int64,
+    "runtime_min": np.int32,
+}
+# Where a numeric column comes from in collections indexed before metadata was typed.
+DISPLAY_COLUMNS = {"gross_usd": "gross", "runtime_min": "runtime"}
+
+_OPERATORS = {
+    "eq": np.equal,
+    "gt": np.greater,
+    "gte": np.greater_equal,
+    "lt": np.less,
+    "lte": np.less_equal,
+}
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def to_number(value):
+    """Parses a stored value (number, "1994", "142 min", "28,341,469") into a float; 0 when it has none."""
+    if isinstance(value, (int, float)):
+        return value
+    match = _NUMBER.search(str(value).replace(",", ""))
+    return float(match.group()) if match else 0
+
+
+def split_names(value):
+    return [name.strip() for name in str(value).split(",") if name.strip()]
+
+
+class MovieTable:
+    def __init__(self, ids, metadatas):
+        """
+        Args:
+            ids (list): Document ids, one per movie.
+            metadatas (list): Chroma metadata dict of each movie, in the same order.
+        """
+        self.ids = np.array(ids, dtype=object)
+        # Collections indexed before metadata was typed store numbers as strings, which Chroma cannot range-filter.
+        self.typed_metadata = all(isinstance(meta.get("year"), (int, float)) for meta in metadatas[:100])
+        self.titles = np.array([meta.get("title", "") for meta in metadatas], dtype=object)
+        self.directors = np.array([meta.get("director", "") for meta in metadatas], dtype=object)
+        self.genre_labels = np.array([meta.get("genre", "") for meta in metadatas], dtype=object)
+        self.columns = {}
+        for column in NUMERIC_COLUMNS:
+            source = DISPLAY_COLUMNS.get(column)
+            self.columns[column] = np.array(
+                [to_number(meta[column] if column in meta else meta.get(source, 0)) for meta in metadatas],
+                dtype=NUMERIC_DTYPES[column],
+            )
+
+        genre_lists = [[genre.lower() for genre in split_names(label)] for label in self.genre_labels]
+        self.genres = sorted({genre for genres in genre_lists for genre in genres})
+        genre_position = {genre: i for i, genre in enumerate(self.genres)}
+        self.genre_matrix = np.zeros((len(metadatas), len(self.genres)), dtype=bool)
+        for row, genres in enumerate(genre_lists):
+            self.genre_matrix[row, [genre_position[genre] for genre in genres]] = True
+        self._genre_position = genre_position
+
+        # Lower-cased name -> name as stored, for filters that must match the stored string exactly.
+        self.display_names = {}
+        self.director_rows = self._name_index(split_names(director) for director in self.directors)
+        self.star_rows = self._name_index(split_names(meta.get("stars", "")) for meta in metadatas)
+
+    def _name_index(self, names_per_row):
+        rows_by_name = {}
+        for row, names in enumerate(names_per_row):
+            for name in names:
+                rows_by_name.setdefault(name.lower(), []).append(row)
+                self.display_names.setdefault(name.lower(), name)
+        return {name: np.array(rows, dtype=np.int64) for name, rows in rows_by_name.items()}
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = 5000):
+        """Builds the table from every document's metadata in a Chroma collection."""
+        return cls.from_collections([collection], page_size)
+
+    @classmethod
+    def from_collections(cls, collections, page_size: int = 5000):
+        """Builds one table over several collections; a document id stored in more than one is kept once."""
+        ids, metadatas = [], []
+        seen = set()
+        for collection in collections:
+            offset = 0
+            while True:
+                page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+                if not page["ids"]:
+                    break
+                for doc_id, meta in zip(page["ids"], page["metadatas"]):
+                    if doc_id not in seen:
+                        seen.add(doc_id)
+                        ids.append(doc_id)
+                        metadatas.append(meta)
+                offset += len(page["ids"])
+        return cls(ids, metadatas)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def mask(self, filters):
+        """
+        Boolean mask of the movies matching every filter. A filter is a (field, op, value) tuple:
+        a numeric column with "eq", "gt", "gte", "lt" or "lte", ("genre", "has", name),
+        ("director", "eq", name) or ("star", "eq", name).
+        """
+        selected = np.ones(len(self), dtype=bool)
+        for field, op, value in filters:
+            if field in self.columns:
+                selected &= _OPERATORS[op](self.columns[field], value)
+            elif field == "genre":
+                position = self._genre_position.get(value.lower())
+                selected &= self.genre_matrix[:, position] if position is not None else False
+            elif field in ("director", "star"):
+                rows = (self.director_rows if field == "director" else self.star_rows).get(value.lower())
+                in_rows = np.zeros(len(self), dtype=bool)
+                if rows is not None:
+                    in_rows[rows] = True
+                selected &= in_rows
+            else:
+                raise ValueError(f"Unknown filter field '{field}'")
+        return selected
+
+    def select(self, filters, sort_by: str = "rating", descending: bool = True, limit: int = 10):
+        """Returns the top `limit` matching movies by `sort_by`, as dicts."""
+        rows = np.flatnonzero(self.mask(filters))
+        if sort_by:
+            values = self.columns[sort_by][rows]
+            # Ties are broken by vote count so well-known movies come first.
+            order = np.lexsort((-self.columns["votes"][rows], -values if descending else values))
+            rows = rows[order]
+        return [self.row(row) for row in rows[:limit]]
+
+    def aggregate(self, op: str, column: str, filters):
+        """Returns ("count" | "mean" | "sum" | "max" | "min" of `column` over the matches, number of matches)."""
+        selected = self.mask(filters)
+        count = int(selected.sum())
+        if op == "count":
+            return count, count
+        values = self.columns[column][selected]
+        if column in ("meta_score", "gross_usd"):
+            # 0 means "not reported" for these columns.
+            values = values[values > 0]
+        if not len(values):
+            return None, count
+        return float(getattr(np, op)(values)), count
+
+    def row(self, row: int):
+        movie = {
+            "id": self.ids[row],
+            "title": self.titles[row],
+            "director": self.directors[row],
+            "genre": self.genre_labels[row],
+        }
+        for column, values in self.columns.items():
+            movie[column] = values[row].item()
+        return movie
@@ -0,0 +1,15 @@
+from utils.llm_providers import get_provider
+
+
+class OllamaLLMHandler:
+    def __init__(self, model="llama3.2"):
+        self.model = model
+        self.provider = get_provider("ollama")
+
+    def ollama_api_call(self, input_query):
+        """Returns the raw Ollama /api/generate response for `input_query`."""
+        return self.provider.post(input_query, model=self.model)
+
+    def ollama_api_stream(self, input_query):
+        """Yields response tokens as Ollama produces them (its NDJSON stream, one object per line)."""
+        return self.provider.stream(input_query, model=self.model)
@@ -1,7 +1,54 @@
+import os
+import string
+import threading
+
 import yaml
 
+_lock = threading.Lock()
+# yaml_file -> (mtime_ns, prompts dict, compiled templates by name)
+_cache = {}
+
+
+class PromptTemplate:
+    """A prompt with its `{placeholders}` parsed once, rendered by joining literal text and values."""
+
+    def __init__(self, template: str):
+        self.template = template
+        self._parts = list(string.Formatter().parse(template))
+        self.fields = [field for _, field, _, _ in self._parts if field]
+
+    def format(self, **values):
+        pieces = []
+        for literal, field, format_spec, conversion in self._parts:
+            pieces.append(literal)
+            if field is not None:
+                value = values[field]
+                if conversion:
+                    value = {"r": repr, "s": str, "a": ascii}[conversion](value)
+                pieces.append(format(value, format_spec) if format_spec else str(value))
+        return "".join(pieces)
+
+
+def _load(yaml_file):
+    """Returns the cache entry of `yaml_file`, re-reading it only when its modification time changed."""
+    mtime = os.stat(yaml_file).st_mtime_ns
+    cached = _cache.get(yaml_file)
+    if cached is not None and cached[0] == mtime:
+        return cached
+    with _lock:
+        cached = _cache.get(yaml_file)
+        if cached is None or cached[0] != mtime:
+            with open(yaml_file, "r", encoding="utf-8") as file:
+                prompts = yaml.safe_load(file)
+            cached = (mtime, prompts, {name: PromptTemplate(text) for name, text in prompts.items()})
+            _cache[yaml_file] = cached
+    return cached
+
+
 def load_prompts(yaml_file="prompts/prompt.yaml"):
-    with open(yaml_file, "r", encoding="utf-8") as file:
-        return yaml.safe_load(file)
+    return _load(yaml_file)[1]
 
 
+def get_prompt_template(name: str, yaml_file="prompts/prompt.yaml"):
+    """Returns the compiled template `name`; edits to the YAML file are picked up on the next call."""
+    return _load(yaml_file)[2][name]
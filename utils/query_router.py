@@ -0,0 +1,433 @@
+"""
+Rule-based router for questions about movie metadata.
+
+`QueryRouter.route` recognises filters (year, decade, genre, director, star and
+numeric comparisons on rating, meta score, votes, gross and runtime), a sort order,
+a result count and count/average/total aggregates in a question, and classifies it:
+
+  * "table"    - the question is fully described by those filters/sorts/aggregates
+                 ("top 5 Christopher Nolan films by rating", "highest grossing movie of 1994"),
+                 so `answer` computes the result from the MovieTable without retrieval or an LLM;
+  * "filtered" - the question also has free-text content ("space movies after 2010"), so it
+                 goes through retrieval with the filters pushed down as a Chroma `where`;
+  * None       - no structured intent; the question goes through the normal RAG path.
+"""
+import re
+
+from utils.bm25_index import STOPWORDS
+from utils.movie_table import MovieTable, to_number, split_names
+
+YEAR = r"((?:18|19|20)\d{2})"
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+    "ten": 10, "fifteen": 15, "twenty": 20, "fifty": 50, "hundred": 100,
+}
+COUNT = r"(\d+|" + "|".join(NUMBER_WORDS) + r")"
+
+FIELD_NAMES = {
+    "imdb rating": "rating", "rating": "rating", "rated": "rating",
+    "meta score": "meta_score", "metascore": "meta_score", "meta_score": "meta_score",
+    "votes": "votes", "vote count": "votes",
+    "gross": "gross_usd", "grossing": "gross_usd", "box office": "gross_usd", "revenue": "gross_usd",
+    "runtime": "runtime_min", "running time": "runtime_min", "minutes": "runtime_min", "mins": "runtime_min",
+}
+FIELD = r"(imdb rating|rating|rated|meta ?score|metascore|meta_score|votes|vote count|gross(?:ing)?|box office|" \
+        r"revenue|runtime|running time|minutes|mins)"
+OPS = {
+    ">=": "gte", "=>": "gte", "at least": "gte", "no less than": "gte",
+    "<=": "lte", "=<": "lte", "at most": "lte", "no more than": "lte",
+    ">": "gt", "above": "gt", "over": "gt", "more than": "gt", "greater than": "gt", "higher than": "gt",
+    "better than": "gt", "longer than": "gt",
+    "<": "lt", "below": "lt", "under": "lt", "less than": "lt", "lower than": "lt", "fewer than": "lt",
+    "shorter than": "lt",
+    "=": "eq", "exactly": "eq",
+}
+OP = "(" + "|".join(re.escape(op) for op in sorted(OPS, key=len, reverse=True)) + ")"
+UNIT = r"(k|thousand|m|million|mn|b|billion|bn|minutes|mins|min|hours|hrs|h)?"
+UNIT_FACTORS = {
+    "k": 1e3, "thousand": 1e3, "m": 1e6, "million": 1e6, "mn": 1e6, "b": 1e9, "billion": 1e9, "bn": 1e9,
+    "hours": 60, "hrs": 60, "h": 60,
+}
+
+# First match wins, so the specific phrasings come before the generic "best"/"top".
+SORT_PATTERNS = [
+    (r"\b(?:highest|top|most|biggest|best)[ -]grossing\b|\bby (?:gross|box office|revenue)\b|"
+     r"\b(?:highest|biggest) (?:gross|box office)\b|\bmade the most money\b", "gross_usd", True),
+    (r"\b(?:lowest|least)[ -]grossing\b", "gross_usd", False),
+    (r"\bmost (?:voted|votes|popular)\b|\bby votes\b", "votes", True),
+    (r"\b(?:highest|best|top) meta ?score\b|\bby meta ?score\b", "meta_score", True),
+    (r"\b(?:lowest|worst)[ -]rated\b|\blowest (?:imdb )?rating\b|\bworst\b", "rating", False),
+    (r"\blongest\b", "runtime_min", True),
+    (r"\bshortest\b", "runtime_min", False),
+    (r"\b(?:oldest|earliest)\b", "year", False),
+    (r"\b(?:newest|latest|most recent)\b", "year", True),
+    (r"\b(?:highest|best|top)[ -]rated\b|\bhighest (?:imdb )?rating\b|\bby (?:imdb )?rating\b|"
+     r"\b(?:best|greatest|top)\b", "rating", True),
+]
+AGGREGATE_PATTERNS = [
+    (r"\bhow many\b|\bnumber of (?:movies|films)\b|\bcount\b", "count"),
+    (r"\b(?:average|mean)\b", "mean"),
+    (r"\b(?:total|combined)\b", "sum"),
+]
+GENRE_SYNONYMS = {"romantic": "romance", "animated": "animation", "science fiction": "sci-fi", "scifi": "sci-fi"}
+# Genre names are common words ("war", "family", "history"); alone they only count as a filter in a plural that
+# is unambiguous ("dramas", "comedies") or for the names below, otherwise only before "movies"/"films".
+PLURAL_GENRES = {"drama", "comedy", "thriller", "western", "musical", "mystery", "documentary", "biography"}
+STANDALONE_GENRES = {"sci-fi", "film-noir"}
+MOVIE_NOUN = r"(?:\s+(?:movies?|films?|pictures?))"
+PLURAL_NOUNS = re.compile(r"\b(?:movies|films|pictures|titles|ones)\b")
+STAR_CUES = re.compile(r"\b(?:starring|with|featuring|actor|actress|stars?)\s*$")
+
+FILLER = STOPWORDS | {
+    "list", "show", "give", "tell", "find", "name", "all", "any", "some", "top", "best", "highest", "lowest",
+    "most", "least", "greatest", "worst", "rated", "rating", "ratings", "imdb", "score", "meta", "gross", "grossing",
+    "votes", "voted", "popular", "released", "release", "year", "years", "made", "directed", "director",
+    "starring", "featuring", "actor", "actress", "star", "stars", "than", "more", "less", "over", "under", "above",
+    "below", "after", "before", "since", "between", "during", "ever", "time", "catalog", "ones", "many", "much",
+    "number", "count", "average", "mean", "total", "combined", "there", "please", "can", "could", "would",
+    "sorted", "ordered", "order", "sort", "rank", "ranked", "pictures", "picture", "title", "titles", "genre",
+    "longest", "shortest", "oldest", "newest", "latest", "recent", "runtime", "minutes", "box", "office",
+    "revenue", "money", "film", "movie", "films", "movies", "one", "s", "also", "only", "should", "watch",
+    "recommend", "greater", "higher", "lower", "least", "at", "i", "want", "see", "good", "great", "biggest",
+    "exactly", "long", "decade",
+} | set(NUMBER_WORDS)
+
+LABELS = {
+    "rating": "IMDB rating", "meta_score": "meta score", "votes": "votes", "gross_usd": "gross",
+    "runtime_min": "runtime", "year": "year",
+}
+OP_WORDS = {"eq": "of", "gt": "above", "gte": "of at least", "lt": "below", "lte": "of at most"}
+ORDER_WORDS = {"runtime_min": ("longest", "shortest"), "year": ("newest", "oldest")}
+
+
+def _count(text):
+    return NUMBER_WORDS.get(text) or int(text)
+
+
+def _format_value(column, value):
+    if value is None:
+        return "n/a"
+    if column == "rating":
+        return f"{value:.1f}"
+    if column == "gross_usd":
+        return f"${value:,.0f}"
+    if column == "votes":
+        return f"{value:,.0f}"
+    if column == "runtime_min":
+        return f"{value:.0f} min"
+    return f"{value:.0f}" if float(value).is_integer() else f"{value:.1f}"
+
+
+class QueryPlan:
+    def __init__(self, kind, filters, sort_by=None, descending=True, limit=10, aggregate=None, typed_metadata=True):
+        self.kind = kind
+        self.filters = filters
+        self.sort_by = sort_by
+        self.descending = descending
+        self.limit = limit
+        self.aggregate = aggregate
+        self.typed_metadata = typed_metadata
+
+    def chroma_where(self):
+        """
+        The filters Chroma can evaluate (numeric comparisons and the exact director) as a `where`
+        clause, or None. Genre and star filters match inside comma-separated strings, which
+        `where` cannot express; apply `matches` to the results for those.
+        """
+        if not self.typed_metadata:
+            return None
+        clauses = []
+        for field, op, value in self.filters:
+            if field == "director":
+                clauses.append({"director": {"$eq": value}})
+            elif field not in ("genre", "star"):
+                clauses.append({field: {f"${op}": value}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def matches(self, meta: dict):
+        """Whether a document's metadata satisfies every filter."""
+        for field, op, value in self.filters:
+            if field == "genre":
+                if value.lower() not in [genre.lower() for genre in split_names(meta.get("genre", ""))]:
+                    return False
+            elif field == "director":
+                if value.lower() not in [name.lower() for name in split_names(meta.get("director", ""))]:
+                    return False
+            elif field == "star":
+                if value.lower() not in [name.lower() for name in split_names(meta.get("stars", ""))]:
+                    return False
+            else:
+                stored = meta[field] if field in meta else meta.get({"gross_usd": "gross",
+                                                                     "runtime_min": "runtime"}.get(field), 0)
+                actual = to_number(stored)
+                if not {"eq": actual == value, "gt": actual > value, "gte": actual >= value,
+                        "lt": actual < value, "lte": actual <= value}[op]:
+                    return False
+        return True
+
+    def summary(self):
+        """The filters in words, e.g. 'Drama movies directed by Christopher Nolan released after 2010'."""
+        genres = [value.title() for field, _, value in self.filters if field == "genre"]
+        parts = [" ".join(genres + ["movies"])]
+        years = {op: value for field, op, value in self.filters if field == "year"}
+        if "gte" in years and "lte" in years:
+            parts.append(f"released between {years['gte']:.0f} and {years['lte']:.0f}")
+        for field, op, value in self.filters:
+            if field == "year" and "gte" in years and "lte" in years and op in ("gte", "lte"):
+                continue
+            if field == "director":
+                parts.append(f"directed by {value}")
+            elif field == "star":
+                parts.append(f"starring {value}")
+            elif field == "year":
+                word = {"eq": "in", "gt": "after", "gte": "in or after", "lt": "before", "lte": "in or before"}[op]
+                parts.append(f"released {word} {value:.0f}")
+            elif field != "genre":
+                parts.append(f"with {LABELS[field]} {OP_WORDS[op]} {_format_value(field, value)}")
+        return " ".join(parts)
+
+    def describe(self):
+        return {
+            "kind": self.kind,
+            "filters": [list(condition) for condition in self.filters],
+            "sort_by": self.sort_by,
+            "descending": self.descending,
+            "limit": self.limit,
+            "aggregate": list(self.aggregate) if self.aggregate else None,
+        }
+
+
+class QueryRouter:
+    def __init__(self, table: MovieTable):
+        """
+        Args:
+            table (MovieTable): Columnar table of the collection's movies. Collections whose numeric metadata
+                is not typed get no Chroma `where` pushdown; their results are filtered with `QueryPlan.matches`.
+        """
+        self.table = table
+        self.typed_metadata = table.typed_metadata
+        # "christopher nolan" -> "Christopher Nolan", "j j abrams" -> "J.J. Abrams"
+        self.directors = {self._words(name): table.display_names[name] for name in table.director_rows}
+        self.stars = {self._words(name): table.display_names[name] for name in table.star_rows}
+        # Titles that contain a year ("2001: A Space Odyssey", "Blade Runner 2049") must not become year filters.
+        self.year_titles = sorted({title.lower() for title in table.titles if re.search(YEAR, title)}, key=len,
+                                  reverse=True)
+        self.max_name_words = max([len(name.split()) for name in list(self.directors) + list(self.stars)] + [1])
+        self.genre_patterns = []
+        for genre in table.genres:
+            name = re.escape(genre)
+            forms = [name + MOVIE_NOUN]
+            if genre in PLURAL_GENRES:
+                forms.append((re.escape(genre[:-1]) + "ies") if genre.endswith("y") else name + "s")
+            if genre in STANDALONE_GENRES:
+                forms.append(name)
+            self.genre_patterns.append((re.compile(r"\b(?:" + "|".join(forms) + r")\b"), genre))
+        for synonym, genre in GENRE_SYNONYMS.items():
+            if genre in table.genres:
+                self.genre_patterns.append((re.compile(r"\b" + re.escape(synonym) + MOVIE_NOUN + "?" + r"\b"), genre))
+
+    @staticmethod
+    def _words(text):
+        return " ".join(re.findall(r"\w+", text.lower()))
+
+    def route(self, question: str):
+        """Returns the QueryPlan for `question`, or None when it has no structured intent."""
+        if not len(self.table):
+            return None
+        text = question.lower()
+        consumed = []
+        protected = [match.span() for title in self.year_titles if title in text
+                     for match in [re.search(re.escape(title), text)]]
+
+        def take(match):
+            consumed.append(match.span())
+
+        def free(match):
+            return not any(start < match.end() and match.start() < end for start, end in consumed + protected)
+
+        filters = self._year_filters(text, take, free)
+        filters += self._numeric_filters(text, take, free)
+        filters += self._name_filters(text, take)
+        filters += self._genre_filters(text, take, free)
+
+        aggregate = None
+        for pattern, op in AGGREGATE_PATTERNS:
+            match = re.search(pattern, text)
+            if match:
+                take(match)
+                column = "rating"
+                field_match = re.search(FIELD, text[match.end():])
+                if field_match:
+                    column = self._field(field_match.group(1))
+                aggregate = (op, column)
+                break
+
+        sort_by, descending = None, True
+        if aggregate is None:
+            for pattern, column, sort_descending in SORT_PATTERNS:
+                match = re.search(pattern, text)
+                if match and free(match):
+                    take(match)
+                    sort_by, descending = column, sort_descending
+                    break
+
+        limit = None
+        for pattern in (r"\btop\s+" + COUNT + r"\b", r"\b" + COUNT + r"\s+(?:best|highest|top|most|lowest|worst|"
+                        r"longest|shortest|oldest|newest|latest|greatest)\b",
+                        r"\b(?:list|show|give me|name)\s+" + COUNT + r"\b", r"\b" + COUNT + r"\s+(?:movies|films)\b"):
+            match = re.search(pattern, text)
+            if match:
+                take(match)
+                limit = min(_count(match.group(1)), 100)
+                break
+
+        if not filters and sort_by is None and aggregate is None:
+            return None
+
+        if limit is None:
+            plural = PLURAL_NOUNS.search(text) or any(
+                field == "genre" and re.search(r"\b\w+(?:s|ies)\b", text) for field, _, _ in filters)
+            limit = 10 if plural or sort_by is None else 1
+
+        if self._leftover(text, consumed):
+            if not filters:
+                return None
+            kind = "filtered"
+        else:
+            kind = "table"
+        return QueryPlan(kind, filters, sort_by=sort_by or "rating", descending=descending if sort_by else True,
+                         limit=limit, aggregate=aggregate, typed_metadata=self.typed_metadata)
+
+    @staticmethod
+    def _field(name):
+        return FIELD_NAMES[re.sub(r"\s+", " ", name.replace("metascore", "meta score"))]
+
+    def _year_filters(self, text, take, free):
+        filters = []
+        for match in re.finditer(r"\bbetween\s+" + YEAR + r"\s+and\s+" + YEAR + r"\b", text):
+            take(match)
+            filters += [("year", "gte", int(match.group(1))), ("year", "lte", int(match.group(2)))]
+        patterns = [
+            (r"\b(?:after|post)\s+" + YEAR + r"\b", "gt"),
+            (r"\b(?:since|from)\s+" + YEAR + r"\s+(?:on(?:wards?)?|and later)\b", "gte"),
+            (r"\bsince\s+" + YEAR + r"\b", "gte"),
+            (r"\b(?:before|pre)\s+" + YEAR + r"\b", "lt"),
+            (r"\b(?:until|up to)\s+" + YEAR + r"\b", "lte"),
+        ]
+        for pattern, op in patterns:
+            for match in re.finditer(pattern, text):
+                if free(match):
+                    take(match)
+                    filters.append(("year", op, int(match.group(1))))
+        for match in re.finditer(r"\b(?:the\s+)?((?:18|19|20)\d0)'?s\b", text):
+            if free(match):
+                take(match)
+                filters += [("year", "gte", int(match.group(1))), ("year", "lte", int(match.group(1)) + 9)]
+        for match in re.finditer(r"\b(?:the\s+)?'?([1-9]0)'?s\b", text):
+            if free(match):
+                take(match)
+                decade = int(match.group(1))
+                decade += 1900 if decade >= 30 else 2000
+                filters += [("year", "gte", decade), ("year", "lte", decade + 9)]
+        if not any(field == "year" for field, _, _ in filters):
+            # A bare year may be part of a title ("2001: A Space Odyssey"), so it needs a preposition or a noun.
+            for pattern in (r"\b(?:released\s+)?(?:in|of|from|during)\s+" + YEAR + r"\b", r"\b" + YEAR + MOVIE_NOUN):
+                match = re.search(pattern, text)
+                if match and free(match):
+                    take(match)
+                    filters.append(("year", "eq", int(match.group(1))))
+                    break
+        return filters
+
+    def _numeric_filters(self, text, take, free):
+        filters = []
+        field_first = FIELD + r"\s*(?:is\s+|of\s+)?" + OP + r"\s*\$?(\d+(?:\.\d+)?)\s*" + UNIT + r"(?!\w)"
+        value_first = OP + r"\s*\$?(\d+(?:\.\d+)?)\s*" + UNIT + r"\s*" + FIELD + r"\b"
+        for pattern, order in ((field_first, "field_first"), (value_first, "value_first")):
+            for match in re.finditer(pattern, text):
+                if not free(match):
+                    continue
+                if order == "field_first":
+                    field, op, value, unit = match.groups()
+                else:
+                    op, value, unit, field = match.groups()
+                column = self._field(field)
+                number = float(value) * UNIT_FACTORS.get(unit or "", 1)
+                if column == "runtime_min" and unit in ("k", "thousand", "m", "million", "mn", "b", "billion", "bn"):
+                    continue
+                take(match)
+                filters.append((column, OPS[op], number))
+        return filters
+
+    def _name_filters(self, text, take):
+        filters = []
+        words = list(re.finditer(r"\w+", text))
+        position = 0
+        while position < len(words):
+            for size in range(min(self.max_name_words, len(words) - position), 1, -1):
+                gram = " ".join(match.group() for match in words[position:position + size])
+                director, star = self.directors.get(gram), self.stars.get(gram)
+                if director is None and star is None:
+                    continue
+                start = words[position].start()
+                take(re.compile(re.escape(text[start:words[position + size - 1].end()])).match(text, start))
+                if director is not None and (star is None or not STAR_CUES.search(text[:start])):
+                    filters.append(("director", "eq", director))
+                else:
+                    filters.append(("star", "eq", star))
+                position += size - 1
+                break
+            position += 1
+        return filters
+
+    def _genre_filters(self, text, take, free):
+        filters = []
+        for pattern, genre in self.genre_patterns:
+            match = pattern.search(text)
+            if match and free(match) and ("genre", "has", genre) not in filters:
+                take(match)
+                filters.append(("genre", "has", genre))
+        return filters
+
+    @staticmethod
+    def _leftover(text, consumed):
+        """Content words of the question that no filter, sort or count explained."""
+        chars = list(text)
+        for start, end in consumed:
+            chars[start:end] = " " * (end - start)
+        return [word for word in re.findall(r"[a-z]+", "".join(chars)) if word not in FILLER and len(word) > 1]
+
+    def answer(self, plan: QueryPlan):
+        """
+        Answers a "table" plan from the MovieTable.
+        Returns (answer text, result dict with the plan and the matching rows or aggregate).
+        """
+        summary = plan.summary()
+        if plan.aggregate:
+            op, column = plan.aggregate
+            value, count = self.table.aggregate(op, column, plan.filters)
+            if op == "count":
+                text = f"There are {count} {summary} in the catalog."
+            elif value is None:
+                text = f"No {summary} with a reported {LABELS[column]} are in the catalog."
+            else:
+                word = {"mean": "average", "sum": "total"}.get(op, op)
+                text = f"The {word} {LABELS[column]} of the {count} {summary} is {_format_value(column, value)}."
+            return text, {"plan": plan.describe(), "value": value, "count": count}
+
+        rows = self.table.select(plan.filters, sort_by=plan.sort_by, descending=plan.descending, limit=plan.limit)
+        if not rows:
+            return f"No {summary} are in the catalog.", {"plan": plan.describe(), "rows": []}
+
+        label = LABELS[plan.sort_by]
+        lines = []
+        for position, row in enumerate(rows, start=1):
+            details = [f"{label} {_format_value(plan.sort_by, row[plan.sort_by])}"]
+            if plan.sort_by != "rating":
+                details.append(f"IMDB rating {_format_value('rating', row['rating'])}")
+            lines.append(f"{position}. {row['title']} ({row['year']}) - {', '.join(details)}")
+        descending_word, ascending_word = ORDER_WORDS.get(plan.sort_by, ("highest " + label, "lowest " + label))
+        header = f"{summary[0].upper()}{summary[1:]}, {descending_word if plan.descending else ascending_word} first:"
+        return "\n".join([header] + lines), {"plan": plan.describe(), "rows": rows}
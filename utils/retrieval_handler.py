@@ -1,8 +1,44 @@
-import chromadb
-from sentence_transformers import SentenceTransformer, CrossEncoder
-from langchain_community.retrievers import BM25Retriever
-from langchain.schema import Document
-from utils.constants import EMBED_MODEL, RERANK_MODEL, chroma_path
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from utils.bm25_index import BM25Index, keyword_index_path
+from utils.constants import EMBED_MODEL, RERANK_MODEL, chroma_path, HYBRID_SEARCH_BUDGET_MS, RETRIEVAL_WORKERS, \
+    FUSION_MODE, RRF_K, RERANK_TOP_N, RERANK_SKIP_WHEN_CONFIDENT, RERANK_CACHE_SIZE, FILTERED_SEARCH_OVERFETCH
+from utils.inference_backend import load_embedding_model, load_re_ranker
+from utils.lru_cache import LRUCache
+from utils.vector_store import open_vector_store_client
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def search_executor():
+    """Thread pool running the retrieval stages; recreated in a forked child, which inherits no threads."""
+    global _executor, _executor_pid
+    if _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="hybrid-search")
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def timed(stage, *args):
+    """(`stage(*args)`, its duration in milliseconds)."""
+    started = time.perf_counter()
+    result = stage(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def submit_re_rank(executor, handler, query, docs):
+    """
+    Submits `handler.re_rank_results` of `docs` to `executor`, timed. It re-ranks copies: if the
+    search deadline passes, the abandoned re-rank must not touch the docs the search returns.
+    """
+    return executor.submit(timed, handler.re_rank_results, query, [dict(doc) for doc in docs])
 
 
 
@@ -12,30 +48,41 @@ class RetrievalHandler:
             collection_name: str = "imdb_chatbot",
             embed_model: str = EMBED_MODEL,
             re_rank_model: str = RERANK_MODEL,
+            embedding_model=None,
+            re_ranker=None,
+            chroma_client=None,
     ):
         """
         Initializes the retrieval handler with:
-          - ChromaDB for vector search.
-          - BM25 for keyword search (using a combination of all metadata fields).
+          - The configured vector store (ChromaDB or the flat memory-mapped store) for vector search.
+          - BM25 for keyword search (using a combination of all metadata fields),
+            persisted next to the Chroma collection and kept up to date by ChromaDBHandler.
           - A cross-encoder re-ranker for fusing the results.
 
         Args:
             collection_name (str): Name of the ChromaDB collection.
             embed_model (str): Model for computing vector embeddings.
             re_rank_model (str): Cross-encoder model used for re-ranking.
+            embedding_model: Already loaded SentenceTransformer to reuse instead of loading `embed_model`.
+            re_ranker: Already loaded CrossEncoder to reuse instead of loading `re_rank_model`.
+            chroma_client: Already opened vector store client to reuse instead of opening `chroma_path`.
         """
         self.collection_name = collection_name
 
-        self.embedding_model = SentenceTransformer(embed_model)
+        self.embedding_model = embedding_model or load_embedding_model(embed_model)
 
-        self.re_ranker = CrossEncoder(re_rank_model)
+        self.re_ranker = re_ranker or load_re_ranker(re_rank_model)
 
-        self.chroma_client = chromadb.PersistentClient(path=chroma_path)
+        self.chroma_client = chroma_client or open_vector_store_client(chroma_path)
         self.collection = self.chroma_client.get_or_create_collection(name=self.collection_name)
 
+        # (query, document id, content hash) -> cross-encoder score; dropped with the handler on re-index.
+        self.rerank_cache = LRUCache(RERANK_CACHE_SIZE)
+
         self.initialize_bm25_retriever()
 
-    def combine_metadata(self, meta: dict) -> str:
+    @staticmethod
+    def combine_metadata(meta: dict) -> str:
         """
         Combines all desired metadata fields into a single string.
         This string will be used for BM25 indexing and for re-ranking.
@@ -64,60 +111,84 @@ class RetrievalHandler:
     def encode_query(self, query: str):
         return self.embedding_model.encode(query).tolist()
 
-    def vector_search(self, query: str, top_k: int = 10):
+    def vector_search(self, query: str, top_k: int = 10, where: dict = None, metadata_filter=None):
         """
-        Performs vector-based semantic search using ChromaDB.
-        Returns a list of metadata dictionaries (one per retrieved document).
+        Performs vector-based semantic search in the collection's vector store.
+        Returns a list of metadata dictionaries (one per retrieved document), each with its document `id`.
+
+        `where` is passed to Chroma, so only matching documents are searched; `metadata_filter`
+        is a predicate on the metadata for conditions `where` cannot express, applied to an
+        over-fetched candidate list.
         """
-        query_embedding = self.encode_query(query)
-        results = self.collection.query(query_embeddings=[query_embedding], n_results=top_k)
-        if results and "metadatas" in results and results["metadatas"]:
-            return results["metadatas"][0]
-        return []
+        return self.vector_search_by_embedding(self.encode_query(query), top_k, where, metadata_filter)[0]
+
+    def vector_search_by_embedding(self, query_embedding, top_k: int = 10, where: dict = None, metadata_filter=None):
+        """
+        `vector_search` for an already computed query embedding (a list of floats, as from `encode_query`).
+        Returns (metadata dicts, their distances to the query), nearest first.
+        """
+        kwargs = {"where": where} if where else {}
+        n_results = top_k * FILTERED_SEARCH_OVERFETCH if metadata_filter else top_k
+        results = self.collection.query(query_embeddings=[query_embedding], n_results=n_results, **kwargs)
+        if not (results and "metadatas" in results and results["metadatas"]):
+            return [], []
+        hits = [dict(meta, id=doc_id) for doc_id, meta in zip(results["ids"][0], results["metadatas"][0])]
+        distances = list(results["distances"][0]) if results.get("distances") else [0.0] * len(hits)
+        if metadata_filter:
+            kept = [position for position, meta in enumerate(hits) if metadata_filter(meta)]
+            hits, distances = [hits[position] for position in kept], [distances[position] for position in kept]
+        return hits[:top_k], distances[:top_k]
 
     def initialize_bm25_retriever(self):
         """
-        Initializes the BM25 retriever from the metadata stored in ChromaDB.
-        Instead of using just the "overview" field, we build a combined text from all fields.
-        """
-        stored = self.collection.get()  # Retrieve all stored items.
-        if stored and "metadatas" in stored and stored["metadatas"]:
-            texts = []
-            metadatas = []
-            for meta in stored["metadatas"]:
-                combined_text = self.combine_metadata(meta)
-                texts.append(combined_text)
-                metadatas.append(meta)
-            self.keyword_retriever = BM25Retriever.from_texts(texts, metadatas=metadatas)
-        else:
-            self.keyword_retriever = None
+        Loads the BM25 index saved next to the ChromaDB collection.
+        Instead of using just the "overview" field, documents are indexed by a combined text from all fields.
+        Collections indexed before the BM25 index was persisted are scanned once and the index is saved.
+        """
+        self.keyword_index = BM25Index.load_or_build(
+            keyword_index_path(chroma_path, self.collection_name),
+            self.collection,
+            self.combine_metadata,
+        )
 
-    def keyword_search(self, query: str, top_k: int = 3):
+    def keyword_search(self, query: str, top_k: int = 3, metadata_filter=None):
         """
         Performs BM25 keyword search.
-        Returns a list of Document objects.
+        Returns a list of metadata dictionaries, each with its document `id`, best match first,
+        keeping only documents accepted by `metadata_filter` if one is given.
         """
-        if not self.keyword_retriever:
+        hits = self.keyword_index.search(query, top_k=top_k * FILTERED_SEARCH_OVERFETCH if metadata_filter else top_k)
+        if not hits:
             return []
-        docs = self.keyword_retriever.get_relevant_documents(query)
-        return docs[:top_k]
+        ids = [doc_id for doc_id, _ in hits]
+        stored = self.collection.get(ids=ids, include=["metadatas"])
+        metadata_by_id = dict(zip(stored["ids"], stored["metadatas"]))
+        results = [dict(metadata_by_id[doc_id], id=doc_id) for doc_id in ids if doc_id in metadata_by_id]
+        if metadata_filter:
+            results = [meta for meta in results if metadata_filter(meta)]
+        return results[:top_k]
 
     def convert_document(self, doc):
         """
-        Converts a result from either vector search (a dict) or BM25 (a Document)
-        into a unified dictionary format with keys: 'title' and 'combined'.
-        'combined' is a string that includes all the metadata fields.
+        Converts a metadata dict returned by vector or BM25 search
+        into a unified dictionary format with keys: 'id', 'title', 'content_hash', 'combined' and 'metadata'.
+        'combined' is a string that includes all the metadata fields; 'metadata' is the stored metadata itself.
         """
-        if isinstance(doc, Document):
-            meta = doc.metadata
-        elif isinstance(doc, dict):
+        if isinstance(doc, dict):
             meta = doc
         else:
-            return {"title": str(doc)[:50], "combined": str(doc)}
+            return {"id": str(doc)[:50], "title": str(doc)[:50], "content_hash": "", "combined": str(doc),
+                    "metadata": {"title": str(doc)[:50], "overview": str(doc)}}
 
         title = meta.get("title", "")
         combined = self.combine_metadata(meta)
-        return {"title": title, "combined": combined}
+        return {
+            "id": meta.get("id") or title,
+            "title": title,
+            "content_hash": meta.get("content_hash", ""),
+            "combined": combined,
+            "metadata": meta,
+        }
 
     def merge_results(self, vector_results, keyword_results):
         """
@@ -137,33 +208,148 @@ class RetrievalHandler:
                 merged[key] = doc
         return list(merged.values())
 
+    def fuse_results(self, *result_lists, k: int = RRF_K):
+        """
+        Reciprocal-rank fusion of ranked result lists (the vector and keyword results, or one
+        keyword list per shard), keyed by document id.
+        Each document scores sum(1 / (k + rank)) over the lists it appears in; the result is
+        sorted by that `fused_score`, best first.
+        """
+        fused = {}
+        for results in result_lists:
+            for rank, res in enumerate(results, start=1):
+                doc = self.convert_document(res)
+                entry = fused.setdefault(doc["id"], dict(doc, fused_score=0.0))
+                entry["fused_score"] += 1.0 / (k + rank)
+        return sorted(fused.values(), key=lambda doc: doc["fused_score"], reverse=True)
+
+    @staticmethod
+    def fusion_is_confident(vector_results, keyword_results):
+        """True when both retrievers put the same document first, so re-ranking is unlikely to change the answer."""
+        if not vector_results or not keyword_results:
+            return False
+        return vector_results[0].get("id") == keyword_results[0].get("id")
+
     def re_rank_results(self, query: str, results: list):
         """
         Re-ranks the combined results using the cross-encoder re-ranker.
         Each candidate is paired with the query and its combined metadata text is scored.
+        Scores already computed for the same query and document version are reused.
+        """
+        return self.re_rank_batch([query], [results])[0]
+
+    def re_rank_batch(self, queries, result_lists, batch_size: int = None):
         """
-        pairs = [(query, doc["combined"]) for doc in results]
-        scores = self.re_ranker.predict(pairs)
-        for doc, score in zip(results, scores):
-            doc["score"] = score
-        re_ranked = sorted(results, key=lambda x: x["score"], reverse=True)
+        `re_rank_results` for several queries, each with its own results. The pairs missing from
+        the score cache are predicted together: through the micro-batcher by default, or straight
+        through the cross-encoder `batch_size` pairs per forward pass.
+        """
+        pairs, keys, slots = [], [], []
+        scores = []
+        for position, (query, results) in enumerate(zip(queries, result_lists)):
+            normalized_query = " ".join(query.lower().split())
+            query_scores = []
+            for rank, doc in enumerate(results):
+                key = (normalized_query, doc.get("id", doc["title"]), doc.get("content_hash", ""))
+                score = self.rerank_cache.get(key)
+                if score is None:
+                    pairs.append((query, doc["combined"]))
+                    keys.append(key)
+                    slots.append((position, rank))
+                query_scores.append(score)
+            scores.append(query_scores)
+
+        if pairs:
+            if batch_size:
+                predicted = self.re_ranker.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+            else:
+                predicted = self.re_ranker.predict(pairs)
+            for (position, rank), key, score in zip(slots, keys, predicted):
+                scores[position][rank] = float(score)
+                self.rerank_cache.put(key, scores[position][rank])
+
+        re_ranked = []
+        for results, query_scores in zip(result_lists, scores):
+            for doc, score in zip(results, query_scores):
+                doc["score"] = score
+            re_ranked.append(sorted(results, key=lambda x: x["score"], reverse=True))
         return re_ranked
 
-    def hybrid_search(self, query: str, top_k_vector: int = 10, top_k_keyword: int = 5, top_k_final: int = 10):
+    def hybrid_search(self, query: str, top_k_vector: int = 10, top_k_keyword: int = 5, top_k_final: int = 10,
+                      budget_ms: float = HYBRID_SEARCH_BUDGET_MS, timings: dict = None, fusion: str = FUSION_MODE,
+                      rerank_top_n: int = RERANK_TOP_N, skip_confident_rerank: bool = RERANK_SKIP_WHEN_CONFIDENT,
+                      where: dict = None, metadata_filter=None):
         """
         Executes the hybrid retrieval pipeline:
-          1. Performs vector search via ChromaDB.
-          2. Performs BM25 keyword search using combined metadata text.
-          3. Merges and de-duplicates results.
-          4. Re-ranks the merged results using the cross-encoder.
+          1. Performs vector search via ChromaDB and BM25 keyword search, concurrently.
+          2. Fuses the two result lists (reciprocal-rank fusion by default) and de-duplicates them.
+          3. Re-ranks the top `rerank_top_n` fused results using the cross-encoder,
+             unless both retrievers agree on the best hit.
+
+        With a `budget_ms` deadline, a stage that overruns it is abandoned and the best
+        results available so far are returned: a late retrieval leg is left out of the fusion,
+        and a late re-rank falls back to fused order.
+
+        Args:
+            budget_ms (float): Latency budget for the whole pipeline; 0 or None waits for every stage.
+            timings (dict): Optional dict filled with per-stage milliseconds and the stages that were skipped.
+            fusion (str): "rrf" for reciprocal-rank fusion, "merge" for vector-first merge by title.
+            rerank_top_n (int): Number of fused candidates sent to the cross-encoder; 0 re-ranks all of them.
+            skip_confident_rerank (bool): Skip re-ranking when both legs return the same top document.
+            where (dict): Chroma `where` clause restricting the vector leg, e.g. from `QueryPlan.chroma_where`.
+            metadata_filter: Predicate on a document's metadata that both legs' results must satisfy.
 
         Returns the top_k_final re-ranked results.
         """
-        vector_results = self.vector_search(query, top_k=top_k_vector)
-        keyword_results = self.keyword_search(query, top_k=top_k_keyword)
-        merged_results = self.merge_results(vector_results, keyword_results)
-        re_ranked_results = self.re_rank_results(query, merged_results)
-        return re_ranked_results[:top_k_final]
+        timings = timings if timings is not None else {}
+        timings["skipped"] = []
+        started = time.perf_counter()
+        deadline = started + budget_ms / 1000 if budget_ms else None
+
+        def remaining():
+            return None if deadline is None else max(0.0, deadline - time.perf_counter())
+
+        def collect(future, stage):
+            try:
+                result, elapsed_ms = future.result(timeout=remaining())
+            except FutureTimeoutError:
+                timings["skipped"].append(stage)
+                return None
+            timings[f"{stage}_ms"] = round(elapsed_ms, 2)
+            return result
+
+        executor = search_executor()
+        vector_future = executor.submit(timed, self.vector_search, query, top_k_vector, where, metadata_filter)
+        keyword_future = executor.submit(timed, self.keyword_search, query, top_k_keyword, metadata_filter)
+        vector_results = collect(vector_future, "vector") or []
+        keyword_results = collect(keyword_future, "keyword") or []
+
+        merge_started = time.perf_counter()
+        if fusion == "rrf":
+            merged_results = self.fuse_results(vector_results, keyword_results)
+        else:
+            merged_results = self.merge_results(vector_results, keyword_results)
+        timings["merge_ms"] = round((time.perf_counter() - merge_started) * 1000, 2)
+
+        final_results = merged_results
+        if merged_results and skip_confident_rerank and self.fusion_is_confident(vector_results, keyword_results):
+            timings["skipped"].append("rerank:confident")
+        elif merged_results:
+            head = merged_results[:rerank_top_n] if rerank_top_n else merged_results
+            tail = merged_results[len(head):]
+            re_ranked = collect(submit_re_rank(executor, self, query, head), "rerank")
+            if re_ranked is not None:
+                final_results = re_ranked + tail
+            timings["reranked"] = len(head)
+
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return final_results[:top_k_final]
+
+    def hybrid_search_batch(self, queries, query_embeddings=None, **kwargs):
+        """`ScatterGatherRetriever.hybrid_search_batch` over this collection alone."""
+        from utils.scatter_gather import ScatterGatherRetriever
+
+        return ScatterGatherRetriever([self]).hybrid_search_batch(queries, query_embeddings, **kwargs)
 
 
 # -------------------------
@@ -0,0 +1,228 @@
+"""
+Scatter-gather retrieval over several collections (shards) of one catalog.
+
+Every shard is searched concurrently with the same query embedding, so a request
+waits for its slowest shard rather than for the sum of all of them. Results are
+merged on scores that mean the same thing in every shard: vector hits by their
+distance to the query, keyword hits by reciprocal rank (BM25 scores depend on each
+shard's own term statistics), and the fused head is re-ranked once by the
+cross-encoder. Documents are de-duplicated by their stable id, so a movie indexed
+in two collections is returned once.
+"""
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from utils.constants import HYBRID_SEARCH_BUDGET_MS, FUSION_MODE, RERANK_TOP_N, RERANK_SKIP_WHEN_CONFIDENT, \
+    FILTERED_SEARCH_OVERFETCH, BATCH_EMBED_SIZE, BATCH_RERANK_SIZE
+from utils.retrieval_handler import search_executor, submit_re_rank, timed
+
+
+def merge_by_distance(shard_results, top_k):
+    """
+    Merges per-shard (hits, distances) lists into the `top_k` nearest hits overall,
+    keeping the nearest copy of a document that several shards returned.
+    """
+    nearest = {}
+    for hits, distances in shard_results:
+        for hit, distance in zip(hits, distances):
+            doc_id = hit.get("id")
+            if doc_id not in nearest or distance < nearest[doc_id][0]:
+                nearest[doc_id] = (distance, hit)
+    ranked = sorted(nearest.values(), key=lambda entry: entry[0])
+    return [hit for _, hit in ranked[:top_k]], [distance for distance, _ in ranked[:top_k]]
+
+
+def query_collections(collections, query_embedding, n_results: int = 10, where: dict = None, metadata_filter=None):
+    """
+    The `n_results` documents nearest to `query_embedding` (a list of floats) over every
+    collection, queried concurrently. `where` is passed to each collection and
+    `metadata_filter` applied to over-fetched results. Returns metadata dicts with their `id`.
+    """
+    return query_collections_batch(collections, [query_embedding], n_results, where, metadata_filter)[0]
+
+
+def query_collections_batch(collections, query_embeddings, n_results: int = 10, where: dict = None,
+                            metadata_filter=None):
+    """
+    `query_collections` for several query embeddings at once: each collection gets a single
+    multi-query `query` call. Returns one list of metadata dicts per query embedding.
+    """
+    if not len(query_embeddings):
+        return []
+
+    def search(collection):
+        n_fetch = n_results * FILTERED_SEARCH_OVERFETCH if metadata_filter else n_results
+        results = collection.query(query_embeddings=query_embeddings, n_results=n_fetch,
+                                   **({"where": where} if where else {}))
+        per_query = []
+        for position in range(len(query_embeddings)):
+            if not results["metadatas"] or not results["metadatas"][position]:
+                per_query.append(([], []))
+                continue
+            hits = [dict(meta, id=doc_id)
+                    for doc_id, meta in zip(results["ids"][position], results["metadatas"][position])]
+            distances = list(results["distances"][position]) if results.get("distances") else [0.0] * len(hits)
+            if metadata_filter:
+                kept = [index for index, meta in enumerate(hits) if metadata_filter(meta)]
+                hits, distances = [hits[index] for index in kept], [distances[index] for index in kept]
+            per_query.append((hits, distances))
+        return per_query
+
+    if len(collections) == 1:
+        by_collection = [search(collections[0])]
+    else:
+        futures = [search_executor().submit(search, collection) for collection in collections]
+        by_collection = [future.result() for future in futures]
+    return [merge_by_distance([shard[position] for shard in by_collection], n_results)[0]
+            for position in range(len(query_embeddings))]
+
+
+class ScatterGatherRetriever:
+    """Hybrid search over several RetrievalHandlers, one per collection, with the interface of one."""
+
+    def __init__(self, handlers):
+        """
+        Args:
+            handlers (list): RetrievalHandler of every collection to search. They share the
+                embedding model and re-ranker; the first one's are used for the whole query.
+        """
+        self.handlers = handlers
+        self.collection_names = [handler.collection_name for handler in handlers]
+
+    def hybrid_search(self, query: str, top_k_vector: int = 10, top_k_keyword: int = 5, top_k_final: int = 10,
+                      budget_ms: float = HYBRID_SEARCH_BUDGET_MS, timings: dict = None, fusion: str = FUSION_MODE,
+                      rerank_top_n: int = RERANK_TOP_N, skip_confident_rerank: bool = RERANK_SKIP_WHEN_CONFIDENT,
+                      where: dict = None, metadata_filter=None):
+        """
+        `RetrievalHandler.hybrid_search` across every collection:
+          1. The query is embedded once; the vector and keyword legs of every shard run concurrently.
+          2. Vector hits are merged by distance, then fused (reciprocal rank) with each shard's keyword hits.
+          3. The top `rerank_top_n` fused documents are re-ranked by the cross-encoder, whose scores
+             are comparable across shards.
+
+        A shard leg that overruns `budget_ms` is left out and listed in `timings["skipped"]`
+        as "<stage>:<collection>"; per-shard stage times are in `timings["shards"]`.
+        With a single collection this is exactly that handler's `hybrid_search`.
+        """
+        if len(self.handlers) == 1:
+            return self.handlers[0].hybrid_search(
+                query, top_k_vector=top_k_vector, top_k_keyword=top_k_keyword, top_k_final=top_k_final,
+                budget_ms=budget_ms, timings=timings, fusion=fusion, rerank_top_n=rerank_top_n,
+                skip_confident_rerank=skip_confident_rerank, where=where, metadata_filter=metadata_filter)
+
+        timings = timings if timings is not None else {}
+        timings["skipped"] = []
+        timings["shards"] = {name: {} for name in self.collection_names}
+        started = time.perf_counter()
+        deadline = started + budget_ms / 1000 if budget_ms else None
+
+        def remaining():
+            return None if deadline is None else max(0.0, deadline - time.perf_counter())
+
+        lead = self.handlers[0]
+        query_embedding, timings["embed_ms"] = timed(lead.encode_query, query)
+        timings["embed_ms"] = round(timings["embed_ms"], 2)
+
+        executor = search_executor()
+        futures = []
+        for handler in self.handlers:
+            futures.append((handler.collection_name, "vector", executor.submit(
+                timed, handler.vector_search_by_embedding, query_embedding, top_k_vector, where, metadata_filter)))
+            futures.append((handler.collection_name, "keyword", executor.submit(
+                timed, handler.keyword_search, query, top_k_keyword, metadata_filter)))
+
+        vector_by_shard, keyword_by_shard = [], []
+        for name, stage, future in futures:
+            try:
+                result, elapsed_ms = future.result(timeout=remaining())
+            except FutureTimeoutError:
+                timings["skipped"].append(f"{stage}:{name}")
+                continue
+            timings["shards"][name][f"{stage}_ms"] = round(elapsed_ms, 2)
+            (vector_by_shard if stage == "vector" else keyword_by_shard).append(result)
+        timings["gather_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+        merge_started = time.perf_counter()
+        vector_results = merge_by_distance(vector_by_shard, top_k_vector)[0]
+        if fusion == "rrf":
+            merged_results = lead.fuse_results(vector_results, *keyword_by_shard)
+        else:
+            merged_results = lead.merge_results(vector_results, [hit for hits in keyword_by_shard for hit in hits])
+        timings["merge_ms"] = round((time.perf_counter() - merge_started) * 1000, 2)
+
+        final_results = merged_results
+        if merged_results:
+            head = merged_results[:rerank_top_n] if rerank_top_n else merged_results
+            tail = merged_results[len(head):]
+            future = submit_re_rank(executor, lead, query, head)
+            try:
+                re_ranked, elapsed_ms = future.result(timeout=remaining())
+                timings["rerank_ms"] = round(elapsed_ms, 2)
+                final_results = re_ranked + tail
+            except FutureTimeoutError:
+                timings["skipped"].append("rerank")
+            timings["reranked"] = len(head)
+
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return final_results[:top_k_final]
+
+    def hybrid_search_batch(self, queries, query_embeddings=None, top_k_vector: int = 10, top_k_keyword: int = 5,
+                            top_k_final: int = 10, fusion: str = FUSION_MODE, rerank_top_n: int = RERANK_TOP_N,
+                            skip_confident_rerank: bool = RERANK_SKIP_WHEN_CONFIDENT, timings: dict = None):
+        """
+        `hybrid_search` for many queries at once, for offline batches (no latency budget):
+          1. Queries without an embedding are embedded in batches of BATCH_EMBED_SIZE.
+          2. Every collection gets one multi-query vector search; keyword searches run meanwhile.
+          3. Each query's results are fused as in `hybrid_search`, then the (query, document) pairs
+             of every re-ranked head are scored together, BATCH_RERANK_SIZE pairs per forward pass.
+        Returns one result list per query. `timings` gets the milliseconds of each step.
+        """
+        timings = timings if timings is not None else {}
+        if not queries:
+            return []
+        started = time.perf_counter()
+        lead = self.handlers[0]
+        if query_embeddings is None:
+            query_embeddings, timings["embed_ms"] = timed(
+                lambda: lead.embedding_model.encode(list(queries), batch_size=BATCH_EMBED_SIZE))
+            timings["embed_ms"] = round(timings["embed_ms"], 2)
+        query_embeddings = [list(map(float, embedding)) for embedding in query_embeddings]
+
+        def keyword_searches(handler):
+            return [handler.keyword_search(query, top_k_keyword) for query in queries]
+
+        executor = search_executor()
+        keyword_futures = [executor.submit(timed, keyword_searches, handler) for handler in self.handlers]
+        vector_results, timings["vector_ms"] = timed(
+            query_collections_batch, [handler.collection for handler in self.handlers], query_embeddings,
+            top_k_vector)
+        timings["vector_ms"] = round(timings["vector_ms"], 2)
+        keyword_by_shard = []
+        for future in keyword_futures:
+            results, elapsed_ms = future.result()
+            keyword_by_shard.append(results)
+            timings["keyword_ms"] = round(max(timings.get("keyword_ms", 0.0), elapsed_ms), 2)
+
+        merge_started = time.perf_counter()
+        merged, heads = [], []
+        for position in range(len(queries)):
+            keyword_results = [shard[position] for shard in keyword_by_shard]
+            if fusion == "rrf":
+                merged_results = lead.fuse_results(vector_results[position], *keyword_results)
+            else:
+                merged_results = lead.merge_results(vector_results[position],
+                                                    [hit for hits in keyword_results for hit in hits])
+            merged.append(merged_results)
+            confident = (len(self.handlers) == 1 and skip_confident_rerank
+                         and lead.fusion_is_confident(vector_results[position], keyword_results[0]))
+            heads.append([] if confident else merged_results[:rerank_top_n] if rerank_top_n else merged_results)
+        timings["merge_ms"] = round((time.perf_counter() - merge_started) * 1000, 2)
+
+        re_ranked, timings["rerank_ms"] = timed(lead.re_rank_batch, queries, heads, BATCH_RERANK_SIZE)
+        timings["rerank_ms"] = round(timings["rerank_ms"], 2)
+        timings["reranked"] = sum(len(head) for head in heads)
+
+        final_results = [head_ranked + merged_results[len(head):] if head else merged_results
+                         for merged_results, head, head_ranked in zip(merged, heads, re_ranked)]
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return [results[:top_k_final] for results in final_results]
@@ -0,0 +1,173 @@
+"""
+Semantic cache of generated answers.
+
+Questions are matched by the cosine similarity of their query embeddings, so a
+rewording of a question answered before ("when did the matrix come out" / "release
+year of The Matrix") returns the stored answer without retrieval or generation.
+Entries are partitioned by (collection, model): an answer is only reused for the
+same index and the same LLM. A partition is emptied when its collection is
+re-indexed, entries expire after a TTL, and a full partition evicts its least
+recently used entry.
+"""
+import re
+import threading
+import time
+
+import numpy as np
+
+NUMBER_PATTERN = re.compile(r"\d+")
+
+
+class _Partition:
+    def __init__(self, dim: int, capacity: int, version):
+        self.version = version
+        self.capacity = capacity
+        self.size = 0
+        self.vectors = np.empty((min(capacity, 256), dim), dtype=np.float32)
+        self.created = np.empty(len(self.vectors))
+        self.last_used = np.empty(len(self.vectors))
+        self.questions = []
+        self.numbers = []
+        self.answers = []
+
+    def _grow(self):
+        rows = min(self.capacity, 2 * len(self.vectors))
+        self.vectors = np.resize(self.vectors, (rows, self.vectors.shape[1]))
+        self.created = np.resize(self.created, rows)
+        self.last_used = np.resize(self.last_used, rows)
+
+    def free_slot(self, now, ttl_seconds):
+        """Returns a slot to write to; when full, an expired one or else the least recently used."""
+        if self.size < self.capacity:
+            if self.size == len(self.vectors):
+                self._grow()
+            self.size += 1
+            self.questions.append(None)
+            self.numbers.append(None)
+            self.answers.append(None)
+            return self.size - 1, False
+        if ttl_seconds:
+            expired = np.flatnonzero(self.created < now - ttl_seconds)
+            if len(expired):
+                return int(expired[0]), False
+        return int(np.argmin(self.last_used)), True
+
+
+class SemanticAnswerCache:
+    def __init__(self, max_entries: int, ttl_seconds: float, threshold: float, version_fn=None):
+        """
+        Args:
+            max_entries (int): Answers kept per (collection, model); 0 disables the cache.
+            ttl_seconds (float): Age after which an answer is no longer served (0 keeps answers until evicted).
+            threshold (float): Minimum cosine similarity between two questions for an answer to be reused.
+            version_fn: Optional callable mapping a collection name to its current index version; a partition
+                built for an older version is dropped (catches re-indexing done by other worker processes).
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.version_fn = version_fn
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._partitions = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _numbers(question):
+        # Near-identical questions that differ in a number ("top 5" / "top 10", a year) need different answers.
+        return tuple(NUMBER_PATTERN.findall(question))
+
+    def _partition(self, collection_name, model, dim=None):
+        version = self.version_fn(collection_name) if self.version_fn else None
+        key = (collection_name, model)
+        partition = self._partitions.get(key)
+        if partition is not None and partition.version != version:
+            del self._partitions[key]
+            self.invalidations += 1
+            partition = None
+        if partition is None and dim is not None:
+            partition = _Partition(dim, self.max_entries, version)
+            self._partitions[key] = partition
+        return partition
+
+    def lookup(self, collection_name: str, model: str, embedding, question: str):
+        """
+        Returns (answer, similarity, cached question) of the closest earlier question of this
+        (collection, model) if it is similar enough, not expired and asks about the same numbers;
+        otherwise None.
+        """
+        if self.max_entries <= 0:
+            return None
+        query = self._normalize(embedding)
+        numbers = self._numbers(question)
+        now = time.time()
+        with self._lock:
+            partition = self._partition(collection_name, model)
+            if partition is None or partition.size == 0:
+                self.misses += 1
+                return None
+
+            similarities = partition.vectors[:partition.size] @ query
+            if self.ttl_seconds:
+                similarities[partition.created[:partition.size] < now - self.ttl_seconds] = -1.0
+            top = min(4, partition.size)
+            candidates = np.argpartition(-similarities, top - 1)[:top]
+            for slot in candidates[np.argsort(-similarities[candidates])]:
+                if similarities[slot] < self.threshold:
+                    break
+                if partition.numbers[slot] == numbers:
+                    partition.last_used[slot] = now
+                    self.hits += 1
+                    return partition.answers[slot], float(similarities[slot]), partition.questions[slot]
+            self.misses += 1
+            return None
+
+    def store(self, collection_name: str, model: str, embedding, question: str, answer: str):
+        """Caches `answer` to `question` for this (collection, model)."""
+        if self.max_entries <= 0 or not answer:
+            return
+        vector = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            partition = self._partition(collection_name, model, dim=len(vector))
+            slot, evicted = partition.free_slot(now, self.ttl_seconds)
+            self.evictions += evicted
+            partition.vectors[slot] = vector
+            partition.created[slot] = now
+            partition.last_used[slot] = now
+            partition.questions[slot] = question
+            partition.numbers[slot] = self._numbers(question)
+            partition.answers[slot] = answer
+
+    def invalidate(self, collection_name: str):
+        """Drops every cached answer for `collection_name`, for all models and every shard group it is part of."""
+        with self._lock:
+            for key in [key for key in self._partitions if collection_name in key[0].split(",")]:
+                del self._partitions[key]
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "partitions": [
+                    {"collection": collection, "model": model, "entries": partition.size,
+                     "max_entries": partition.capacity}
+                    for (collection, model), partition in self._partitions.items()
+                ],
+            }
@@ -0,0 +1,291 @@
+"""
+Process-wide registry of the heavy objects used by the endpoints.
+
+Models, the vector store client and one RetrievalHandler per collection are built
+lazily on first use and then shared by every request handled by this process.
+Index changes go through `invalidate_collection` so the next request rebuilds
+the affected handler from the updated collection, in this process and, through a
+marker file next to the Chroma files, in every other worker process.
+"""
+import os
+import threading
+import time
+
+from utils.constants import EMBED_MODEL, RERANK_MODEL, chroma_path, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_CAPACITY, \
+    EMBED_BATCH_MAX_WAIT_MS, RERANK_BATCH_MAX_WAIT_MS, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL_S, ANSWER_CACHE_THRESHOLD, \
+    DEFAULT_COLLECTION, SHARD_GROUPS
+from utils import metrics
+from utils.embedding_cache import CachedEmbeddingModel, EmbeddingCache
+from utils.inference_backend import load_embedding_model, load_re_ranker, model_key
+from utils.micro_batcher import BatchedCrossEncoder, BatchedEmbeddingModel
+from utils.movie_table import MovieTable
+from utils.query_router import QueryRouter
+from utils.retrieval_handler import RetrievalHandler
+from utils.scatter_gather import ScatterGatherRetriever
+from utils.semantic_cache import SemanticAnswerCache
+from utils.vector_store import open_vector_store_client
+
+_lock = threading.Lock()
+_embedding_models = {}
+_re_rankers = {}
+_vector_store_clients = {}
+
+_handlers_lock = threading.Lock()
+_retrieval_handlers = {}
+_query_routers = {}
+_collection_locks = {}
+_collection_generations = {}
+
+
+def get_embedding_model(model_name: str = EMBED_MODEL):
+    """
+    Returns the shared SentenceTransformer for `model_name`, loading it on first use with the
+    configured inference backend (INFERENCE_BACKEND).
+    Small encode calls from concurrent requests are micro-batched, and unless the
+    embedding cache is disabled, `encode` checks the cache before running the model.
+    """
+    model = _embedding_models.get(model_name)
+    if model is None:
+        with _lock:
+            model = _embedding_models.get(model_name)
+            if model is None:
+                model = load_embedding_model(model_name)
+                dim = model.get_sentence_embedding_dimension()
+                if EMBED_BATCH_MAX_WAIT_MS > 0:
+                    model = BatchedEmbeddingModel(model)
+                if EMBEDDING_CACHE_CAPACITY > 0:
+                    cache = EmbeddingCache(
+                        EMBEDDING_CACHE_DIR,
+                        model_key(model_name),
+                        dim=dim,
+                        capacity=EMBEDDING_CACHE_CAPACITY,
+                    )
+                    model = CachedEmbeddingModel(model, cache)
+                _embedding_models[model_name] = model
+    return model
+
+
+def get_embedding_cache_stats():
+    """Hit/miss counters of the embedding caches of every loaded model."""
+    return [model.cache.stats() for model in list(_embedding_models.values())
+            if isinstance(model, CachedEmbeddingModel)]
+
+
+def get_re_ranker(model_name: str = RERANK_MODEL):
+    """
+    Returns the shared CrossEncoder for `model_name`, loading it on first use with the configured
+    inference backend; `predict` calls are micro-batched.
+    """
+    model = _re_rankers.get(model_name)
+    if model is None:
+        with _lock:
+            model = _re_rankers.get(model_name)
+            if model is None:
+                model = load_re_ranker(model_name)
+                if RERANK_BATCH_MAX_WAIT_MS > 0:
+                    model = BatchedCrossEncoder(model)
+                _re_rankers[model_name] = model
+    return model
+
+
+def get_vector_store_client(path: str = chroma_path):
+    """Returns the shared client of the configured vector store backend (VECTOR_STORE_BACKEND) for `path`."""
+    client = _vector_store_clients.get(path)
+    if client is None:
+        with _lock:
+            client = _vector_store_clients.get(path)
+            if client is None:
+                client = open_vector_store_client(path)
+                _vector_store_clients[path] = client
+    return client
+
+
+def _collection_lock(collection_name: str):
+    with _handlers_lock:
+        lock = _collection_locks.get(collection_name)
+        if lock is None:
+            lock = threading.Lock()
+            _collection_locks[collection_name] = lock
+        return lock
+
+
+def _marker_path(collection_name: str):
+    return os.path.join(chroma_path, "generations", collection_name)
+
+
+def collection_version(collection_name: str):
+    """Last time any process invalidated `collection_name` (0 if never); changes whenever it is re-indexed."""
+    try:
+        return os.stat(_marker_path(collection_name)).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def label_version(label: str):
+    """`collection_version` of every collection in a "a,b" label; changes when any of them is re-indexed."""
+    return tuple(collection_version(name) for name in label.split(","))
+
+
+def get_retrieval_handler(collection_name: str = DEFAULT_COLLECTION):
+    """
+    Returns the warm RetrievalHandler for `collection_name`.
+
+    The handler is built once per collection (models and client are shared),
+    and rebuilt only after `invalidate_collection` has been called for it,
+    by this or another worker process.
+    Concurrent first requests for the same collection wait for a single build.
+    """
+    cached = _retrieval_handlers.get(collection_name)
+    if cached is not None and cached[1] == collection_version(collection_name):
+        return cached[0]
+
+    with _collection_lock(collection_name):
+        marker = collection_version(collection_name)
+        cached = _retrieval_handlers.get(collection_name)
+        if cached is not None and cached[1] == marker:
+            return cached[0]
+
+        generation = _collection_generations.get(collection_name, 0)
+        handler = RetrievalHandler(
+            collection_name=collection_name,
+            embedding_model=get_embedding_model(),
+            re_ranker=get_re_ranker(),
+            chroma_client=get_vector_store_client(),
+        )
+        with _handlers_lock:
+            # Only publish the handler if nobody invalidated the collection while it was being built.
+            if _collection_generations.get(collection_name, 0) == generation:
+                _retrieval_handlers[collection_name] = (handler, marker)
+        return handler
+
+
+def resolve_collections(collection: str = None):
+    """
+    The collections a chat request searches, from its `collection` parameter: the members of
+    the shard group of that name (SHARD_GROUPS), comma-separated collection names, or a single
+    one; DEFAULT_COLLECTION when it is empty.
+    Raises ValueError for an unknown shard group or collection.
+    """
+    if not collection:
+        return [DEFAULT_COLLECTION]
+    if collection in SHARD_GROUPS:
+        names = list(SHARD_GROUPS[collection])
+    else:
+        names = [name.strip() for name in str(collection).split(",") if name.strip()]
+    existing = {getattr(c, "name", c) for c in get_vector_store_client().list_collections()}
+    missing = [name for name in names if name not in existing]
+    if not names or missing:
+        raise ValueError(f"Unknown collection or shard group: {', '.join(missing) or collection}")
+    return list(dict.fromkeys(names))
+
+
+def open_collections(collection_names):
+    """
+    The vector store collections of `collection_names`, as returned by `resolve_collections`, which
+    already checked they exist. The default collection opens empty until it is first indexed.
+    """
+    client = get_vector_store_client()
+    return [client.get_or_create_collection(name=name) for name in collection_names]
+
+
+def collections_label(collection_names):
+    """Name of a set of collections in answer cache partitions and logs: "a" or "a,b"."""
+    return ",".join(collection_names)
+
+
+def get_retriever(collection_names):
+    """
+    The hybrid search over `collection_names`: the collection's RetrievalHandler for one,
+    a ScatterGatherRetriever querying all their handlers concurrently for several.
+    """
+    if len(collection_names) == 1:
+        return get_retrieval_handler(collection_names[0])
+    return ScatterGatherRetriever([get_retrieval_handler(name) for name in collection_names])
+
+
+def get_query_router(collection_names=DEFAULT_COLLECTION):
+    """
+    Returns the QueryRouter over the metadata of every movie in `collection_names` (a name or a list).
+    Like the retrieval handler, it is built once and rebuilt after any of the collections is invalidated.
+    """
+    names = [collection_names] if isinstance(collection_names, str) else list(collection_names)
+    key = collections_label(names)
+    cached = _query_routers.get(key)
+    if cached is not None and cached[1] == label_version(key):
+        return cached[0]
+
+    with _collection_lock(key):
+        marker = label_version(key)
+        cached = _query_routers.get(key)
+        if cached is not None and cached[1] == marker:
+            return cached[0]
+
+        generations = [_collection_generations.get(name, 0) for name in names]
+        router = QueryRouter(MovieTable.from_collections(open_collections(names)))
+        with _handlers_lock:
+            if [_collection_generations.get(name, 0) for name in names] == generations:
+                _query_routers[key] = (router, marker)
+        return router
+
+
+def invalidate_collection(collection_name: str):
+    """Drops the cached RetrievalHandler and QueryRouter so the next request, in any worker, sees the updated collection."""
+    with _handlers_lock:
+        _collection_generations[collection_name] = _collection_generations.get(collection_name, 0) + 1
+        _retrieval_handlers.pop(collection_name, None)
+        for key in [key for key in _query_routers if collection_name in key.split(",")]:
+            _query_routers.pop(key, None)
+    _answer_cache.invalidate(collection_name)
+    marker = _marker_path(collection_name)
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    with open(marker, "w") as f:
+        f.write(str(time.time_ns()))
+
+
+_answer_cache = SemanticAnswerCache(
+    max_entries=ANSWER_CACHE_SIZE,
+    ttl_seconds=ANSWER_CACHE_TTL_S,
+    threshold=ANSWER_CACHE_THRESHOLD,
+    version_fn=label_version,
+)
+
+
+def get_answer_cache():
+    """Returns the process-wide semantic cache of generated answers."""
+    return _answer_cache
+
+
+def _cache_metrics():
+    """Hit/miss counters of the answer, embedding and re-rank caches, read at scrape time for /metrics."""
+    def lookups(key, stats):
+        return [(key + ("hit",), stats["hits"]), (key + ("miss",), stats["misses"])]
+
+    answers = _answer_cache.stats()
+    return [
+        ("imdb_answer_cache_lookups_total", "Semantic answer cache lookups, by result.", ("result",),
+         lookups((), answers)),
+        ("imdb_answer_cache_evictions_total", "Answers evicted from the semantic answer cache.", (),
+         [((), answers["evictions"])]),
+        ("imdb_embedding_cache_lookups_total", "Embedding cache lookups, by model and result.", ("model", "result"),
+         [sample for stats in get_embedding_cache_stats() for sample in lookups((stats["model"],), stats)]),
+        ("imdb_rerank_cache_lookups_total", "Re-rank score cache lookups, by collection and result.",
+         ("collection", "result"),
+         [sample for name, (handler, _) in list(_retrieval_handlers.items())
+          for sample in lookups((name,), handler.rerank_cache.stats())]),
+    ]
+
+
+metrics.register_collector(_cache_metrics)
+
+
+def preload_models():
+    """
+    Loads the embedding model and re-ranker and runs one encode/predict through each, so the
+    first request does not pay for model loading or lazy framework initialization.
+    """
+    embedding_model = get_embedding_model()
+    if isinstance(embedding_model, CachedEmbeddingModel):
+        # Go past the cache: a cached vector would leave the model itself cold.
+        embedding_model = embedding_model.model
+    embedding_model.encode("warm up")
+    get_re_ranker().predict([("warm up", "warm up")])
@@ -0,0 +1,37 @@
+"""
+Startup timings of this process, recorded as they happen.
+
+Importing the app, loading each model and creating each LLM provider client (which
+imports its SDK) are timed under a section ("imports", "models", "providers") and
+served by `/startup`. `python -m benchmarks.bench_startup` measures a cold start from
+outside, including the import time of every module, for tracking in CI.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_process_started = time.time()
+_lock = threading.Lock()
+_timings = {"imports": {}, "models": {}, "providers": {}}
+
+
+@contextmanager
+def timed(section: str, name: str):
+    """Records how long the block took, in ms, as `name` under `section`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _lock:
+            _timings.setdefault(section, {})[name] = round((time.perf_counter() - started) * 1000, 2)
+
+
+def report():
+    """Every recorded timing, with the process id and how long ago this module was imported."""
+    with _lock:
+        return {
+            "pid": os.getpid(),
+            "since_start_s": round(time.time() - _process_started, 2),
+            **{section: dict(entries) for section, entries in _timings.items()},
+        }
@@ -0,0 +1,60 @@
+"""
+Vector store interface shared by the indexing and retrieval code.
+
+A vector store is used through the subset of the Chroma collection API below, so a
+`chromadb` Collection is one implementation as-is and `FlatVectorStore` the other.
+`open_vector_store_client` returns the client of the configured backend; its
+`get_or_create_collection(name)` hands out the stores.
+"""
+from abc import ABC, abstractmethod
+
+from utils.constants import VECTOR_STORE_BACKEND
+
+
+class VectorStore(ABC):
+    """
+    The operations ChromaDBHandler, RetrievalHandler and the endpoints use on a collection.
+    A backend missing any of them cannot be instantiated.
+    """
+
+    name: str
+
+    @abstractmethod
+    def count(self):
+        """Number of stored documents."""
+
+    @abstractmethod
+    def get(self, ids=None, where=None, limit=None, offset=0, include=("metadatas",)):
+        """
+        Documents by id, or all of them paged by `limit`/`offset`.
+        Returns {"ids": [...], "metadatas": [...] or None, "embeddings": ... or None}.
+        """
+
+    @abstractmethod
+    def upsert(self, ids, embeddings, metadatas=None, documents=None):
+        """Inserts new documents and replaces existing ones with the same id."""
+
+    @abstractmethod
+    def delete(self, ids=None):
+        """Removes the documents with these ids."""
+
+    @abstractmethod
+    def query(self, query_embeddings, n_results: int = 10, where: dict = None, include=("metadatas", "distances")):
+        """
+        Nearest documents of every query embedding, optionally restricted by a Chroma `where` clause.
+        Returns {"ids": [[...]], "distances": [[...]], "metadatas": [[...]], "documents": [[...]]},
+        one inner list per query, nearest first.
+        """
+
+
+def open_vector_store_client(path: str, backend: str = VECTOR_STORE_BACKEND):
+    """Opens the client of `backend` ("chroma" or "flat") for the stores under `path`."""
+    if backend == "chroma":
+        import chromadb
+
+        return chromadb.PersistentClient(path=path)
+    if backend == "flat":
+        from utils.flat_vector_store import FlatVectorStoreClient
+
+        return FlatVectorStoreClient(path)
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND '{backend}'; expected 'chroma' or 'flat'")
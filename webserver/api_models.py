@@ -5,7 +5,7 @@ from webserver.extensions import api
 
 inference_chat_api = api.model('ChatRequest', {
     'message': fields.String(required=True, description="User's input message to the chat model."),
-    'stream': fields.Boolean(default=False, description="Flag to enable/disable streaming responses."),
+    'stream': fields.Boolean(default=False, description="Stream tokens back as server-sent events."),
     'model': fields.String(default="llama3.2", description="The model to use for inference.")
 })
 
@@ -13,11 +13,53 @@ create_index_parser = reqparse.RequestParser()
 create_index_parser.add_argument('file', type=FileStorage, location='files', required=True, help="File to be uploaded.")
 create_index_parser.add_argument('collection_name', type=str, required=True,
                                  help="Name of the collection to index the data into.")
+create_index_parser.add_argument('mode', type=str, location='args', choices=('full', 'incremental'), default='full',
+                                 help="'full' embeds every row; 'incremental' embeds only new or changed rows. "
+                                      "Both delete movies missing from the file.")
 
 delete_index_model = api.model('DeleteIndex', {
     'collection_name': fields.String(required=True, description="Name of the collection to be deleted.")
 })
 
 inference_api_model = api.model('InferenceModel', {
-    'message': fields.String(required=True, description='Input text message')
+    'message': fields.String(required=True, description='Input text message'),
+    'stream': fields.Boolean(default=False, description="Stream tokens back as server-sent events.")
+})
+
+imdb_chat_api_model = api.model('IMDBChatModel', {
+    'message': fields.String(required=True, description='Input text message'),
+    'session_id': fields.String(description="Id of the conversation (8-64 letters, digits, '-' or '_'): follow-up "
+                                            "questions are answered from the movies of the previous turns."),
+    'stream': fields.Boolean(default=False, description="Stream tokens back as server-sent events."),
+    'use_cache': fields.Boolean(default=True, description="Answer from the semantic answer cache when a similar "
+                                                          "question was answered before."),
+    'collection': fields.String(description="Collection, comma-separated collections or shard group (SHARD_GROUPS) "
+                                            "to search. Defaults to DEFAULT_COLLECTION.")
+})
+
+hybrid_chat_api_model = api.model('HybridChatModel', {
+    'message': fields.String(required=True, description='Input text message'),
+    'session_id': fields.String(description="Id of the conversation (8-64 letters, digits, '-' or '_'): follow-up "
+                                            "questions are answered from the movies of the previous turns."),
+    'stream': fields.Boolean(default=False, description="Stream tokens back as server-sent events."),
+    'collection': fields.String(description="Collection, comma-separated collections or shard group (SHARD_GROUPS) "
+                                            "to search. Defaults to DEFAULT_COLLECTION."),
+    'budget_ms': fields.Float(description="Latency budget for hybrid retrieval in milliseconds; stages that "
+                                          "overrun it are skipped. Defaults to HYBRID_SEARCH_BUDGET_MS."),
+    'use_cache': fields.Boolean(default=True, description="Answer from the semantic answer cache when a similar "
+                                                          "question was answered before.")
+})
+
+batch_chat_api_model = api.model('BatchChatModel', {
+    'questions': fields.List(fields.String, required=True, description="Questions to answer, at most "
+                                                                       "BATCH_MAX_QUESTIONS."),
+    'provider': fields.String(default="ollama", enum=["ollama", "groq", "gemini"],
+                              description="LLM provider answering the questions: 'groq' retrieves with the hybrid "
+                                          "search like /groq-imdb-chat, the others with vector search."),
+    'collection': fields.String(description="Collection, comma-separated collections or shard group (SHARD_GROUPS) "
+                                            "to search. Defaults to DEFAULT_COLLECTION."),
+    'concurrency': fields.Integer(description="LLM calls in flight at once, at most BATCH_LLM_CONCURRENCY "
+                                              "(the default)."),
+    'use_cache': fields.Boolean(default=True, description="Answer from the semantic answer cache when a similar "
+                                                          "question was answered before.")
 })
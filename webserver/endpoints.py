@@ -1,26 +1,33 @@
-import json
 import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import chromadb
-import requests
 from flask import Blueprint
 from flask import jsonify, make_response, request
 from flask_restx import Resource
 from flask_swagger_ui import get_swaggerui_blueprint
-from sentence_transformers import SentenceTransformer
 
-from chromadb_handler.chromadb_handler import ChromaDBHandler
-from utils import prompt_reader
-from utils.constants import EMBED_MODEL, ollama_url, temp_dir, chroma_path
+from utils import metrics
+from utils.context_builder import context_builder, count_tokens
+from utils.conversation_sessions import session_store
+from utils.constants import temp_dir, chroma_path, STRUCTURED_QUERIES, ENABLED_PROVIDERS, BATCH_MAX_QUESTIONS, \
+    BATCH_LLM_CONCURRENCY, BATCH_EMBED_SIZE
 from utils.gemini_handler import GeminiLLMHandler
 from utils.groq_custom_llm import GroqLLMHandler
-from webserver.api_models import inference_chat_api, create_index_parser, delete_index_model, inference_api_model
+from utils.indexing_jobs import indexing_jobs
+from utils.llm_providers import ProviderError
+from utils.llm_router import llm_router
+from utils.ollama_handler import OllamaLLMHandler
+from utils.scatter_gather import query_collections, query_collections_batch
+from webserver.api_models import inference_chat_api, create_index_parser, delete_index_model, inference_api_model, \
+    hybrid_chat_api_model, imdb_chat_api_model, batch_chat_api_model
 from webserver.extensions import api
-from utils.retrieval_handler import RetrievalHandler
-
-
-# Load sentence transformer model
-embedding_model = SentenceTransformer(EMBED_MODEL)
+from webserver.streaming import sse_response, ndjson_response
+from utils.shared_resources import get_vector_store_client, get_embedding_model, get_retriever, \
+    invalidate_collection, get_embedding_cache_stats, get_answer_cache, get_query_router, resolve_collections, \
+    open_collections, collections_label
 
 
 # Constants
@@ -46,14 +53,181 @@ index_namespace = api.namespace(name='index', description="Create Index in Vecto
 api.add_namespace(index_namespace)
 
 
-
-
-@chat_namespace.route("/chat")
+def provider_route(provider, path):
+    """`chat_namespace.route(path)` for a route calling `provider`; the route is left out unless it is enabled."""
+    if provider in ENABLED_PROVIDERS:
+        return chat_namespace.route(path)
+    return lambda resource: resource
+
+
+def _chromadb_handler(**kwargs):
+    # Imported on first use: indexing pulls in pandas, which chat-only processes never need.
+    from chromadb_handler.chromadb_handler import ChromaDBHandler
+
+    return ChromaDBHandler(db_path=chroma_path, chroma_client=get_vector_store_client(), **kwargs)
+
+
+def _cached_answer_response(cache_hit, stream, started, provider, extra=None, on_answer=None):
+    """Responds with an answer from the semantic answer cache, in the same shape as a generated one."""
+    metrics.ANSWERS.inc(provider, "answer_cache")
+    answer, similarity, cached_question = cache_hit
+    if on_answer is not None:
+        # No movies were retrieved for it, so a follow-up cannot reuse any.
+        on_answer(answer, [])
+    details = {"cached": True, "similarity": round(similarity, 4), "cached_question": cached_question}
+    details.update(extra or {})
+    if stream:
+        return sse_response([answer], started=started, extra=details)
+    return make_response(jsonify({"response": answer, **details}), 200)
+
+
+def _route_question(user_message, collection_names):
+    """
+    The QueryPlan of a question about movie metadata, or None for a free-form question.
+    Routing must never fail a request: if the router cannot be built, the question goes through RAG.
+    """
+    if not STRUCTURED_QUERIES:
+        return None
+    try:
+        with metrics.span("route"):
+            return get_query_router(collection_names).route(user_message)
+    except Exception as e:
+        print(f"Query routing failed for '{collections_label(collection_names)}', falling back to retrieval: {e}")
+        return None
+
+
+def _structured_answer_response(plan, stream, started, collection_names, provider, extra=None, on_answer=None):
+    """Responds to a "table" plan with the answer computed from the movie table; no retrieval or LLM call."""
+    metrics.ANSWERS.inc(provider, "structured")
+    with metrics.span("structured_answer"):
+        answer, result = get_query_router(collection_names).answer(plan)
+    if on_answer is not None:
+        on_answer(answer, result.get("rows"))
+    details = {"structured": result}
+    details.update(extra or {})
+    if stream:
+        return sse_response([answer], started=started, extra=details)
+    return make_response(jsonify({"response": answer, **details}), 200)
+
+
+def _retrieve_movies(collections, query_embedding, plan=None, n_results=10):
+    """
+    Metadata of the `n_results` movies nearest to the question over every collection, queried
+    concurrently. With a "filtered" plan, the filters Chroma understands go into the query and
+    the rest are applied to over-fetched results.
+    """
+    with metrics.span("retrieve"):
+        if plan is None:
+            return query_collections(collections, query_embedding.tolist(), n_results)
+        return query_collections(collections, query_embedding.tolist(), n_results,
+                                 where=plan.chroma_where(), metadata_filter=plan.matches)
+
+
+def _embed_question(user_message):
+    with metrics.span("embed"):
+        return get_embedding_model().encode(user_message)
+
+
+def _lookup_answer(cache_label, cache_model, query_embedding, user_message):
+    with metrics.span("answer_cache"):
+        return get_answer_cache().lookup(cache_label, cache_model, query_embedding, user_message)
+
+
+def _build_prompt(user_message, movies, provider, history=None):
+    """
+    The RAG prompt and its stats, with the conversation so far for a follow-up (`history`);
+    records the candidates and prompt tokens of an answer about to be generated.
+    """
+    with metrics.span("prompt_build"):
+        if history is None:
+            prompt, prompt_stats = context_builder.build_prompt(user_message, movies)
+        else:
+            prompt, prompt_stats = context_builder.build_prompt(user_message, movies, template="imdb_session_prompt",
+                                                                history=history)
+    metrics.ANSWERS.inc(provider, "rag")
+    metrics.CANDIDATES.observe(len(movies), provider)
+    metrics.PROMPT_TOKENS.observe(prompt_stats["prompt_tokens"], provider)
+    return prompt, prompt_stats
+
+
+def _routed_answer_response(prompt, provider, model, stream, started, extra, on_answer):
+    """
+    Answers `prompt` through the LLM router: from `provider`'s `model`, or from a backup provider when
+    it is slow or fails. `on_answer(answer, cache_model)` is given the answer and the "provider:model"
+    that wrote it. Responds 502 when no provider could answer.
+    """
+    routed = llm_router.stream(prompt, provider, model)
+    # Filled in by the router as the answer starts: which provider answered, hedged or after failures.
+    llm_info = routed.info
+
+    def done(answer):
+        on_answer(answer, f"{llm_info['provider']}:{llm_info['model']}")
+
+    if stream:
+        return sse_response(routed, started=started, extra={**extra, "llm": llm_info}, on_done=done,
+                            provider=provider)
+
+    try:
+        with metrics.span("llm"):
+            answer = "".join(routed)
+    except ProviderError as e:
+        return make_response(jsonify({"error": "No LLM provider could answer.", "details": str(e)}), 502)
+    metrics.RESPONSE_TOKENS.observe(count_tokens(answer), provider)
+    done(answer)
+    return make_response(jsonify({"response": answer, **extra, "llm": llm_info}), 200)
+
+
+def _open_session_or_400(request_data):
+    """The conversation session named by the request's `session_id` (None without one), or a 400 response."""
+    session_id = request_data.get("session_id")
+    if session_id is None:
+        return None, None
+    try:
+        with metrics.span("session_load"):
+            return session_store.load(session_id), None
+    except ValueError as e:
+        return None, make_response(jsonify({"error": str(e)}), 400)
+
+
+def _follow_up(session, user_message, cache_label):
+    """
+    How a turn uses its session: the follow-up kind ("reuse", "expand" or None), the text to
+    retrieve with, and the `session` field of the response. Turns outside a session are never follow-ups.
+    """
+    if session is None:
+        return None, user_message, {}
+    kind = session.follow_up_kind(user_message, cache_label)
+    search_text = session.retrieval_query(user_message) if kind == "expand" else user_message
+    details = {"session": {"session_id": session.session_id, "turn": session.turn_count + 1, "follow_up": kind}}
+    return kind, search_text, details
+
+
+def _turn_recorder(session, user_message, cache_label):
+    """Function recording the turn's answer and the movies it was based on in `session`, if there is one."""
+
+    def record(answer, movies):
+        if session is not None:
+            session.record_turn(user_message, answer, movies, cache_label)
+            session_store.save(session)
+
+    return record
+
+
+def _resolve_collections_or_400(request_data):
+    """The collections named by the request's `collection`, or a 400 response for an unknown one."""
+    try:
+        return resolve_collections(request_data.get("collection")), None
+    except ValueError as e:
+        return None, make_response(jsonify({"error": str(e)}), 400)
+
+
+@provider_route("ollama", "/chat")
 class InferenceChatBot(Resource):
 
     @api.expect(inference_chat_api)
     def post(self):
         try:
+            started = time.perf_counter()
             request_data = request.get_json()
             user_message = request_data.get('message')
             model = request_data.get('model', 'llama3.2')
@@ -64,16 +238,11 @@ class InferenceChatBot(Resource):
                     jsonify({"error": "Message field is required."}), 400
                 )
 
-            payload = {
-                "model": model,
-                "prompt": user_message,
-                "stream": stream
-            }
+            llm_handler = OllamaLLMHandler(model=model)
+            if stream:
+                return sse_response(llm_handler.ollama_api_stream(user_message), started=started)
 
-            headers = {
-                'Content-Type': 'application/json'
-            }
-            response = requests.post(ollama_url, headers=headers, data=json.dumps(payload))
+            response = llm_handler.ollama_api_call(user_message)
 
             if response.status_code == 200:
                 return make_response(jsonify(response.json()), 200)
@@ -91,74 +260,73 @@ class InferenceChatBot(Resource):
 
 
 
-@chat_namespace.route("/imdb-chat")
+@provider_route("ollama", "/imdb-chat")
 class IMDBChatBot(Resource):
-    @api.expect(inference_chat_api)
+    @api.expect(imdb_chat_api_model)
 
     def post(self):
         try:
+            started = time.perf_counter()
             request_data = request.get_json()
             user_message = request_data.get("message")
-
-            chroma_client = chromadb.PersistentClient(
-                path=chroma_path)
-
-            collection = chroma_client.get_collection(name="imdb_chatbot")
+            stream = request_data.get("stream", False)
+            use_cache = request_data.get("use_cache", True)
 
             if not user_message:
                 return make_response(
                     jsonify({"error": "Message field is required."}), 400
                 )
 
-            query_embedding = embedding_model.encode(user_message).tolist()
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=10
-            )
-
-            if not results["documents"] or not results["documents"][0]:
-                return make_response(jsonify({"response": "No relevant movies found."}), 200)
-
-            context = "\n\n".join([
-                f"Title: {doc['title']}\n"
-                f"Year: {doc['year']}\n"
-                f"Certificate: {doc['certificate']}\n"
-                f"Runtime: {doc['runtime']}\n"
-                f"Genre: {doc['genre']}\n"
-                f"IMDB Rating: {doc['rating']}\n"
-                f"Overview: {doc['overview']}\n"
-                f"Meta Score: {doc['meta_score']}\n"
-                f"Director: {doc['director']}\n"
-                f"Stars: {(doc['stars'])}\n"
-                f"Number of Votes: {doc['votes']}\n"
-                f"Gross Revenue: {doc['gross']}"
-                for doc in results["metadatas"][0]
-            ])
-
+            collection_names, error_response = _resolve_collections_or_400(request_data)
+            if error_response is not None:
+                return error_response
+            cache_label = collections_label(collection_names)
+
+            session, error_response = _open_session_or_400(request_data)
+            if error_response is not None:
+                return error_response
+            follow_up, search_text, details = _follow_up(session, user_message, cache_label)
+            end_turn = _turn_recorder(session, user_message, cache_label)
+
+            # A follow-up is about the conversation's movies, not a lookup over the whole catalog.
+            plan = None if follow_up else _route_question(user_message, collection_names)
+            if plan is not None and plan.kind == "table":
+                return _structured_answer_response(plan, stream, started, collection_names, "ollama",
+                                                   extra=details, on_answer=end_turn)
+
+            collections = open_collections(collection_names)
+
+            llm_handler = OllamaLLMHandler(model="llama3.2")
+            cache_model = f"ollama:{llm_handler.model}"
+            # Follow-up answers depend on the conversation, so they are neither served from nor stored in the cache.
+            cache_answers = use_cache and not follow_up
+            query_embedding = None if follow_up == "reuse" else _embed_question(search_text)
+            if cache_answers:
+                cache_hit = _lookup_answer(cache_label, cache_model, query_embedding, user_message)
+                if cache_hit is not None:
+                    return _cached_answer_response(cache_hit, stream, started, "ollama", extra=details,
+                                                   on_answer=end_turn)
+
+            if follow_up == "reuse":
+                movies = session.focus()
+            else:
+                movies = _retrieve_movies(collections, query_embedding, plan)
 
-            prompt = prompt_reader.load_prompts()["imdb_chat_prompt"].format(user_message=user_message, context=context)
+            if not movies:
+                metrics.ANSWERS.inc("ollama", "no_results")
+                return make_response(jsonify({"response": "No relevant movies found.", **details}), 200)
 
+            prompt, prompt_stats = _build_prompt(user_message, movies, "ollama",
+                                                 history=session.history() if follow_up else None)
 
-            payload = {
-                "model": "llama3.2",
-                "prompt": prompt,
-                "stream": False
-            }
 
-            headers = {"Content-Type": "application/json"}
-            response = requests.post(ollama_url, headers=headers, data=json.dumps(payload))
+            def finish(answer, answer_model):
+                if cache_answers:
+                    get_answer_cache().store(cache_label, answer_model, query_embedding, user_message, answer)
+                end_turn(answer, movies)
 
-
-            # Handle response
-            if response.status_code == 200:
-                return make_response(jsonify(response.json()), 200)
-            else:
-                return make_response(
-                    jsonify({
-                        "error": "Failed to process the request via Ollama.",
-                        "details": response.text
-                    }), response.status_code
-                )
+            return _routed_answer_response(prompt, "ollama", llm_handler.model, stream, started,
+                                           {"prompt_stats": prompt_stats, **details}, finish)
 
         except Exception as e:
             return make_response(
@@ -166,7 +334,7 @@ class IMDBChatBot(Resource):
             )
 
 
-@chat_namespace.route('/gemini-text-inference')
+@provider_route("gemini", '/gemini-text-inference')
 class GeminiTextInference(Resource):
     @api.expect(inference_api_model)
     def post(self):
@@ -182,57 +350,70 @@ class GeminiTextInference(Resource):
         except Exception as e:
             return {'error': str(e)}, 500
 
-@chat_namespace.route("/gemini-imdb-chat")
+@provider_route("gemini", "/gemini-imdb-chat")
 class GeminiIMDBChatBot(Resource):
-    @api.expect(inference_api_model)
+    @api.expect(imdb_chat_api_model)
     def post(self):
         try:
+            started = time.perf_counter()
             request_data = request.get_json()
             user_message = request_data.get("message")
+            stream = request_data.get("stream", False)
+            use_cache = request_data.get("use_cache", True)
 
             if not user_message:
                 return make_response(
                     jsonify({"error": "Message field is required."}), 400
                 )
 
-            chroma_client = chromadb.PersistentClient(
-                path=chroma_path
-            )
-            collection = chroma_client.get_or_create_collection(name="imdb_chatbot")
+            collection_names, error_response = _resolve_collections_or_400(request_data)
+            if error_response is not None:
+                return error_response
+            cache_label = collections_label(collection_names)
 
-            query_embedding = embedding_model.encode(user_message).tolist()
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=10
-            )
+            session, error_response = _open_session_or_400(request_data)
+            if error_response is not None:
+                return error_response
+            follow_up, search_text, details = _follow_up(session, user_message, cache_label)
+            end_turn = _turn_recorder(session, user_message, cache_label)
 
-            if not results["documents"] or not results["documents"][0]:
+            plan = None if follow_up else _route_question(user_message, collection_names)
+            if plan is not None and plan.kind == "table":
+                return _structured_answer_response(plan, stream, started, collection_names, "gemini",
+                                                   extra=details, on_answer=end_turn)
 
-                return make_response(jsonify({"response": "No relevant movies found."}), 200)
+            collections = open_collections(collection_names)
 
-            context = "\n\n".join([
-                f"Title: {doc['title']}\n"
-                f"Year: {doc['year']}\n"
-                f"Certificate: {doc['certificate']}\n"
-                f"Runtime: {doc['runtime']}\n"
-                f"Genre: {doc['genre']}\n"
-                f"IMDB Rating: {doc['rating']}\n"
-                f"Overview: {doc['overview']}\n"
-                f"Meta Score: {doc['meta_score']}\n"
-                f"Director: {doc['director']}\n"
-                f"Stars: {(doc['stars'])}\n"
-                f"Number of Votes: {doc['votes']}\n"
-                f"Gross Revenue: {doc['gross']}"
-                for doc in results["metadatas"][0]
-            ])
+            llm_handler = GeminiLLMHandler()
+            cache_model = f"gemini:{llm_handler.model}"
+            cache_answers = use_cache and not follow_up
+            query_embedding = None if follow_up == "reuse" else _embed_question(search_text)
+            if cache_answers:
+                cache_hit = _lookup_answer(cache_label, cache_model, query_embedding, user_message)
+                if cache_hit is not None:
+                    return _cached_answer_response(cache_hit, stream, started, "gemini", extra=details,
+                                                   on_answer=end_turn)
+
+            if follow_up == "reuse":
+                movies = session.focus()
+            else:
+                movies = _retrieve_movies(collections, query_embedding, plan)
 
-            prompt = prompt_reader.load_prompts()["imdb_chat_prompt"].format(user_message=user_message, context=context)
+            if not movies:
+                metrics.ANSWERS.inc("gemini", "no_results")
+                return make_response(jsonify({"response": "No relevant movies found.", **details}), 200)
 
+            prompt, prompt_stats = _build_prompt(user_message, movies, "gemini",
+                                                 history=session.history() if follow_up else None)
 
-            llm_handler = GeminiLLMHandler()
-            gemini_response = llm_handler.gemini_api_call(prompt)
 
-            return make_response(jsonify({"response": gemini_response}), 200)
+            def finish(answer, answer_model):
+                if cache_answers:
+                    get_answer_cache().store(cache_label, answer_model, query_embedding, user_message, answer)
+                end_turn(answer, movies)
+
+            return _routed_answer_response(prompt, "gemini", llm_handler.model, stream, started,
+                                           {"prompt_stats": prompt_stats, **details}, finish)
 
         except Exception as e:
             return make_response(
@@ -240,73 +421,355 @@ class GeminiIMDBChatBot(Resource):
             )
 
 
-@chat_namespace.route("/groq-imdb-chat")
+@provider_route("groq", "/groq-imdb-chat")
 class GroqIMDBChatBot(Resource):
-    @api.expect(inference_api_model)
+    @api.expect(hybrid_chat_api_model)
 
     def post(self):
         try:
+            started = time.perf_counter()
             request_data = request.get_json()
             user_message = request_data.get("message")
+            stream = request_data.get("stream", False)
+            use_cache = request_data.get("use_cache", True)
 
             if not user_message:
                 return make_response(
                     jsonify({"error": "Message field is required."}), 400
                 )
+            budget_ms = request_data.get("budget_ms")
+            if budget_ms is not None and (not isinstance(budget_ms, (int, float)) or isinstance(budget_ms, bool)
+                                          or not budget_ms >= 0):
+                return make_response(jsonify({"error": "budget_ms must be a non-negative number."}), 400)
+
+            collection_names, error_response = _resolve_collections_or_400(request_data)
+            if error_response is not None:
+                return error_response
+            cache_label = collections_label(collection_names)
+
+            session, error_response = _open_session_or_400(request_data)
+            if error_response is not None:
+                return error_response
+            follow_up, search_text, details = _follow_up(session, user_message, cache_label)
+            end_turn = _turn_recorder(session, user_message, cache_label)
+
+            plan = None if follow_up else _route_question(user_message, collection_names)
+            if plan is not None and plan.kind == "table":
+                return _structured_answer_response(plan, stream, started, collection_names, "groq",
+                                                   extra={"timings": {}, **details}, on_answer=end_turn)
 
-            # Use the hybrid RAG pipeline via RetrievalHandler.
-            retrieval_handler = RetrievalHandler()
-            # Perform the hybrid search on the user's message.
-            hybrid_results = retrieval_handler.hybrid_search(user_message)
+            groq_handler = GroqLLMHandler()
+            cache_model = f"groq:{groq_handler.model}"
+            cache_answers = use_cache and not follow_up
+            # The embedding cache serves this vector again to the vector leg of the hybrid search.
+            query_embedding = None if follow_up == "reuse" else _embed_question(search_text)
+            if cache_answers:
+                cache_hit = _lookup_answer(cache_label, cache_model, query_embedding, user_message)
+                if cache_hit is not None:
+                    return _cached_answer_response(cache_hit, stream, started, "groq",
+                                                   extra={"timings": {}, **details}, on_answer=end_turn)
+
+            timings = {}
+            if follow_up == "reuse":
+                # The previous turn's movies, already retrieved and re-ranked: no search at all.
+                hybrid_results = session.focus()
+            else:
+                # Use the hybrid RAG pipeline via the process-wide RetrievalHandler(s), one per collection searched.
+                retrieval_handler = get_retriever(collection_names)
+                # Perform the hybrid search on the user's message, within the request's retrieval budget.
+                search_kwargs = {"timings": timings}
+                if budget_ms is not None:
+                    search_kwargs["budget_ms"] = float(budget_ms)
+                if plan is not None:
+                    # "filtered" plan: retrieve only among the movies matching the question's filters.
+                    search_kwargs.update(where=plan.chroma_where(), metadata_filter=plan.matches)
+                with metrics.span("retrieve"):
+                    hybrid_results = retrieval_handler.hybrid_search(search_text, **search_kwargs)
+                metrics.record_retrieval_timings(timings)
 
             if not hybrid_results:
+                metrics.ANSWERS.inc("groq", "no_results")
                 return make_response(
-                    jsonify({"response": "No relevant movies found."}),
+                    jsonify({"response": "No relevant movies found.", "timings": timings, **details}),
                     200
                 )
 
-            context = "\n\n".join([doc["combined"] for doc in hybrid_results])
+            prompt, prompt_stats = _build_prompt(user_message, hybrid_results, "groq",
+                                                 history=session.history() if follow_up else None)
 
+            def finish(answer, answer_model):
+                if cache_answers:
+                    get_answer_cache().store(cache_label, answer_model, query_embedding, user_message, answer)
+                end_turn(answer, hybrid_results)
 
-            prompt = prompt_reader.load_prompts()["imdb_chat_prompt"].format(user_message=user_message, context=context)
+            return _routed_answer_response(prompt, "groq", groq_handler.model, stream, started,
+                                           {"timings": timings, "prompt_stats": prompt_stats, **details}, finish)
 
-            groq_handler = GroqLLMHandler()
-            groq_response = groq_handler.groq_api_call(prompt)
+        except Exception as e:
+            return make_response(
+                jsonify({"error": "An unexpected error occurred.", "details": str(e)}), 500
+            )
 
-            return make_response(jsonify({"response": groq_response}), 200)
 
+def _batch_llm(provider):
+    """(answer cache model name, model) of the single-question endpoint of `provider`."""
+    handler = {"groq": GroqLLMHandler, "gemini": GeminiLLMHandler}.get(provider, OllamaLLMHandler)()
+    return f"{provider}:{handler.model}", handler.model
+
+
+def _batch_answers(questions, provider, llm, collection_names, use_cache, concurrency):
+    """
+    Answers `questions` like the single-question endpoints of `provider`, yielding one record
+    per question as soon as it is answered, then a summary record:
+      1. Structured questions are answered from the movie table.
+      2. The others are embedded in one pass and looked up in the answer cache.
+      3. The rest are retrieved together: one multi-query vector search per collection, and for
+         Groq the hybrid search with every re-rank pair scored in large batches. Questions with
+         a "filtered" plan carry their own `where` clause and are retrieved one by one.
+      4. Prompts go to the LLM with at most `concurrency` calls in flight.
+    """
+    started = time.perf_counter()
+    cache_model, model = llm
+    cache_label = collections_label(collection_names)
+    summary = {"done": True, "questions": len(questions), "answered": 0, "errors": 0, "timings": {}}
+
+    def emit(record):
+        summary["errors" if "error" in record else "answered"] += 1
+        return record
+
+    pending = []
+    for index, question in enumerate(questions):
+        plan = _route_question(question, collection_names)
+        if plan is not None and plan.kind == "table":
+            metrics.ANSWERS.inc(provider, "structured")
+            try:
+                answer, result = get_query_router(collection_names).answer(plan)
+            except Exception as e:
+                yield emit({"index": index, "question": question, "error": "Failed to answer the question.",
+                            "details": str(e)})
+                continue
+            yield emit({"index": index, "question": question, "response": answer, "structured": result})
+        else:
+            pending.append((index, question, plan))
+    if not pending:
+        summary["timings"]["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        yield summary
+        return
+
+    embed_started = time.perf_counter()
+    with metrics.span("embed"):
+        embeddings = get_embedding_model().encode([question for _, question, _ in pending],
+                                                  batch_size=BATCH_EMBED_SIZE)
+    summary["timings"]["embed_ms"] = round((time.perf_counter() - embed_started) * 1000, 2)
+
+    to_retrieve = []
+    for (index, question, plan), query_embedding in zip(pending, embeddings):
+        cache_hit = _lookup_answer(cache_label, cache_model, query_embedding, question) if use_cache else None
+        if cache_hit is not None:
+            metrics.ANSWERS.inc(provider, "answer_cache")
+            answer, similarity, cached_question = cache_hit
+            yield emit({"index": index, "question": question, "response": answer, "cached": True,
+                        "similarity": round(similarity, 4), "cached_question": cached_question})
+        else:
+            to_retrieve.append((index, question, plan, query_embedding))
+
+    retrieve_started = time.perf_counter()
+    batched = [item for item in to_retrieve if item[2] is None]
+    filtered = [item for item in to_retrieve if item[2] is not None]
+    with metrics.span("retrieve"):
+        if provider == "groq":
+            retriever = get_retriever(collection_names)
+            retrieval_timings = {}
+            movies_by_index = dict(zip(
+                [index for index, _, _, _ in batched],
+                retriever.hybrid_search_batch([question for _, question, _, _ in batched],
+                                              [query_embedding for _, _, _, query_embedding in batched],
+                                              timings=retrieval_timings)))
+            metrics.record_retrieval_timings(retrieval_timings)
+            for index, question, plan, _ in filtered:
+                movies_by_index[index] = retriever.hybrid_search(
+                    question, budget_ms=0, where=plan.chroma_where(), metadata_filter=plan.matches)
+        else:
+            collections = open_collections(collection_names)
+            movies_by_index = dict(zip(
+                [index for index, _, _, _ in batched],
+                query_collections_batch(collections, [query_embedding.tolist() for _, _, _, query_embedding
+                                                      in batched], 10)))
+            for index, _, plan, query_embedding in filtered:
+                movies_by_index[index] = query_collections(collections, query_embedding.tolist(), 10,
+                                                           where=plan.chroma_where(), metadata_filter=plan.matches)
+    summary["timings"]["retrieve_ms"] = round((time.perf_counter() - retrieve_started) * 1000, 2)
+
+    def answer_one(index, question, query_embedding):
+        movies = movies_by_index[index]
+        if not movies:
+            metrics.ANSWERS.inc(provider, "no_results")
+            return {"index": index, "question": question, "response": "No relevant movies found."}
+        prompt, prompt_stats = _build_prompt(question, movies, provider)
+        # Throughput, not tail latency, matters here: failures fall back to another provider, slow calls are not
+        # hedged.
+        with metrics.span("llm"):
+            answer, llm_info = llm_router.generate(prompt, provider, model, hedge=False)
+        metrics.RESPONSE_TOKENS.observe(count_tokens(answer), provider)
+        if use_cache:
+            get_answer_cache().store(cache_label, f"{llm_info['provider']}:{llm_info['model']}", query_embedding,
+                                     question, answer)
+        return {"index": index, "question": question, "response": answer, "prompt_stats": prompt_stats,
+                "llm": llm_info}
+
+    llm_started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-llm")
+    try:
+        futures = {executor.submit(answer_one, index, question, query_embedding): (index, question)
+                   for index, question, _, query_embedding in to_retrieve}
+        for future in as_completed(futures):
+            index, question = futures[future]
+            try:
+                yield emit(future.result())
+            except Exception as e:
+                yield emit({"index": index, "question": question, "error": "Failed to answer the question.",
+                            "details": str(e)})
+    finally:
+        # A client that disconnects mid-stream leaves nothing queued behind it.
+        executor.shutdown(wait=False, cancel_futures=True)
+    summary["timings"]["llm_ms"] = round((time.perf_counter() - llm_started) * 1000, 2)
+    summary["timings"]["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    yield summary
+
+
+@chat_namespace.route("/batch-chat")
+class BatchChat(Resource):
+    @api.expect(batch_chat_api_model)
+    def post(self):
+        try:
+            request_data = request.get_json()
+            questions = request_data.get("questions")
+            provider = request_data.get("provider", "ollama")
+            use_cache = request_data.get("use_cache", True)
+
+            if not isinstance(questions, list) or not questions \
+                    or not all(isinstance(question, str) and question for question in questions):
+                return make_response(jsonify({"error": "questions must be a non-empty list of questions."}), 400)
+            if len(questions) > BATCH_MAX_QUESTIONS:
+                return make_response(jsonify({
+                    "error": f"At most {BATCH_MAX_QUESTIONS} questions are accepted per request."}), 400)
+            if provider not in ENABLED_PROVIDERS:
+                return make_response(jsonify({
+                    "error": f"provider must be one of: {', '.join(ENABLED_PROVIDERS)}."}), 400)
+            concurrency = request_data.get("concurrency")
+            if concurrency is None:
+                concurrency = BATCH_LLM_CONCURRENCY
+            elif not isinstance(concurrency, int) or isinstance(concurrency, bool):
+                return make_response(jsonify({"error": "concurrency must be an integer."}), 400)
+            concurrency = min(max(concurrency, 1), BATCH_LLM_CONCURRENCY)
+
+            collection_names, error_response = _resolve_collections_or_400(request_data)
+            if error_response is not None:
+                return error_response
+
+            llm = _batch_llm(provider)
+            return ndjson_response(_batch_answers(questions, provider, llm, collection_names, use_cache,
+                                                  concurrency))
         except Exception as e:
             return make_response(
                 jsonify({"error": "An unexpected error occurred.", "details": str(e)}), 500
             )
 
+
+def _spool_upload(source, collection_name):
+    """Copies an upload stream to TMP_DIR in fixed-size blocks so the indexing job can outlive the request."""
+    file_path = os.path.join(temp_dir, f"{collection_name}-{uuid.uuid4().hex}.csv")
+    try:
+        with open(file_path, "wb") as spooled:
+            shutil.copyfileobj(source, spooled, length=1024 * 1024)
+    except Exception:
+        # An upload cut off mid-copy leaves no partial file behind.
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return file_path
+
+
+def _index_uploaded_csv(file_path, collection_name, incremental=False):
+    """Returns the background work that streams the spooled CSV into `collection_name`."""
+
+    def work(job):
+        try:
+            db_handler = _chromadb_handler(collection_name=collection_name, embedding_model=get_embedding_model())
+
+            with open(file_path, "rb") as csv_file:
+                return db_handler.index_csv_stream(
+                    csv_file,
+                    progress=lambda rows: job.update_progress(rows, csv_file.tell()),
+                    incremental=incremental)
+        finally:
+            invalidate_collection(collection_name)
+            os.remove(file_path)
+
+    return work
+
+
 @index_namespace.route("/create_index")
 class CreateIndex(Resource):
     @api.expect(create_index_parser)
     def post(self):
         try:
-            if 'file' not in request.files:
-                return make_response(jsonify({"error": "No file provided."}), 400)
+            collection_name = request.args.get("collection_name")
+            mode = request.args.get("mode", "full")
 
-            file = request.files['file']
-            collection_name = request.args.get("collection_name")  # FIXED
+            if not collection_name:
+                return make_response(jsonify({"error": "collection_name is required."}), 400)
+
+            if mode not in ("full", "incremental"):
+                return make_response(jsonify({"error": "mode must be 'full' or 'incremental'."}), 400)
 
-            if file.filename == '':
-                return make_response(jsonify({"error": "Empty file name."}), 400)
+            if request.mimetype == "text/csv":
+                # Raw CSV body: copied off the socket block by block, never held in memory.
+                source = request.stream
+            else:
+                if 'file' not in request.files:
+                    return make_response(jsonify({"error": "No file provided."}), 400)
+
+                file = request.files['file']
+
+                if file.filename == '':
+                    return make_response(jsonify({"error": "Empty file name."}), 400)
+
+                source = file.stream
+
+            file_path = _spool_upload(source, collection_name)
+            try:
+                job = indexing_jobs.submit(
+                    collection_name,
+                    _index_uploaded_csv(file_path, collection_name, incremental=mode == "incremental"),
+                    total_bytes=os.path.getsize(file_path))
+            except Exception:
+                # No job will ever read the spooled upload.
+                os.remove(file_path)
+                raise
+
+            return make_response(jsonify({
+                "message": "Indexing job accepted.",
+                "job_id": job.job_id,
+                "status_url": f"{CORE_PREFIX}/index/jobs/{job.job_id}"
+            }), 202)
+        except Exception as e:
+            return make_response(jsonify({"error": "Failed to create index.", "details": str(e)}), 500)
 
-            file_path = os.path.join(temp_dir, file.filename)
-            file.save(file_path)
 
-            db_handler = ChromaDBHandler(
-                db_path=chroma_path,
-                collection_name=str(collection_name))
+@index_namespace.route("/jobs")
+class IndexingJobs(Resource):
+    def get(self):
+        return make_response(jsonify({"jobs": [job.to_dict() for job in indexing_jobs.list()]}), 200)
 
-            df = db_handler.load_and_process_csv(file_path)
-            db_handler.index_data_into_chroma(df)
 
-            return make_response(jsonify({"message": "Index created successfully."}), 200)
-        except Exception as e:
-            return make_response(jsonify({"error": "Failed to create index.", "details": str(e)}), 500)
+@index_namespace.route("/jobs/<string:job_id>")
+class IndexingJobStatus(Resource):
+    def get(self, job_id):
+        job = indexing_jobs.get(job_id)
+        if job is None:
+            return make_response(jsonify({"error": "Indexing job not found."}), 404)
+        return make_response(jsonify(job.to_dict()), 200)
 
 
 @index_namespace.route("/delete_index")
@@ -320,22 +783,60 @@ class DeleteIndex(Resource):
             if not collection_name:
                 return make_response(jsonify({"error": "Collection name is required."}), 400)
 
-            db_handler = ChromaDBHandler(
-                db_path=chroma_path,
-                collection_name=collection_name)
+            db_handler = _chromadb_handler(collection_name=collection_name)
 
-            db_handler.chroma_client.delete_collection(name=collection_name)
+            db_handler.delete_collection()
+            invalidate_collection(collection_name)
 
             return make_response(jsonify({"message": "Index deleted successfully."}), 200)
         except Exception as e:
             return make_response(jsonify({"error": "Failed to delete index.", "details": str(e)}), 500)
 
 
+@chat_namespace.route("/answer_cache")
+class AnswerCacheStats(Resource):
+    def get(self):
+        return make_response(jsonify(get_answer_cache().stats()), 200)
+
+
+@chat_namespace.route("/llm_providers")
+class LLMProviderStats(Resource):
+    def get(self):
+        return make_response(jsonify(llm_router.provider_stats()), 200)
+
+
+@chat_namespace.route("/sessions/<string:session_id>")
+class ConversationSessionState(Resource):
+    def get(self, session_id):
+        try:
+            session = session_store.load(session_id)
+        except ValueError as e:
+            return make_response(jsonify({"error": str(e)}), 400)
+        if not session.turn_count:
+            return make_response(jsonify({"error": "Session not found."}), 404)
+        return make_response(jsonify({**session.to_dict(), "history": session.history()}), 200)
+
+    def delete(self, session_id):
+        try:
+            deleted = session_store.delete(session_id)
+        except ValueError as e:
+            return make_response(jsonify({"error": str(e)}), 400)
+        if not deleted:
+            return make_response(jsonify({"error": "Session not found."}), 404)
+        return make_response(jsonify({"message": "Session ended."}), 200)
+
+
+@index_namespace.route("/embedding_cache")
+class EmbeddingCacheStats(Resource):
+    def get(self):
+        return make_response(jsonify({"embedding_caches": get_embedding_cache_stats()}), 200)
+
+
 @index_namespace.route("/collections")
 class GetCollections(Resource):
     def get(self):
         try:
-            db_handler = ChromaDBHandler(db_path=chroma_path)
+            db_handler = _chromadb_handler()
             collections = db_handler.get_all_collections()
 
             return make_response(jsonify({"collections": collections}), 200)
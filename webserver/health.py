@@ -0,0 +1,87 @@
+"""
+Liveness and readiness of this server process.
+
+A process is live as soon as it answers HTTP. It becomes ready only after a warm-up
+has loaded the models, run a first encode/predict and built the retrieval handler,
+and stops being ready once it starts draining for shutdown, so a load balancer polling
+`/ready` stops routing new requests to it while in-flight ones finish.
+
+With STARTUP_MODE=lazy the warm-up loads nothing: the process is ready at once and
+each model is loaded by the first request that needs it, or by `warm_up_models`
+(POST /warm-up) ahead of traffic.
+"""
+import os
+import threading
+import time
+
+from utils.constants import DEFAULT_COLLECTION, STARTUP_MODE
+from utils.shared_resources import preload_models, get_retrieval_handler
+
+WARM_UP_COLLECTION = DEFAULT_COLLECTION
+
+_lock = threading.Lock()
+_state = {
+    "pid": None,
+    "started_at": None,
+    "ready": False,
+    "draining": False,
+    "warm_up_ms": None,
+    "models_loaded": False,
+    "error": None,
+}
+
+
+def start_warm_up():
+    """Starts the warm-up in a background thread, once per process (again only if it failed)."""
+    with _lock:
+        if _state["pid"] == os.getpid() and not _state["error"]:
+            return
+        _state.update(pid=os.getpid(), started_at=time.time(), ready=False, draining=False,
+                      warm_up_ms=None, error=None)
+    threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+
+
+def warm_up_models():
+    """Loads the models and the default collection's retrieval handler; returns how long that took in ms."""
+    started = time.perf_counter()
+    preload_models()
+    get_retrieval_handler(WARM_UP_COLLECTION)
+    _state["models_loaded"] = True
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def _warm_up():
+    started = time.perf_counter()
+    try:
+        if STARTUP_MODE != "lazy":
+            warm_up_models()
+    except Exception as e:
+        print(f"Warm-up failed in process {os.getpid()}: {e}")
+        _state["error"] = str(e)
+        return
+    _state["warm_up_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    _state["ready"] = True
+    print(f"Process {os.getpid()} warmed up in {_state['warm_up_ms']} ms")
+
+
+def start_draining():
+    """Marks the process as shutting down; `/ready` fails from now on."""
+    _state["draining"] = True
+
+
+def is_ready():
+    return _state["ready"] and not _state["draining"]
+
+
+def status():
+    return {
+        "pid": os.getpid(),
+        "ready": is_ready(),
+        "warmed_up": _state["ready"],
+        "draining": _state["draining"],
+        "warm_up_ms": _state["warm_up_ms"],
+        "startup_mode": STARTUP_MODE,
+        "models_loaded": _state["models_loaded"],
+        "uptime_s": round(time.time() - _state["started_at"], 1) if _state["started_at"] else None,
+        "error": _state["error"],
+    }
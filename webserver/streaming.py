@@ -0,0 +1,86 @@
+import json
+import time
+
+from flask import Response, stream_with_context
+
+from utils import metrics
+from utils.context_builder import count_tokens
+
+
+def sse_event(data, event=None):
+    """Formats one server-sent event with a JSON payload."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def sse_response(tokens, started=None, extra=None, on_done=None, provider=None):
+    """
+    Relays `tokens` to the client as server-sent events as soon as they are produced.
+
+    Every token is sent as `data: {"token": ...}`. The stream ends with a `done` event
+    carrying the full response, the time to first token and any `extra` fields, or with
+    an `error` event if the provider fails mid-stream.
+
+    :param tokens: Iterable of text chunks from the LLM provider
+    :param started: perf_counter() value of the request start, for time-to-first-token
+    :param extra: Optional dict merged into the `done` event (e.g. retrieval timings)
+    :param on_done: Optional callable given the full response once the stream finished without error
+    :param provider: Name of the LLM provider producing `tokens`; when given, the stream's time to first
+                     token and duration are recorded as the "llm_first_token" and "llm" stages
+    """
+    started = started or time.perf_counter()
+
+    def generate():
+        parts = []
+        first_token_ms = None
+        stream_started = time.perf_counter()
+        try:
+            for token in tokens:
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 2)
+                    if provider is not None:
+                        metrics.record("llm_first_token", time.perf_counter() - stream_started)
+                parts.append(token)
+                yield sse_event({"token": token})
+        except Exception as e:
+            yield sse_event({"error": "An unexpected error occurred.", "details": str(e)}, event="error")
+            return
+
+        done = {
+            "response": "".join(parts),
+            "ttft_ms": first_token_ms,
+            "total_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+        done.update(extra or {})
+        if provider is not None:
+            metrics.record("llm", time.perf_counter() - stream_started)
+            metrics.RESPONSE_TOKENS.observe(count_tokens(done["response"]), provider)
+        if on_done is not None:
+            on_done(done["response"])
+        yield sse_event(done, event="done")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def ndjson_response(records):
+    """
+    Streams `records` (dicts) to the client as newline-delimited JSON, each line sent as soon as
+    its record is produced. A failure mid-stream ends it with an `{"error": ...}` line.
+    """
+
+    def generate():
+        try:
+            for record in records:
+                yield json.dumps(record) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": "An unexpected error occurred.", "details": str(e)}) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )